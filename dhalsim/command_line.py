@@ -29,6 +29,7 @@ class Runner():
         signal.signal(signal.SIGTERM, self.sigint_handler)
 
         self.automatic_run = None
+        self.local_runtime = False
 
     def sigint_handler(self, sig, frame):
         os.kill(self.automatic_run.pid, signal.SIGTERM)
@@ -37,6 +38,7 @@ class Runner():
 
     def run(self):
         config_parser = ConfigParser(self.config_file)
+        self.local_runtime = 'local_runtime' in config_parser.data
 
         if config_parser.batch_mode:
             # If in batch mode, generate all intermediate yamls and simulate one by one
@@ -53,8 +55,10 @@ class Runner():
 
     def run_simulation(self, intermediate_yaml_path):
 
-        subprocess.run(["sudo", "pkill - f - u", "root", "python -m cpppo.server.enip"])
-        subprocess.run(["sudo", "mn", "-c"])
+        # The local runtime runs without Mininet and root
+        if not self.local_runtime:
+            subprocess.run(["sudo", "pkill - f - u", "root", "python -m cpppo.server.enip"])
+            subprocess.run(["sudo", "mn", "-c"])
 
         InputFilesCopier(self.config_file, intermediate_yaml_path).copy_input_files()
 
@@ -62,7 +66,8 @@ class Runner():
         db_initializer.drop()
         db_initializer.write()
         db_initializer.print()
-        automatic_run_path = Path(__file__).parent.absolute() / "python2" / "automatic_run.py"
+        run_script = "local_run.py" if self.local_runtime else "automatic_run.py"
+        automatic_run_path = Path(__file__).parent.absolute() / "python2" / run_script
         self.automatic_run = subprocess.Popen(
             ["python2", str(automatic_run_path), str(intermediate_yaml_path)])
         self.automatic_run.wait()
@@ -0,0 +1,188 @@
+""" EPYNET Adjacency index """
+import numpy as np
+
+
+class AdjacencyIndex(object):
+    """ Compressed sparse row (CSR) index of the links connected to every node
+
+    Nodes and links are addressed by their position in the network collections, the same
+    layout used by the step-state arrays of the simulation. All the flow dependent queries
+    take an array of link flows in that layout, so they can be run against any step of an
+    extended period simulation and not only against a steady state solution.
+
+    :param node_uids: ids of the nodes
+    :param link_uids: ids of the links
+    :param from_nodes: position of the start node of every link
+    :param to_nodes: position of the end node of every link
+    """
+
+    FLOW_TOLERANCE = 1e-3
+    """Links with an absolute flow below this value are considered without flow"""
+
+    def __init__(self, node_uids, link_uids, from_nodes, to_nodes):
+        self.node_uids = list(node_uids)
+        self.link_uids = list(link_uids)
+        self.node_index = {uid: slot for slot, uid in enumerate(self.node_uids)}
+        self.link_index = {uid: slot for slot, uid in enumerate(self.link_uids)}
+
+        self.from_nodes = np.asarray(from_nodes, dtype=np.intp)
+        self.to_nodes = np.asarray(to_nodes, dtype=np.intp)
+
+        n_nodes = len(self.node_uids)
+        n_links = len(self.link_uids)
+
+        # every link is incident to its two end nodes
+        ends = np.concatenate([self.from_nodes, self.to_nodes])
+        links = np.concatenate([np.arange(n_links), np.arange(n_links)])
+        others = np.concatenate([self.to_nodes, self.from_nodes])
+
+        order = np.argsort(ends, kind='stable')
+        self.indptr = np.zeros(n_nodes + 1, dtype=np.intp)
+        np.cumsum(np.bincount(ends, minlength=n_nodes), out=self.indptr[1:])
+        self.indices = links[order]
+        self.neighbours = others[order]
+        # node owning each entry, the row of the entry in CSR terms
+        self.entry_nodes = ends[order]
+
+    @classmethod
+    def from_network(cls, network):
+        """ Build the index from the node and link collections of a network """
+        node_uids = list(network.nodes.keys())
+        node_index = {uid: slot for slot, uid in enumerate(node_uids)}
+        links = list(network.links)
+        from_nodes = [node_index[link.from_node.uid] for link in links]
+        to_nodes = [node_index[link.to_node.uid] for link in links]
+        return cls(node_uids, [link.uid for link in links], from_nodes, to_nodes)
+
+    @property
+    def node_count(self):
+        return len(self.node_uids)
+
+    @property
+    def link_count(self):
+        return len(self.link_uids)
+
+    def incident_links(self, node):
+        """ return the positions of the links connected to a node """
+        slot = self.node_index[node]
+        return self.indices[self.indptr[slot]:self.indptr[slot + 1]]
+
+    def _directions(self, flows, links=None):
+        """ return the upstream and downstream node of every link, and whether it has flow
+
+        :param links: positions of the links to orient, all the links by default
+        """
+        flows = np.asarray(flows, dtype=np.float64)
+        from_nodes, to_nodes = self.from_nodes, self.to_nodes
+        if links is not None:
+            flows, from_nodes, to_nodes = flows[links], from_nodes[links], to_nodes[links]
+        positive = flows >= 0
+        heads = np.where(positive, to_nodes, from_nodes)
+        tails = np.where(positive, from_nodes, to_nodes)
+        active = np.abs(flows) >= self.FLOW_TOLERANCE
+        return tails, heads, active
+
+    def upstream_links(self, node, flows):
+        """ return the positions of the links bringing water into a node
+
+        Only the links of the node are oriented, so a query does not depend on the network size.
+        """
+        slot = self.node_index[node]
+        links = self.incident_links(node)
+        _, heads, active = self._directions(flows, links)
+        return links[(heads == slot) & active]
+
+    def downstream_links(self, node, flows):
+        """ return the positions of the links taking water out of a node
+
+        Only the links of the node are oriented, so a query does not depend on the network size.
+        """
+        slot = self.node_index[node]
+        links = self.incident_links(node)
+        tails, _, active = self._directions(flows, links)
+        return links[(tails == slot) & active]
+
+    def inflow(self, flows):
+        """ return the water flowing into every node """
+        _, heads, active = self._directions(flows)
+        weights = np.abs(np.asarray(flows, dtype=np.float64))[active]
+        return np.bincount(heads[active], weights=weights, minlength=self.node_count)
+
+    def outflow(self, flows):
+        """ return the water flowing out of every node """
+        tails, _, active = self._directions(flows)
+        weights = np.abs(np.asarray(flows, dtype=np.float64))[active]
+        return np.bincount(tails[active], weights=weights, minlength=self.node_count)
+
+    def _frontier_entries(self, frontier):
+        """ return the CSR entries of all the nodes in the frontier """
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+        total = counts.sum()
+        if total == 0:
+            return np.zeros(0, dtype=np.intp)
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return offsets + np.arange(total)
+
+    def reachable(self, sources, flows=None, open_links=None, direction='downstream'):
+        """ return a boolean mask of the nodes that can be reached from the sources
+
+        :param sources: node ids to start from
+        :param flows: flow of every link. When given, links are only followed in the
+                      direction of the flow, otherwise the network is treated as undirected
+        :param open_links: boolean mask of the links that can carry water, all by default
+        :param direction: 'downstream' follows the flow, 'upstream' goes against it
+        """
+        if direction not in ('downstream', 'upstream'):
+            raise ValueError("Unknown direction " + str(direction))
+
+        usable = np.ones(self.link_count, dtype=bool) if open_links is None \
+            else np.asarray(open_links, dtype=bool)
+        forward = None
+        if flows is not None:
+            tails, _, active = self._directions(flows)
+            usable = usable & active
+            # an entry can be followed when its node is the upstream end of the link
+            forward = tails[self.indices] == self.entry_nodes
+            if direction == 'upstream':
+                forward = ~forward
+
+        visited = np.zeros(self.node_count, dtype=bool)
+        frontier = np.unique(np.array([self.node_index[uid] for uid in sources], dtype=np.intp))
+        visited[frontier] = True
+
+        while frontier.size:
+            entries = self._frontier_entries(frontier)
+            allowed = usable[self.indices[entries]]
+            if forward is not None:
+                allowed &= forward[entries]
+            candidates = self.neighbours[entries[allowed]]
+            frontier = np.unique(candidates[~visited[candidates]])
+            visited[frontier] = True
+
+        return visited
+
+    def isolation_zones(self, open_links=None):
+        """ return a zone label for every node, nodes sharing a label are hydraulically connected
+
+        :param open_links: boolean mask of the links that can carry water, all by default
+        """
+        usable = np.ones(self.link_count, dtype=bool) if open_links is None \
+            else np.asarray(open_links, dtype=bool)
+        from_nodes = self.from_nodes[usable]
+        to_nodes = self.to_nodes[usable]
+
+        # propagate the smallest node position through the open links until it is stable
+        labels = np.arange(self.node_count)
+        while True:
+            minimum = np.minimum(labels[from_nodes], labels[to_nodes])
+            updated = labels.copy()
+            np.minimum.at(updated, from_nodes, minimum)
+            np.minimum.at(updated, to_nodes, minimum)
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+
+        # relabel the zones as 0..n-1
+        return np.unique(labels, return_inverse=True)[1]
@@ -7,6 +7,7 @@ from .node import Junction, Tank, Reservoir
 from .link import Pipe, Valve, Pump
 from .curve import Curve
 from .pattern import Pattern
+from .adjacency import AdjacencyIndex
 import os
 
 class Network(object):
@@ -47,6 +48,8 @@ class Network(object):
         self.solved = False
         self.solved_for_simtime = None
 
+        self.adjacency = None
+
         self.load_network()
 
     def load_network(self):
@@ -72,6 +75,8 @@ class Network(object):
 
 
         # load links
+        from_nodes = []
+        to_nodes = []
         for index in range(1, self.ep.ENgetcount(epanet2.EN_LINKCOUNT)+1):
             link_type = self.ep.ENgetlinktype(index)
             uid = self.ep.ENgetlinkid(index)
@@ -92,7 +97,12 @@ class Network(object):
             link.from_node.links[link.uid] = link
             link.to_node = self.nodes[self.ep.ENgetnodeid(link_nodes[1])]
             link.to_node.links[link.uid] = link
+            # node collection follows the EPANET index order while loading
+            from_nodes.append(link_nodes[0] - 1)
+            to_nodes.append(link_nodes[1] - 1)
 
+        # build the link adjacency index
+        self.adjacency = AdjacencyIndex(self.nodes.keys(), self.links.keys(), from_nodes, to_nodes)
 
         # load curves 
 
@@ -320,6 +330,7 @@ class Network(object):
         # reset link index caches
         for link in self.links:
             link._index = None
+        self.adjacency = AdjacencyIndex.from_network(self)
 
     def invalidate_nodes(self):
         # set network as unsolved
@@ -327,6 +338,7 @@ class Network(object):
         # reset node index caches
         for node in self.nodes:
             node._index = None
+        self.adjacency = AdjacencyIndex.from_network(self)
 
     def solve(self, simtime=0):
         """ Solve Hydraulic Network for Single Timestep"""
@@ -1,4 +1,5 @@
 #import epynet
+import numpy as np
 import pandas as pd
 import datetime
 #from tqdm import tqdm
@@ -11,6 +12,59 @@ actuators_update_dict = {}
 # step_count = 0
 
 
+class NetworkState:
+    """
+    Fixed-layout container of the values produced by each simulation step.
+
+    Nodes and links are stored in NumPy structured arrays, in the order of the network
+    collections, which is also the layout of :attr:`Network.adjacency`. The name to slot
+    mapping is computed once, so consumers can resolve their slots when the simulation starts
+    and read the arrays directly on every step. The arrays are overwritten in place by
+    :meth:`WaterDistributionNetwork.get_network_state`, nothing is allocated per step.
+
+    :param node_uids: ids of the nodes, in network collection order
+    :param link_uids: ids of the links, in network collection order
+    """
+    NODE_DTYPE = np.dtype([('pressure', np.float64)])
+    LINK_DTYPE = np.dtype([('status', np.float64), ('flow', np.float64)])
+
+    def __init__(self, node_uids, link_uids):
+        self.node_index = {uid: slot for slot, uid in enumerate(node_uids)}
+        self.link_index = {uid: slot for slot, uid in enumerate(link_uids)}
+        self.nodes = np.zeros(len(self.node_index), dtype=self.NODE_DTYPE)
+        self.links = np.zeros(len(self.link_index), dtype=self.LINK_DTYPE)
+
+    def node_slots(self, uids):
+        """
+        Translate a list of node ids into an array of slots in :attr:`nodes`.
+
+        :param uids: list of node ids
+        :return: integer array that can be used to index :attr:`nodes`
+        """
+        return np.array([self.node_index[uid] for uid in uids], dtype=np.intp)
+
+    def link_slots(self, uids):
+        """
+        Translate a list of link ids into an array of slots in :attr:`links`.
+
+        :param uids: list of link ids
+        :return: integer array that can be used to index :attr:`links`
+        """
+        return np.array([self.link_index[uid] for uid in uids], dtype=np.intp)
+
+    def __getitem__(self, uid):
+        """Record of a single node or link, e.g. state['T1']['pressure']"""
+        if uid in self.node_index:
+            return self.nodes[self.node_index[uid]]
+        return self.links[self.link_index[uid]]
+
+    def __contains__(self, uid):
+        return uid in self.node_index or uid in self.link_index
+
+    def __len__(self):
+        return len(self.node_index) + len(self.link_index)
+
+
 class WaterDistributionNetwork(Network):
     """Class of the network inherited from Epynet.Network"""
     def __init__(self, inpfile: str):
@@ -20,7 +74,10 @@ class WaterDistributionNetwork(Network):
         self.times = []
         # Interactive flag can be set in run() or in init_simulation() if you want to build manually the step-by-step
         self.interactive = False
-        self.network_state = pd.Series()
+        self.network_state = None
+        self._state_nodes = []
+        self._state_links = []
+        self._state_status_links = []
 
     def set_time_params(self, duration=None, hydraulic_step=None, pattern_step=None, report_step=None, start_time=None,
                         rule_step=None):
@@ -128,9 +185,28 @@ class WaterDistributionNetwork(Network):
         self.interactive = interactive
         self.reset()
         self.times = []
+        self.build_network_state()
         self.ep.ENopenH()
         self.ep.ENinitH(flag=0)
 
+    def build_network_state(self):
+        """
+        Allocate the :class:`NetworkState` buffers that get_network_state fills at every step.
+        Links without a dynamic status (pipes) keep the status they have before the simulation.
+        """
+        self._state_nodes = list(self.nodes)
+        self._state_links = list(self.links)
+        self.network_state = NetworkState([node.uid for node in self._state_nodes],
+                                          [link.uid for link in self._state_links])
+
+        statuses = self.network_state.links['status']
+        self._state_status_links = []
+        for slot, link in enumerate(self._state_links):
+            if 'status' in link.properties:
+                self._state_status_links.append((slot, link))
+            elif 'status' in link.static_properties:
+                statuses[slot] = link.status
+
     def simulate_step(self, curr_time, actuators_status=None):
         """
         Simulation of one step from the given time
@@ -166,28 +242,26 @@ class WaterDistributionNetwork(Network):
 
     def get_network_state(self):
         """
-        Retrieve the current values of the network in the form a pandas series of dictionaries.
+        Update the values of the network in the :class:`NetworkState` buffers and return them.
         The collected values are referred to:
-            - tanks: {pressure}
-            - junctions: {pressure}
-            - pumps: {status, flow}
-            - valves: {status, flow}
-        :return: the series with the above enlisted values
+            - nodes: pressure
+            - links: status, flow
+        The same object is returned at every step, copy it if an old step needs to be kept.
+        :return: the network state with the above enlisted values
         """
-        network_state = pd.Series()
-        for uid in self.tanks.results.index.append(self.junctions.results.index):
-            nodes_dict = {key: self.nodes[uid].results[key][-1] for key in ['pressure']}
-            network_state[uid] = nodes_dict
-
-        if self.valves:
-            for uid in self.pumps.results.index.append(self.valves.results.index):
-                links_dict = {key: self.links[uid].results[key][-1] for key in ['status', 'flow']}
-                network_state[uid] = links_dict
-        else:
-            for uid in self.pumps.results.index:
-                links_dict = {key: self.pumps[uid].results[key][-1] for key in ['status', 'flow']}
-                network_state[uid] = links_dict
-        return network_state
+        state = self.network_state
+        pressures = state.nodes['pressure']
+        for slot, node in enumerate(self._state_nodes):
+            pressures[slot] = node.results['pressure'][-1]
+
+        flows = state.links['flow']
+        for slot, link in enumerate(self._state_links):
+            flows[slot] = link.results['flow'][-1]
+
+        statuses = state.links['status']
+        for slot, link in self._state_status_links:
+            statuses[slot] = link.results['status'][-1]
+        return state
 
     def create_df_reports(self):
         """
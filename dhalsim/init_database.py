@@ -3,6 +3,8 @@ import os
 import sqlite3
 from pathlib import Path
 from dhalsim.py3_logger import get_logger
+from dhalsim.python2.database import enable_wal
+from dhalsim.python2.shared_state import SharedState, plant_tags
 import yaml
 import pandas as pd
 
@@ -19,6 +21,9 @@ class DatabaseInitializer:
         self.logger.info("Initializing database.")
 
     def write(self):
+        # Readers do not block the writer and the other way around, which the nodes rely on
+        enable_wal(self.db_path)
+
         with sqlite3.connect(self.db_path) as conn:
             cur = conn.cursor()
 
@@ -30,11 +35,13 @@ class DatabaseInitializer:
                     PRIMARY KEY (name, pid)
                 );""")
 
+            initial_values = {}
             if "actuators" in self.data:
                 for actuator in self.data["actuators"]:
                     initial_state = "0" if actuator["initial_state"].lower() == "closed" else "1"
                     cur.execute("INSERT INTO plant VALUES (?, 1, ?);",
                                 (actuator["name"], initial_state,))
+                    initial_values[actuator["name"]] = initial_state
 
             if "plcs" in self.data:
                 for plc in self.data["plcs"]:
@@ -59,7 +66,9 @@ class DatabaseInitializer:
                     cur.execute("INSERT INTO sync (name, flag) VALUES (?, 1);",
                                 (plc["name"],))
 
-            cur.execute("INSERT INTO sync (name, flag) VALUES ('scada', 1);")
+            # A SCADA in observer mode does not take part in the sync
+            if not self.data.get("scada_observer", False):
+                cur.execute("INSERT INTO sync (name, flag) VALUES ('scada', 1);")
 
             if "network_attacks" in self.data:
                 for attacker in self.data["network_attacks"]:
@@ -87,6 +96,11 @@ class DatabaseInitializer:
 
             conn.commit()
 
+        # The plant is also laid out in shared memory, when the nodes use that instead
+        if self.data.get("plant_state", "sqlite") == "shared_memory":
+            SharedState.create(self.data["plant_state_path"], plant_tags(self.data),
+                               initial_values)
+
     def drop(self):
         with sqlite3.connect(self.db_path) as conn:
             cur = conn.cursor()
@@ -0,0 +1,156 @@
+import struct
+
+from dhalsim.python2.enip_client import HEADER, SEND_RR_DATA, READ_TAG, \
+    MULTIPLE_SERVICE_PACKET, CIP_REAL
+
+SEND_UNIT_DATA = 0x70
+"""Encapsulation command of connected messages"""
+
+UNCONNECTED_DATA_ITEM = 0xB2
+CONNECTED_DATA_ITEM = 0xB1
+
+REPLY = 0x80
+"""Bit set in the service code of a CIP reply"""
+
+TCP_PROTOCOL = 6
+
+CHECKSUM = struct.Struct('!H')
+WORD = struct.Struct('!H')
+REAL = struct.Struct('<f')
+
+
+def tcp_payload_offset(packet):
+    """
+    :param packet: an IPv4 packet
+    :return: tuple of the offset of the TCP header and of the TCP payload, or None when the
+             packet is not a complete TCP segment
+    """
+    if len(packet) < 20 or packet[0] >> 4 != 4 or packet[9] != TCP_PROTOCOL:
+        return None
+    tcp = (packet[0] & 0x0F) * 4
+    if len(packet) < tcp + 20:
+        return None
+    payload = tcp + (packet[tcp + 12] >> 4) * 4
+    if struct.unpack_from('!H', packet, 2)[0] != len(packet) or payload > len(packet):
+        return None
+    return tcp, payload
+
+
+def cip_reply_offset(packet, enip):
+    """
+    Find the CIP reply in an encapsulation frame that fills the rest of the packet.
+
+    :param packet: the packet
+    :param enip: offset of the encapsulation header
+    :return: tuple of the offset and length of the CIP reply, or None
+    """
+    if len(packet) < enip + HEADER.size + 8:
+        return None
+    command, length = struct.unpack_from('<HH', packet, enip)
+    if command not in (SEND_RR_DATA, SEND_UNIT_DATA) or enip + HEADER.size + length != len(packet):
+        return None
+    # Interface handle and timeout, then the common packet format items
+    offset = enip + HEADER.size + 6
+    count, = struct.unpack_from('<H', packet, offset)
+    offset += 2
+    for _ in range(count):
+        if offset + 4 > len(packet):
+            return None
+        item_type, item_length = struct.unpack_from('<HH', packet, offset)
+        offset += 4
+        if item_type == UNCONNECTED_DATA_ITEM:
+            return offset, item_length
+        if item_type == CONNECTED_DATA_ITEM:
+            # Sequence count before the reply
+            return offset + 2, item_length - 2
+        offset += item_length
+    return None
+
+
+def real_values(packet, cip, length):
+    """
+    :param packet: the packet
+    :param cip: offset of a CIP reply
+    :param length: length of the CIP reply
+    :return: list of the offsets of the REAL values read by the reply, also the ones in the
+             replies in a Multiple Service Packet
+    """
+    if length < 4:
+        return []
+    service, _, status, extended = struct.unpack_from('<BBBB', packet, cip)
+    data = cip + 4 + 2 * extended
+    end = cip + length
+
+    if service == READ_TAG | REPLY and status == 0 and data + 6 <= end and \
+            struct.unpack_from('<H', packet, data)[0] == CIP_REAL:
+        return [data + 2]
+
+    if service == MULTIPLE_SERVICE_PACKET | REPLY and data + 2 <= end:
+        count, = struct.unpack_from('<H', packet, data)
+        if data + 2 + 2 * count > end:
+            return []
+        offsets = [data + offset for offset in struct.unpack_from('<%dH' % count, packet, data + 2)]
+        values = []
+        for start, stop in zip(offsets, offsets[1:] + [end]):
+            if data < start < stop <= end:
+                values.extend(real_values(packet, start, stop - start))
+        return values
+
+    return []
+
+
+def real_offsets(packet):
+    """
+    Find the REAL values in an ENIP reply, by reading the headers at their fixed offsets. Only
+    packets that hold one complete encapsulation frame are considered.
+
+    :param packet: an IPv4 packet, as queued by netfilter
+    :return: list of the offsets of the REAL values in the packet, empty when the packet is not
+             a reply to a Read Tag
+    """
+    offsets = tcp_payload_offset(packet)
+    if offsets is None:
+        return []
+    reply = cip_reply_offset(packet, offsets[1])
+    if reply is None:
+        return []
+    return real_values(packet, *reply)
+
+
+def adjust_checksum(checksum, old, new):
+    """
+    Update an internet checksum for changed data, without summing the rest of the packet
+    (RFC 1624, equation 3).
+
+    :param checksum: the checksum before the change
+    :param old: the changed 16 bit words before the change
+    :param new: the same words after the change
+    :return: the new checksum
+    """
+    total = ~checksum & 0xFFFF
+    for (old_word,), (new_word,) in zip(WORD.iter_unpack(old), WORD.iter_unpack(new)):
+        total += (~old_word & 0xFFFF) + new_word
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def rewrite_reals(packet, offsets, rewrite):
+    """
+    Replace REAL values in a packet, and update the TCP checksum for every value. The length
+    of the packet does not change, so the IP header stays the same.
+
+    :param packet: a :code:`bytearray` with the packet, changed in place
+    :param offsets: offsets of the values, as returned by :func:`real_offsets`
+    :param rewrite: function from the original to the new value
+    """
+    tcp = (packet[0] & 0x0F) * 4
+    checksum, = CHECKSUM.unpack_from(packet, tcp + 16)
+    for offset in offsets:
+        # The checksum sums 16 bit words counted from the start of the TCP header
+        start = tcp + ((offset - tcp) & ~1)
+        end = tcp + ((offset - tcp + REAL.size + 1) & ~1)
+        old = bytes(packet[start:end])
+        REAL.pack_into(packet, offset, rewrite(REAL.unpack_from(packet, offset)[0]))
+        checksum = adjust_checksum(checksum, old, bytes(packet[start:end]))
+    CHECKSUM.pack_into(packet, tcp + 16, checksum)
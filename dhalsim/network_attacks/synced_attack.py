@@ -1,7 +1,5 @@
-import random
 import signal
 import sqlite3
-import subprocess
 import sys
 import time
 from abc import ABCMeta, abstractmethod
@@ -10,6 +8,12 @@ from pathlib import Path
 import yaml
 
 from dhalsim.py3_logger import get_logger
+from dhalsim.python2.barrier import BarrierClient, BarrierError
+from dhalsim.python2.database import CONTENTION, shared_connection
+from dhalsim.python2.enip_client import EnipClient, EnipError
+from dhalsim.python2.shared_state import open_plant_state
+from dhalsim.python2.sync_trace import Histogram, open_sync_trace
+from dhalsim.python2.tag_index import TagIndex
 
 
 class Error(Exception):
@@ -43,8 +47,8 @@ class SyncedAttack(metaclass=ABCMeta):
     DB_TRIES = 10
     """Amount of times a db query will retry on a exception"""
 
-    DB_SLEEP_TIME = random.uniform(0.01, 0.1)
-    """Amount of time a db query will wait before retrying"""
+    ENIP_TIMEOUT = 1.0
+    """Time in seconds the attacker waits for the answer of a PLC"""
 
     def __init__(self, intermediate_yaml_path: Path, yaml_index: int):
         signal.signal(signal.SIGINT, self.sigint_handler)
@@ -68,25 +72,59 @@ class SyncedAttack(metaclass=ABCMeta):
         self.attacker_ip = self.intermediate_attack['local_ip']
         self.target_plc_ip = self.intermediate_plc['local_ip']
 
+        # Owner of every tag, the target PLC is reached through its local IP
+        self.tag_index = TagIndex(self.intermediate_yaml['plcs'], self.intermediate_plc['name'])
+
+        # Persistent ENIP sessions with the PLCs
+        self.enip_client = EnipClient(self.ENIP_TIMEOUT)
+
         self.state = 0
 
         # Initialize database connection
         self.initialize_db()
 
+        # The plant in shared memory instead of the plant table, when configured
+        self.shared_state = open_plant_state(self.intermediate_yaml)
+
+        # The owner of the sensor of the trigger is looked up once
+        self.trigger = self.intermediate_attack['trigger']
+        self.trigger_owner = None
+        if 'sensor' in self.trigger:
+            self.trigger_owner = self.tag_index.owner(self.trigger['sensor'])
+
+        # Time every evaluation of the trigger took
+        self.trigger_times = Histogram()
+
+        # Released by the physical process over a socket instead of through the sync table
+        self.barrier = None
+        if self.intermediate_yaml.get('barrier', 'sqlite') == 'socket':
+            self.barrier = BarrierClient(self.intermediate_yaml['barrier_path'],
+                                         self.intermediate_attack['name'])
+
+        # When this attack was released and done with every iteration, when the sync is traced
+        self.sync_trace = open_sync_trace(self.intermediate_yaml,
+                                          self.intermediate_attack['name'])
+
     def sigint_handler(self, sig, frame):
         """Interrupt handler for attacker being stoped"""
         self.logger.debug("{name} attacker shutdown".format(name=self.intermediate_attack["name"]))
+        self.logger.debug("{name} database contention: {stats}".format(
+            name=self.intermediate_attack["name"], stats=CONTENTION.as_dict()))
+        self.logger.info("{name} trigger evaluation in ms: {stats}".format(
+            name=self.intermediate_attack["name"], stats=self.trigger_times.summary()))
         self.interrupt()
+        if self.sync_trace is not None:
+            self.sync_trace.close()
         sys.exit(0)
 
     def initialize_db(self):
         """
         Function that initializes attacker connection to the database
         """
-        self.conn = sqlite3.connect(self.intermediate_yaml["db_path"])
+        self.conn = shared_connection(self.intermediate_yaml["db_path"])
         self.cur = self.conn.cursor()
 
-    def receive_tag(self, tag: str) -> float:
+    def receive_tag(self, tag: str, owner=None) -> float:
         """
         This function will receive a given tag from its corresponding PLC
 
@@ -95,35 +133,41 @@ class SyncedAttack(metaclass=ABCMeta):
         IP address of the PLC.
 
         :param tag: The tag we want to receive
-        :return: The value of the tag
+        :param owner: The owner of the tag, when it was already looked up
+        :return: The value of the tag, None when the PLC did not answer
         """
-        target_plc = None
-
-        for plc in self.intermediate_yaml['plcs']:
-            if tag in plc['actuators'] + plc['sensors']:
-                target_plc = plc
-                break
-
-        cmd = ['/usr/bin/python2', '-m', 'cpppo.server.enip.client', '--print', '--address']
-        if target_plc['name'] == self.intermediate_plc['name']:
-            cmd.append(str(target_plc['local_ip']) + ":44818")
-        else:
-            cmd.append(str(target_plc['public_ip']) + ":44818")
-        cmd.append(f"{tag}:1")
+        if owner is None:
+            owner = self.tag_index.owner(tag)
 
         try:
-            client = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE)
+            return self.enip_client.read_tag(owner.ip, tag)
+        except EnipError as error:
+            self.logger.error(f"ERROR enip receive of {tag} from {owner.ip}: {error}")
 
-            # client.communicate is blocking
-            raw_out = client.communicate()
+    def read_plant_tag(self, tag: str) -> float:
+        """
+        Read the value of a tag from the plant, like the physical process wrote it, instead of
+        from its PLC. This is the shared memory when the plant is kept there, and the plant table
+        otherwise.
 
-            # Value is stored as first tuple element between a pair of square brackets
-            word = raw_out[0]
-            value = word[(word.find(b'[') + 1):word.find(b']')]
-            return float(value)
+        :param tag: The tag we want to read
+        :return: The value of the tag
+        """
+        if self.shared_state is not None:
+            return self.shared_state.read(tag)
+        self.db_query("SELECT value FROM plant WHERE name = ?", (tag,))
+        return float(self.cur.fetchone()[0])
+
+    def read_trigger_sensor(self) -> float:
+        """
+        Read the sensor of the trigger. With :code:`source: plant` the attacker only observes the
+        plant, otherwise it reads the sensor from its PLC.
 
-        except Exception as error:
-            print('ERROR enip _receive: ', error.with_traceback())
+        :return: The value of the sensor, None when it could not be read
+        """
+        if self.trigger.get('source', 'plc') == 'plant':
+            return self.read_plant_tag(self.trigger['sensor'])
+        return self.receive_tag(self.trigger['sensor'], self.trigger_owner)
 
     def check_trigger(self) -> bool:
         """
@@ -163,37 +207,42 @@ class SyncedAttack(metaclass=ABCMeta):
               lower_value: 0.10
               upper_value: 0.16
 
+        A sensor trigger reads the sensor from its PLC, unless it has :code:`source: plant`.
+
+        The time every evaluation takes is counted in :code:`trigger_times`.
+
         :return: Boolean indicating whether or not to run the attack
         """
-        if self.intermediate_attack['trigger']['type'] == "time":
-            start = self.intermediate_attack['trigger']['start']
-            end = self.intermediate_attack['trigger']['end']
-            if start <= self.get_master_clock() <= end:
-                return True
-            else:
-                return False
-        elif self.intermediate_attack['trigger']['type'] == "above":
-            value = self.intermediate_attack['trigger']['value']
-            sensor_value = self.receive_tag(self.intermediate_attack['trigger']['sensor'])
-            print("sensor_value:", sensor_value, ", value:", value)
-            return sensor_value >= value
-        elif self.intermediate_attack['trigger']['type'] == "below":
-            value = self.intermediate_attack['trigger']['value']
-            sensor_value = self.receive_tag(self.intermediate_attack['trigger']['sensor'])
-            return sensor_value <= value
-        elif self.intermediate_attack['trigger']['type'] == "between":
-            lower_value = self.intermediate_attack['trigger']['lower_value']
-            upper_value = self.intermediate_attack['trigger']['upper_value']
-            sensor_value = self.receive_tag(self.intermediate_attack['trigger']['sensor'])
-            return lower_value <= sensor_value <= upper_value
-        else:
+        start_time = time.time()
+        run = self.evaluate_trigger()
+        self.trigger_times.record(time.time() - start_time)
+        return run
+
+    def evaluate_trigger(self) -> bool:
+        """
+        Evaluate the trigger, see :meth:`check_trigger`.
+
+        :return: Boolean indicating whether or not to run the attack
+        """
+        if self.trigger['type'] == "time":
+            return self.trigger['start'] <= self.get_master_clock() <= self.trigger['end']
+        if self.trigger['type'] not in ("above", "below", "between"):
+            return False
+
+        sensor_value = self.read_trigger_sensor()
+        if sensor_value is None:
             return False
+        if self.trigger['type'] == "above":
+            return sensor_value >= self.trigger['value']
+        if self.trigger['type'] == "below":
+            return sensor_value <= self.trigger['value']
+        return self.trigger['lower_value'] <= sensor_value <= self.trigger['upper_value']
 
     def db_query(self, query, parameters=None):
         """
         Execute a query on the database
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
         This is necessary because of the limited concurrency in SQLite.
 
         :param query: The SQL query to execute in the db
@@ -215,17 +264,21 @@ class SyncedAttack(metaclass=ABCMeta):
                 self.logger.debug(
                     "Failed to connect to db with exception {exc}. Trying {i} more times.".format(
                         exc=exc, i=self.DB_TRIES - i - 1))
-                time.sleep(self.DB_SLEEP_TIME)
+                time.sleep(CONTENTION.backoff(i))
+        CONTENTION.failed()
         self.logger.error(
             "Failed to connect to db. Tried {i} times.".format(i=self.DB_TRIES))
         raise DatabaseError("Failed to get master clock from database")
 
     def get_master_clock(self) -> int:
         """
-        Get the value of the master clock of the physical process through the database.
+        Get the value of the master clock of the physical process through the database, or the
+        shared memory when the plant is kept there.
 
         :return: Iteration in the physical process
         """
+        if self.shared_state is not None:
+            return self.shared_state.master_time()
         # Fetch master_time
         self.db_query("SELECT time FROM master_time WHERE id IS 1")
         master_time = self.cur.fetchone()[0]
@@ -234,12 +287,20 @@ class SyncedAttack(metaclass=ABCMeta):
     def get_sync(self) -> bool:
         """
         Get the sync flag of this attack.
+        With the socket barrier this blocks until the physical process releases this attack.
 
         :return: False if physical process wants the attack to do a iteration, True if not.
         """
+        if self.barrier is not None:
+            master_time = self.barrier.wait()
+            if self.sync_trace is not None:
+                self.sync_trace.released(master_time)
+            return False
         self.db_query("SELECT flag FROM sync WHERE name IS ?",
                          (self.intermediate_attack["name"],))
         flag = bool(self.cur.fetchone()[0])
+        if not flag and self.sync_trace is not None and not self.sync_trace.pending:
+            self.sync_trace.released()
         return flag
 
     def set_sync(self, flag):
@@ -249,9 +310,15 @@ class SyncedAttack(metaclass=ABCMeta):
 
         :param flag: True for sync to 1, false for sync to 0
         """
-        self.db_query("UPDATE sync SET flag=? WHERE name IS ?",
-                         (int(flag), self.intermediate_attack["name"],))
-        self.conn.commit()
+        if self.barrier is not None:
+            if flag:
+                self.barrier.done()
+        else:
+            self.db_query("UPDATE sync SET flag=? WHERE name IS ?",
+                             (int(flag), self.intermediate_attack["name"],))
+            self.conn.commit()
+        if flag and self.sync_trace is not None:
+            self.sync_trace.done()
 
     def set_attack_flag(self, flag):
         """
@@ -266,7 +333,22 @@ class SyncedAttack(metaclass=ABCMeta):
 
     def main_loop(self):
         """
-        The main loop of an attack.
+        The main loop of an attack. When the physical process closes the barrier, the attack
+        stops like on a :code:`SIGTERM`.
+        """
+        try:
+            self.run_iterations()
+        except BarrierError as error:
+            self.logger.debug("{name} barrier closed: {error}".format(
+                name=self.intermediate_attack["name"], error=error))
+            self.sigint_handler(signal.SIGTERM, None)
+
+    def run_iterations(self):
+        """
+        Check the trigger and do an attack step every time the physical process asks for an
+        iteration.
+
+        :raise BarrierError: when the physical process closed the barrier
         """
         while True:
             while self.get_sync():
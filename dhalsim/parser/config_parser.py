@@ -10,6 +10,7 @@ from yamlinclude import YamlIncludeConstructor
 from schema import Schema, Or, And, Use, Optional, SchemaError, Regex
 
 from dhalsim.parser.input_parser import InputParser
+from dhalsim.python2.database import temp_parent
 
 
 class Error(Exception):
@@ -86,6 +87,11 @@ class SchemaParser:
                     str,
                     string_pattern,
                 ),
+                Optional('source'): And(
+                    str,
+                    Use(str.lower),
+                    Or('plc', 'plant'),
+                ),
                 'value': And(
                     Or(float, And(int, Use(float))),
                 ),
@@ -100,6 +106,11 @@ class SchemaParser:
                     str,
                     string_pattern,
                 ),
+                Optional('source'): And(
+                    str,
+                    Use(str.lower),
+                    Or('plc', 'plant'),
+                ),
                 'lower_value': And(
                     Or(float, And(int, Use(float))),
                 ),
@@ -147,7 +158,11 @@ class SchemaParser:
                 'target': And(
                     str,
                     string_pattern
-                )
+                ),
+                Optional('queues'): And(
+                    int,
+                    Schema(lambda i: 1 <= i <= 16, error="'queues' must be between 1 and 16."),
+                ),
             },
             {
                 'type': And(
@@ -237,6 +252,32 @@ class SchemaParser:
             )
         ).validate(data)
 
+    @staticmethod
+    def scada_polling(defaults=None) -> dict:
+        """
+        Schema of the settings of the SCADA pollers. The settings of a PLC have no defaults,
+        because they override those of the experiment.
+
+        :param defaults: dict with the default value of every setting, or None
+        """
+        def key(name):
+            return Optional(name, default=defaults[name]) if defaults else Optional(name)
+
+        return {
+            key('interval'): And(
+                Or(float, And(int, Use(float))),
+                Schema(lambda i: i > 0, error="'interval' must be positive.")),
+            key('timeout'): And(
+                Or(float, And(int, Use(float))),
+                Schema(lambda i: i > 0, error="'timeout' must be positive.")),
+            key('backoff'): And(
+                Or(float, And(int, Use(float))),
+                Schema(lambda i: i >= 1, error="'backoff' must be at least 1.")),
+            key('max_backoff'): And(
+                Or(float, And(int, Use(float))),
+                Schema(lambda i: i > 0, error="'max_backoff' must be positive.")),
+        }
+
     @staticmethod
     def validate_schema(data: dict) -> dict:
         """
@@ -265,7 +306,11 @@ class SchemaParser:
             Optional('actuators'): [And(
                 str,
                 SchemaParser.string_pattern
-            )]
+            )],
+            Optional('scan_period'): And(
+                int,
+                Schema(lambda i: i > 0, error="'scan_period' must be positive.")),
+            Optional('scada_polling'): SchemaParser.scada_polling(),
         }])
 
         config_schema = Schema({
@@ -280,6 +325,19 @@ class SchemaParser:
                 int,
                 Schema(lambda i: i > 0, error="'iterations' must be positive.")),
             Optional('mininet_cli', default=False): bool,
+            Optional('zygote', default=False): bool,
+            Optional('scada_observer', default=False): bool,
+            Optional('barrier', default='sqlite'): And(
+                str,
+                Use(str.lower),
+                Or('sqlite', 'socket'), error="'barrier' should be one of the following: "
+                                              "'sqlite' or 'socket'."),
+            Optional('plant_state', default='sqlite'): And(
+                str,
+                Use(str.lower),
+                Or('sqlite', 'shared_memory'), error="'plant_state' should be one of the "
+                                                     "following: 'sqlite' or 'shared_memory'."),
+            Optional('sync_trace', default=False): bool,
             Optional('log_level', default='info'): And(
                 str,
                 Use(str.lower),
@@ -294,6 +352,60 @@ class SchemaParser:
             Optional('noise_scale', default=0.0): And(
                 float,
                 Schema(lambda i: i >= 0, error="'noise_scale' must be positive.")),
+            Optional('publishing'): {
+                Optional('mode', default='periodic'): And(
+                    str,
+                    Use(str.lower),
+                    Or('periodic', 'deadband'),
+                    error="'mode' should be one of the following: 'periodic' or 'deadband'."),
+                Optional('deadband', default=0.0): And(
+                    Or(float, And(int, Use(float))),
+                    Schema(lambda i: i >= 0, error="'deadband' must be positive.")),
+                Optional('tag_deadbands', default={}): {
+                    str: And(
+                        Or(float, And(int, Use(float))),
+                        Schema(lambda i: i >= 0, error="'tag_deadbands' must be positive."))
+                },
+                Optional('heartbeat', default=10.0): And(
+                    Or(float, And(int, Use(float))),
+                    Schema(lambda i: i > 0, error="'heartbeat' must be positive.")),
+            },
+            Optional('subscriptions'): {
+                Optional('deadband', default=0.0): And(
+                    Or(float, And(int, Use(float))),
+                    Schema(lambda i: i >= 0, error="'deadband' must be positive.")),
+                Optional('heartbeat', default=5.0): And(
+                    Or(float, And(int, Use(float))),
+                    Schema(lambda i: i > 0, error="'heartbeat' must be positive.")),
+            },
+            Optional('scada_polling'): SchemaParser.scada_polling(
+                {'interval': 2.0, 'timeout': 1.0, 'backoff': 2.0, 'max_backoff': 30.0}),
+            Optional('historian'): {
+                Optional('max_bytes', default=0): And(
+                    int,
+                    Schema(lambda i: i >= 0, error="'max_bytes' must be positive.")),
+                Optional('max_seconds', default=0.0): And(
+                    Or(float, And(int, Use(float))),
+                    Schema(lambda i: i >= 0, error="'max_seconds' must be positive.")),
+                Optional('compress', default=False): bool,
+                Optional('tail', default=1000): And(
+                    int,
+                    Schema(lambda i: i > 0, error="'tail' must be positive.")),
+            },
+            Optional('timeseries'): {
+                Optional('max_points', default=100000): And(
+                    int,
+                    Schema(lambda i: i > 0, error="'max_points' must be positive.")),
+            },
+            Optional('local_runtime'): {
+                Optional('processes', default=1): And(
+                    int,
+                    Schema(lambda i: i > 0, error="'processes' must be positive.")),
+                Optional('base_port', default=44900): And(
+                    int,
+                    Schema(lambda i: 1024 < i < 65536,
+                           error="'base_port' must be between 1024 and 65536.")),
+            },
             Optional('attacks'): {
                 Optional('device_attacks'): [SchemaParser.device_attacks],
                 Optional('network_attacks'): [SchemaParser.network_attacks],
@@ -329,6 +441,8 @@ class ConfigParser:
         self.batch_index = None
         self.yaml_path = None
         self.db_path = None
+        self.barrier_path = None
+        self.plant_state_path = None
 
         self.config_path = config_path.absolute()
 
@@ -357,16 +471,21 @@ class ConfigParser:
         :param data: The data to check
         """
         ConfigParser.not_too_many_nodes(data)
+        ConfigParser.local_runtime_without_network_attacks(data)
 
     @staticmethod
     def not_too_many_nodes(data: dict):
         """
         Check if there are not more then 250 plcs and network attacks.
         This would cause trouble with assigning IP and MAC addresses.
+        The local runtime gives every PLC a port instead of an IP, so it has no limit.
 
         :param data: the data to check on
         :raise TooManyNodes: When there are more then 250 nodes in the network
         """
+        if 'local_runtime' in data:
+            return
+
         raise_message = "There are too many nodes in the network. Only 250 nodes are supported."
 
         if 'plcs' in data:
@@ -380,6 +499,19 @@ class ConfigParser:
                 len(data['attacks']['network_attacks']) > 250:
             raise TooManyNodes(raise_message)
 
+    @staticmethod
+    def local_runtime_without_network_attacks(data: dict):
+        """
+        Check that there are no network attacks when the local runtime is used.
+        Network attacks need the Mininet network, which the local runtime does not create.
+
+        :param data: the data to check on
+        :raise NetworkAttackError: When the local runtime is used with network attacks
+        """
+        if 'local_runtime' in data and 'attacks' in data and \
+                data['attacks'].get('network_attacks'):
+            raise NetworkAttackError("Network attacks are not supported by the local runtime.")
+
     @staticmethod
     def apply_schema(config_path: Path) -> dict:
         """
@@ -494,12 +626,14 @@ class ConfigParser:
 
     def generate_temporary_dirs(self):
         """Generates the temporary directory and yaml/db paths"""
-        # Create temp directory and intermediate yaml files in /tmp/
-        temp_directory = tempfile.mkdtemp(prefix='dhalsim_')
+        # Create temp directory and intermediate yaml files in /dev/shm/ when available, or /tmp/
+        temp_directory = tempfile.mkdtemp(prefix='dhalsim_', dir=temp_parent())
         # Change read permissions in tempdir
         os.chmod(temp_directory, 0o775)
         self.yaml_path = Path(temp_directory + '/intermediate.yaml')
         self.db_path = temp_directory + '/dhalsim.sqlite'
+        self.barrier_path = temp_directory + '/barrier.sock'
+        self.plant_state_path = temp_directory + '/plant_state'
 
     def generate_intermediate_yaml(self):
         """Writes the intermediate.yaml file to include all options specified in the config, the plc's and their
@@ -541,12 +675,44 @@ class ConfigParser:
             yaml_data['network_delay_data'] = str(self.data['network_delay_data'])
         # Mininet cli parameter
         yaml_data['mininet_cli'] = self.data['mininet_cli']
+        # Launch the nodes by forking them from one preloaded process
+        yaml_data['zygote'] = self.data['zygote']
+        # Let the SCADA follow the master clock without taking part in the sync
+        yaml_data['scada_observer'] = self.data['scada_observer']
+        # Release the nodes over a socket next to the database, or through the sync table
+        yaml_data['barrier'] = self.data['barrier']
+        if self.data['barrier'] == 'socket':
+            yaml_data['barrier_path'] = self.barrier_path
+        # Keep the plant in shared memory next to the database, or in the plant table
+        yaml_data['plant_state'] = self.data['plant_state']
+        if self.data['plant_state'] == 'shared_memory':
+            yaml_data['plant_state_path'] = self.plant_state_path
+        # Trace when every node was released and done, to find the stragglers of the sync
+        yaml_data['sync_trace'] = self.data['sync_trace']
         # Write intermittent saving interval to intermediate yaml
         if 'saving_interval' in self.data:
             yaml_data['saving_interval'] = self.data['saving_interval']
         # Write gaussian noise scale value to intermediate yaml
         if 'noise_scale' in self.data:
             yaml_data['noise_scale'] = self.data['noise_scale']
+        # Write the ENIP publishing settings of the PLCs to intermediate yaml
+        if 'publishing' in self.data:
+            yaml_data['publishing'] = self.data['publishing']
+        # Write the settings of the tags pushed between PLCs to intermediate yaml
+        if 'subscriptions' in self.data:
+            yaml_data['subscriptions'] = self.data['subscriptions']
+        # Write the settings of the SCADA pollers to intermediate yaml
+        if 'scada_polling' in self.data:
+            yaml_data['scada_polling'] = self.data['scada_polling']
+        # Write the settings of the SCADA output file to intermediate yaml
+        if 'historian' in self.data:
+            yaml_data['historian'] = self.data['historian']
+        # Write the settings of the SCADA time series store to intermediate yaml
+        if 'timeseries' in self.data:
+            yaml_data['timeseries'] = self.data['timeseries']
+        # Write the settings of the runtime without Mininet to intermediate yaml
+        if 'local_runtime' in self.data:
+            yaml_data['local_runtime'] = self.data['local_runtime']
 
         # Demand
         yaml_data['demand'] = self.data['demand']
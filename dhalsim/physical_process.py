@@ -4,7 +4,6 @@ import os
 import signal
 import logging
 from datetime import datetime
-import random
 
 import pandas as pd
 import progressbar
@@ -14,6 +13,11 @@ import time
 from pathlib import Path
 
 from dhalsim.parser.file_generator import BatchReadmeGenerator, GeneralReadmeGenerator
+from dhalsim.python2.barrier import BarrierServer
+from dhalsim.python2.database import CONTENTION, WRITER_BUSY_TIMEOUT, set_busy_timeout, \
+    shared_connection
+from dhalsim.python2.shared_state import MASTER_TIME, open_plant_state
+from dhalsim.python2.sync_trace import PHYSICAL_PROCESS, open_sync_trace
 from dhalsim.py3_logger import get_logger
 import yaml
 
@@ -42,9 +46,6 @@ class PhysicalPlant:
     DB_TRIES = 10
     """Amount of times a db query will retry on a exception"""
 
-    DB_SLEEP_TIME = random.uniform(0.01, 0.1)
-    """Amount of time a db query will wait before retrying"""
-
     def __init__(self, intermediate_yaml):
         signal.signal(signal.SIGINT, self.interrupt)
         signal.signal(signal.SIGTERM, self.interrupt)
@@ -76,6 +77,11 @@ class PhysicalPlant:
 
         # connection to the database
         self.db_path = self.data["db_path"]
+        # Most writes of the plant are not retried, so it waits for a lock like sqlite3 does
+        set_busy_timeout(self.db_path, WRITER_BUSY_TIMEOUT)
+
+        # The plant in shared memory instead of the plant table, when configured
+        self.shared_state = open_plant_state(self.data)
 
         # get simulator: WNTR or epynet. This will impact how the controls, actuator status, and results are handled
         self.simulator = self.data["simulator"]
@@ -122,6 +128,20 @@ class PhysicalPlant:
 
         self.db_update_string = "UPDATE plant SET value = ? WHERE name = ?"
 
+        # PLCs that only scan every scan_period iterations, they are left out of the other barriers
+        self.scan_periods = {plc['name']: plc['scan_period'] for plc in self.data['plcs']
+                             if plc.get('scan_period', 1) > 1}
+        self.barrier_scans = 0
+        self.barrier_wait = 0.0
+
+        # Nodes are released and waited for over a socket, instead of through the sync table
+        self.barrier = None
+        if self.data.get('barrier', 'sqlite') == 'socket':
+            self.barrier = BarrierServer(self.data['barrier_path'], self.get_sync_names())
+
+        # When every iteration was released and the last node was done, when the sync is traced
+        self.sync_trace = open_sync_trace(self.data, PHYSICAL_PROCESS)
+
     def prepare_wntr_simulator(self):
         self.logger.info("Preparing wntr simulation")
         self.wn = wntr.network.WaterNetworkModel(self.data['inp_file'])
@@ -183,6 +203,13 @@ class PhysicalPlant:
         # epynet
         self.actuator_list = None
 
+        # epynet, slots of the tags in the NetworkState arrays. Resolved when the simulation starts
+        self.tank_slots = None
+        self.junction_slots = None
+        self.scada_junction_slots = None
+        self.pump_slots = None
+        self.valve_slots = None
+
     def create_control_dict(self, actuator, dummy_condition):
         act_dict = dict.fromkeys(['actuator', 'parameter', 'value', 'condition', 'name'])
         act_dict['actuator'] = self.wn.get_link(actuator)
@@ -287,6 +314,19 @@ class PhysicalPlant:
 
         self.actuator_list = dict(zip(actuator_names, actuator_status))
 
+    def resolve_state_slots(self, network_state):
+        """
+        Resolve once the slots of the tanks, junctions, pumps and valves in the epynet
+        NetworkState, so every step reads the state arrays without name lookups.
+
+        :param network_state: the NetworkState returned by simulate_step
+        """
+        self.tank_slots = network_state.node_slots(self.tank_list)
+        self.junction_slots = network_state.node_slots(self.junction_list)
+        self.scada_junction_slots = network_state.node_slots(self.scada_junction_list)
+        self.pump_slots = network_state.link_slots(self.pump_list)
+        self.valve_slots = network_state.link_slots(self.valve_list)
+
     def register_results(self, results=None):
 
         # Results are divided into: nodes: reservoir and tanks, links: flows and status
@@ -305,8 +345,7 @@ class PhysicalPlant:
 
         if self.simulator == 'epynet':
             # Get tanks levels
-            for tank in self.tank_list:
-                self.values_list.extend([results[tank]['pressure']])
+            self.values_list.extend(results.nodes['pressure'][self.tank_slots].tolist())
         elif self.simulator == 'wntr':
             for tank in self.tank_list:
                 self.values_list.extend([self.wn.get_node(tank).level])
@@ -315,9 +354,7 @@ class PhysicalPlant:
 
         if self.simulator == 'epynet':
             # Get junction  levels
-            for junction in self.junction_list:
-                self.values_list.extend(
-                    [self.wn.junctions[junction].pressure.iloc[-1]])
+            self.values_list.extend(results.nodes['pressure'][self.junction_slots].tolist())
         elif self.simulator == 'wntr':
             for junction in self.junction_list:
                 self.values_list.extend(
@@ -327,8 +364,9 @@ class PhysicalPlant:
 
         if self.simulator == 'epynet':
             # Get pumps flows and status
-            for pump in self.pump_list:
-                self.values_list.extend([results[pump]['flow'], results[pump]['status']])
+            pumps = results.links[self.pump_slots]
+            for flow, status in zip(pumps['flow'].tolist(), pumps['status'].tolist()):
+                self.values_list.extend([flow, status])
 
         elif self.simulator == 'wntr':
 
@@ -364,13 +402,16 @@ class PhysicalPlant:
 
     def update_controls(self):
         """Updates all controls in WNTR."""
-        conn = sqlite3.connect(self.data["db_path"])
+        conn = shared_connection(self.data["db_path"])
         c = conn.cursor()
 
         for control in self.control_list:
-            rows_1 = c.execute('SELECT value FROM plant WHERE name = ?', (control['name'],)).fetchone()
-            conn.commit()
-            new_status = int(rows_1[0])
+            if self.shared_state is not None:
+                new_status = int(self.shared_state.get(control['name']))
+            else:
+                rows_1 = c.execute('SELECT value FROM plant WHERE name = ?', (control['name'],)).fetchone()
+                conn.commit()
+                new_status = int(rows_1[0])
 
             control['value'] = new_status
 
@@ -385,7 +426,7 @@ class PhysicalPlant:
         """Save a ordered tuple of pk field names in self._what."""
         query = "PRAGMA table_info(%s)" % self._name
 
-        with sqlite3.connect(self._path) as conn:
+        with shared_connection(self._path) as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(query)
@@ -458,7 +499,7 @@ class PhysicalPlant:
         """
 
         #todo: Prepare query statements for this
-        conn = sqlite3.connect(self.data["db_path"])
+        conn = shared_connection(self.data["db_path"])
         c = conn.cursor()
         c.execute("""SELECT count(*)
                         FROM sync
@@ -466,6 +507,57 @@ class PhysicalPlant:
         flag = int(c.fetchone()[0]) == 0
         return flag
 
+    def get_sync_names(self):
+        """
+        :return: names of the nodes in the sync table
+        """
+        conn = shared_connection(self.data["db_path"])
+        c = conn.cursor()
+        c.execute("SELECT name FROM sync")
+        return [row[0] for row in c.fetchall()]
+
+    def wait_for_plcs(self):
+        """
+        Wait until all the nodes that were asked to scan have finished their loop.
+        """
+        start = time.time()
+        # The nodes start released, before the first request
+        if self.sync_trace is not None and not self.sync_trace.pending:
+            self.sync_trace.released(self.master_time)
+        if self.barrier is not None:
+            self.barrier.wait()
+        else:
+            while not self.get_plcs_ready():
+                time.sleep(0.01)
+        self.barrier_wait += time.time() - start
+        if self.sync_trace is not None:
+            self.sync_trace.done()
+
+    def request_scans(self, cursor):
+        """
+        Reset the sync flag of the nodes that are due to scan at the current master clock.
+        A PLC with a :code:`scan_period` is due when the master clock is a multiple of it,
+        the other nodes are due on every iteration. With the socket barrier the due nodes are
+        released instead.
+
+        :param cursor: cursor of the connection to commit the update with
+        """
+        not_due = [name for name, period in self.scan_periods.items()
+                   if self.master_time % period != 0]
+        if self.sync_trace is not None:
+            self.sync_trace.released(self.master_time)
+        if self.barrier is not None:
+            self.barrier_scans += self.barrier.release(
+                [name for name in self.barrier.participants if name not in not_due],
+                self.master_time)
+            return
+        if not_due:
+            cursor.execute("UPDATE sync SET flag=0 WHERE name NOT IN ({names})".format(
+                names=", ".join("?" * len(not_due))), not_due)
+        else:
+            cursor.execute("UPDATE sync SET flag=0")
+        self.barrier_scans += cursor.rowcount
+
     def get_attack_flag(self, name):
         """
         Get the attack flag of this attack.
@@ -473,7 +565,7 @@ class PhysicalPlant:
         :return: False if attack not running, true otherwise
         """
 
-        conn = sqlite3.connect(self.data["db_path"])
+        conn = shared_connection(self.data["db_path"])
         c = conn.cursor()
         c.execute("REPLACE INTO master_time (id, time) VALUES(1, ?)", (str(self.master_time),))
         conn.commit()
@@ -499,6 +591,10 @@ class PhysicalPlant:
         what_list overwrites the given what tuple,
         eg new what tuple: ``(value, what[0], what[1], ...)``
         """
+        if self.shared_state is not None:
+            self.shared_state.set(what, value)
+            return value
+
         what_list = [value]
 
         what_tuple = self.convert_to_tuple(what)
@@ -507,7 +603,7 @@ class PhysicalPlant:
         what = tuple(what_list)
 
         for i in range(self.DB_TRIES):
-            with sqlite3.connect(self._path) as conn:
+            with shared_connection(self._path) as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(self._set_query, what)
@@ -516,17 +612,21 @@ class PhysicalPlant:
 
                 except sqlite3.OperationalError as e:
                     self.logger.info('Failed writing to DB')
-                    time.sleep(self.DB_SLEEP_TIME)
+                    time.sleep(CONTENTION.backoff(i))
+        CONTENTION.failed()
         self.logger.error(
             "Failed to connect to db. Tried {i} times.".format(i=self.DB_TRIES))
         raise DatabaseError("Failed to get master clock from database")
 
     def get_from_db(self, what):
         """Returns the first element of the result tuple."""
+        if self.shared_state is not None:
+            return self.shared_state.get(what)
+
         what_tuple = self.convert_to_tuple(what)
 
         for i in range(self.DB_TRIES):
-            with sqlite3.connect(self.db_path) as conn:
+            with shared_connection(self.db_path) as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(self._get_query, what_tuple)
@@ -535,7 +635,8 @@ class PhysicalPlant:
 
                 except sqlite3.OperationalError as e:
                     self.logger.info('Failed reading to DB')
-                    time.sleep(self.DB_SLEEP_TIME)
+                    time.sleep(CONTENTION.backoff(i))
+        CONTENTION.failed()
         self.logger.error(
             "Failed to connect to db. Tried {i} times.".format(i=self.DB_TRIES))
         raise DatabaseError("Failed to get master clock from database")
@@ -573,19 +674,19 @@ class PhysicalPlant:
         simulation_duration = iteration_limit*self.simulation_step
         self.wn.set_time_params(duration=simulation_duration, hydraulic_step=self.simulation_step)
         self.wn.init_simulation(interactive=True)
+        self.resolve_state_slots(self.wn.network_state)
         internal_epynet_step = 1
         simulation_time = 0
         step_results = None
 
         while internal_epynet_step:
 
-            conn = sqlite3.connect(self.data["db_path"])
+            conn = shared_connection(self.data["db_path"])
             c = conn.cursor()
-            c.execute("REPLACE INTO master_time (id, time) VALUES(1, ?)", (str(self.master_time),))
+            self.write_master_time(c)
             conn.commit()
 
-            while not self.get_plcs_ready():
-                time.sleep(0.01)
+            self.wait_for_plcs()
 
             self.update_actuators()
 
@@ -621,9 +722,9 @@ class PhysicalPlant:
                 self.write_results(self.results_list)
 
             # Set sync flags for nodes
-            conn = sqlite3.connect(self.data["db_path"])
+            conn = shared_connection(self.data["db_path"])
             c = conn.cursor()
-            c.execute("UPDATE sync SET flag=0")
+            self.request_scans(c)
             conn.commit()
 
             simulation_time = simulation_time + internal_epynet_step
@@ -633,15 +734,14 @@ class PhysicalPlant:
         self.wn.options.time.duration = self.wn.options.time.hydraulic_timestep
 
         while self.master_time < iteration_limit:
-            conn = sqlite3.connect(self.data["db_path"])
+            conn = shared_connection(self.data["db_path"])
             c = conn.cursor()
-            c.execute("REPLACE INTO master_time (id, time) VALUES(1, ?)", (str(self.master_time),))
+            self.write_master_time(c)
             conn.commit()
 
             self.master_time = self.master_time + 1
 
-            while not self.get_plcs_ready():
-                time.sleep(0.01)
+            self.wait_for_plcs()
 
             self.update_controls()
 
@@ -672,78 +772,99 @@ class PhysicalPlant:
                 self.write_results(self.results_list)
 
             # Set sync flags for nodes
-            c.execute("UPDATE sync SET flag=0")
+            self.request_scans(c)
             conn.commit()
 
+    def write_master_time(self, cursor):
+        """
+        Write the master clock to the database, and to the shared memory when the plant is kept
+        there.
+
+        :param cursor: cursor of the connection to commit the update with
+        """
+        cursor.execute("REPLACE INTO master_time (id, time) VALUES(1, ?)", (str(self.master_time),))
+        if self.shared_state is not None:
+            self.shared_state.set(MASTER_TIME, self.master_time)
+
+    def update_db(self, cursor, name, value):
+        """
+        Write a value of the plant with a cursor, or to the shared memory when the plant is kept
+        there.
+
+        :param cursor: cursor of the connection to commit the update with
+        :param name: name of the tag
+        :param value: the new value
+        """
+        if self.shared_state is not None:
+            self.shared_state.set(name, value)
+        else:
+            cursor.execute(self.db_update_string, (value, name,))
+
     def update_tanks(self, network_state=None):
         """Update tanks in database."""
 
         if self.simulator == 'epynet':
-            for tank in self.tank_list:
-                level = network_state[tank]['pressure']
-                tank_name = tank
-                self.set_to_db(tank_name, level)
+            levels = network_state.nodes['pressure'][self.tank_slots].tolist()
+            for tank, level in zip(self.tank_list, levels):
+                self.set_to_db(tank, level)
 
         elif self.simulator == 'wntr':
-            conn = sqlite3.connect(self.data["db_path"])
+            conn = shared_connection(self.data["db_path"])
             c = conn.cursor()
             for tank in self.tank_list:
                 a_level = self.wn.get_node(tank).level
-                c.execute(self.db_update_string, (str(a_level), tank,))
-                conn.commit()
+                self.update_db(c, tank, str(a_level))
+            conn.commit()
         else:
             return
 
     def update_pumps(self, network_state=None):
         """"Update pumps in database."""
         if self.simulator == 'epynet':
-            for pump in self.pump_list:
-                flow = network_state[pump]['flow']
-                pump_name = pump + 'F'
-                self.set_to_db(pump_name, flow)
+            flows = network_state.links['flow'][self.pump_slots].tolist()
+            for pump, flow in zip(self.pump_list, flows):
+                self.set_to_db(pump + 'F', flow)
 
         elif self.simulator == 'wntr':
-            conn = sqlite3.connect(self.data["db_path"])
+            conn = shared_connection(self.data["db_path"])
             c = conn.cursor()
             for pump in self.pump_list:
                 flow = Decimal(self.wn.get_link(pump).flow)
-                c.execute(self.db_update_string, (str(flow), pump + "F",))
-                conn.commit()
+                self.update_db(c, pump + "F", str(flow))
+            conn.commit()
         else:
             return
 
     def update_valves(self, network_state=None):
         """Update valve in database."""
         if self.simulator == 'epynet':
-            for valve in self.valve_list:
-                flow = network_state[valve]['flow']
-                valve_name = valve + 'F'
-                self.set_to_db(valve_name, flow)
+            flows = network_state.links['flow'][self.valve_slots].tolist()
+            for valve, flow in zip(self.valve_list, flows):
+                self.set_to_db(valve + 'F', flow)
 
         elif self.simulator == 'wntr':
-            conn = sqlite3.connect(self.data["db_path"])
+            conn = shared_connection(self.data["db_path"])
             c = conn.cursor()
             for valve in self.valve_list:
                 flow = Decimal(self.wn.get_link(valve).flow)
-                c.execute(self.db_update_string, (str(flow), valve + "F",))
-                conn.commit()
+                self.update_db(c, valve + "F", str(flow))
+            conn.commit()
         else:
             return
 
     def update_junctions(self, network_state=None):
         """Update junction pressure in database."""
         if self.simulator == 'epynet':
-            for junction in self.scada_junction_list:
-                level = self.wn.junctions[junction].pressure.iloc[-1]
-                junction_name = junction
-                self.set_to_db(junction_name, level)
+            levels = network_state.nodes['pressure'][self.scada_junction_slots].tolist()
+            for junction, level in zip(self.scada_junction_list, levels):
+                self.set_to_db(junction, level)
         elif self.simulator == 'wntr':
-            conn = sqlite3.connect(self.data["db_path"])
+            conn = shared_connection(self.data["db_path"])
             c = conn.cursor()
             for junction in self.scada_junction_list:
                 level = Decimal(self.wn.get_node(junction).head - self.wn.get_node(junction).elevation)
-                c.execute(self.db_update_string, (str(level), junction,))
-                conn.commit()
+                self.update_db(c, junction, str(level))
+            conn.commit()
         else:
             return
 
@@ -754,6 +875,15 @@ class PhysicalPlant:
 
     def finish(self):
         self.write_results(self.results_list)
+        self.logger.info("Requested {scans} node scans, waited {wait:.2f}s for them.".format(
+            scans=self.barrier_scans, wait=self.barrier_wait))
+        self.logger.info("Database contention: {stats}".format(stats=CONTENTION.as_dict()))
+        if self.barrier is not None:
+            self.logger.debug("Barrier: {stats}".format(stats=self.barrier.stats()))
+        if self.sync_trace is not None:
+            self.sync_trace.close()
+        if self.shared_state is not None:
+            self.logger.debug("Shared state: {stats}".format(stats=self.shared_state.stats()))
         end_time = datetime.now()
 
         if 'batch_simulations' in self.data:
@@ -769,6 +899,9 @@ class PhysicalPlant:
         else:
             GeneralReadmeGenerator(self.intermediate_yaml, self.data['start_time'],
                                    end_time, False, self.master_time, self.wn, self.simulation_step).write_readme()
+        # The nodes stop when the barrier closes, so it stays open until the output is written
+        if self.barrier is not None:
+            self.barrier.close()
         sys.exit(0)
 
     def set_initial_values(self):
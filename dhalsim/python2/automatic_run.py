@@ -1,9 +1,11 @@
 import argparse
+import json
 import logging
 import os
 import signal
 import subprocess
 import sys
+import time
 import py2_logger
 from pathlib import Path
 
@@ -17,6 +19,48 @@ from mininet.link import TCLink
 from topo.simple_topo import SimpleTopo
 from topo.complex_topo import ComplexTopo
 
+empty_loc = '/dev/null'
+
+
+class ZygoteWorker(object):
+    """
+    Handle of a node forked by the zygote, with the methods of :class:`subprocess.Popen` that
+    :class:`GeneralCPS` uses. The zygote collects the exit status of its nodes, so a finished
+    node has return code 0.
+
+    :param pid: pid of the node
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, 0)
+            except OSError:
+                self.returncode = 0
+        return self.returncode
+
+    def wait(self):
+        while self.poll() is None:
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, sig)
+            except OSError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
 
 class GeneralCPS(MiniCPS):
     """
@@ -76,6 +120,8 @@ class GeneralCPS(MiniCPS):
         self.scada_process = None
         self.plant_process = None
         self.attacker_processes = None
+        self.zygote_process = None
+        self.tcpdump_processes = []
 
         self.automatic_start()
         self.poll_processes()
@@ -92,19 +138,31 @@ class GeneralCPS(MiniCPS):
         """
         This starts all the processes for plcs, etc.
         """
+        if self.data.get("zygote"):
+            self.start_zygote()
+
         self.plc_processes = []
         if "plcs" in self.data:
             automatic_plc_path = Path(__file__).parent.absolute() / "automatic_plc.py"
             for i, plc in enumerate(self.data["plcs"]):
                 node = self.net.get(plc["name"])
+                if self.zygote_process:
+                    self.plc_processes.append(
+                        self.launch_from_zygote('plc', i, node, plc["interface"]))
+                    continue
                 cmd = ["python2", str(automatic_plc_path), str(self.intermediate_yaml), str(i)]
                 self.plc_processes.append(node.popen(cmd, stderr=sys.stderr, stdout=sys.stdout))
 
         self.logger.info("Launched the PLCs processes.")
 
-        automatic_scada_path = Path(__file__).parent.absolute() / "automatic_scada.py"
-        scada_cmd = ["python2", str(automatic_scada_path), str(self.intermediate_yaml)]
-        self.scada_process = self.net.get('scada').popen(scada_cmd, stderr=sys.stderr, stdout=sys.stdout)
+        if self.zygote_process:
+            self.scada_process = self.launch_from_zygote('scada', None, self.net.get('scada'),
+                                                         self.data["scada"]["interface"])
+        else:
+            automatic_scada_path = Path(__file__).parent.absolute() / "automatic_scada.py"
+            scada_cmd = ["python2", str(automatic_scada_path), str(self.intermediate_yaml)]
+            self.scada_process = self.net.get('scada').popen(scada_cmd, stderr=sys.stderr,
+                                                             stdout=sys.stdout)
 
         self.logger.info("Launched the SCADA process.")
 
@@ -125,6 +183,37 @@ class GeneralCPS(MiniCPS):
 
         self.logger.debug("Launched the plant processes.")
 
+    def start_zygote(self):
+        """
+        Start the zygote, that forks the PLCs and the SCADA from one preloaded process.
+        """
+        zygote_path = Path(__file__).parent.absolute() / "zygote.py"
+        self.zygote_process = subprocess.Popen(
+            ["python2", str(zygote_path), str(self.intermediate_yaml)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=sys.stderr)
+
+    def launch_from_zygote(self, kind, index, node, interface):
+        """
+        Fork a node from the zygote into the network namespace of a Mininet host, and start
+        a tcpdump on its interface like the node launcher scripts do.
+
+        :param kind: :code:`plc` or :code:`scada`
+        :param index: index of the PLC in the intermediate yaml
+        :param node: the Mininet host
+        :param interface: the interface of the host to capture
+        :return: a :class:`ZygoteWorker` for the node
+        """
+        pcap = Path(self.data["output_path"]) / (interface + '.pcap')
+        no_output = open(empty_loc, 'w')
+        self.tcpdump_processes.append(node.popen(['tcpdump', '-i', interface, '-w', str(pcap)],
+                                                 stderr=no_output, stdout=no_output))
+
+        request = {'kind': kind, 'index': index, 'netns': node.pid, 'launched': time.time()}
+        self.zygote_process.stdin.write(json.dumps(request) + "\n")
+        self.zygote_process.stdin.flush()
+        reply = json.loads(self.zygote_process.stdout.readline())
+        return ZygoteWorker(reply['pid'])
+
     def poll_processes(self):
         """Polls for all processes and finishes if one closes"""
         processes = []
@@ -190,6 +279,18 @@ class GeneralCPS(MiniCPS):
             except Exception as msg:
                 self.logger.error("Exception shutting down plant_process: " + str(msg))
 
+        for tcpdump in self.tcpdump_processes:
+            if tcpdump.poll() is None:
+                try:
+                    self.end_process(tcpdump)
+                except Exception as msg:
+                    self.logger.error("Exception shutting down tcpdump: " + str(msg))
+
+        if self.zygote_process is not None and self.zygote_process.poll() is None:
+            # The zygote stops when it gets no more requests
+            self.zygote_process.stdin.close()
+            self.zygote_process.wait()
+
         cmd = 'sudo pkill -f "python2 -m cpppo.server.enip"'
         subprocess.call(cmd, shell=True, stderr=sys.stderr, stdout=sys.stdout)
 
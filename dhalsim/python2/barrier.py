@@ -0,0 +1,298 @@
+import errno
+import os
+import select
+import socket
+import time
+
+CONNECT_RETRY_TIME = 0.05
+"""Time in seconds a participant waits before connecting again to a barrier that is not up yet"""
+
+
+class BarrierError(Exception):
+    """
+    Raised when the connection to the barrier is lost.
+    """
+
+
+class LineSocket(object):
+    """
+    A stream socket exchanging newline terminated ascii messages.
+    """
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.buffer = b""
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def send(self, *words):
+        self.socket.sendall((" ".join(str(word) for word in words) + "\n").encode('ascii'))
+
+    def read(self):
+        """
+        Read the data that is available, without blocking on a socket that select returned.
+
+        :return: list of the complete messages received, each split in words
+        :raise BarrierError: when the other side closed the connection
+        """
+        data = self.socket.recv(4096)
+        if not data:
+            raise BarrierError("Connection closed")
+        self.buffer += data
+        messages = []
+        while b"\n" in self.buffer:
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            messages.append(line.decode('ascii').split())
+        return messages
+
+    def receive(self):
+        """
+        Block until a complete message is received.
+
+        :return: the message split in words
+        :raise BarrierError: when the other side closed the connection
+        """
+        while b"\n" not in self.buffer:
+            data = self.socket.recv(4096)
+            if not data:
+                raise BarrierError("Connection closed")
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line.decode('ascii').split()
+
+    def close(self):
+        self.socket.close()
+
+
+class BarrierServer(object):
+    """
+    Releases the nodes for an iteration of the physical process and waits until they are done,
+    over a Unix domain socket. This replaces resetting the flags in the :code:`sync` table and
+    polling it until every node set its flag again.
+
+    Every participant keeps one connection open. A release writes one message to every node
+    that is due, and :meth:`wait` blocks in :code:`select` on the connections until the last of
+    those nodes answered, so nothing is polled. A node that is released before it joined gets
+    the message when it joins, like a flag in the :code:`sync` table that is already reset.
+    A node that closes its connection is not waited for anymore.
+
+    The socket is a file, so the nodes in the Mininet hosts reach it in the same directory as
+    the database.
+
+    :param path: path of the Unix domain socket
+    :param participants: names of the nodes that take part in the barrier
+    """
+
+    def __init__(self, path, participants):
+        self.path = str(path)
+        self.participants = list(participants)
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        os.chmod(self.path, 0o777)
+        self.listener.listen(socket.SOMAXCONN)
+
+        self.joined = {}
+        self.unnamed = []
+        self.queued = {}
+        self.waiting = set()
+        self.left = set()
+        self.last_done = None
+
+        # Counters
+        self.releases = 0
+        self.released = 0
+        self.last = dict((name, 0) for name in self.participants)
+
+    def release(self, names, master_time):
+        """
+        Ask nodes to do an iteration.
+
+        :param names: names of the nodes that are due
+        :param master_time: the iteration of the physical process
+        :return: amount of nodes that were released
+        """
+        self.releases += 1
+        released = 0
+        for name in names:
+            if name in self.left:
+                continue
+            self.waiting.add(name)
+            released += 1
+            if name in self.joined:
+                self.send_step(name, master_time)
+            else:
+                self.queued[name] = master_time
+        self.released += released
+        return released
+
+    def send_step(self, name, master_time):
+        try:
+            self.joined[name].send("step", master_time)
+        except socket.error:
+            self.leave(self.joined[name], name)
+
+    def wait(self, timeout=None):
+        """
+        Block until every released node is done.
+
+        :param timeout: maximum time in seconds to wait, None to wait as long as it takes
+        :return: time the last node was done, or None when the timeout passed first
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.waiting:
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            connections = [self.listener] + self.unnamed + list(self.joined.values())
+            try:
+                readable = select.select(connections, [], [], remaining)[0]
+            except select.error as error:
+                if error.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not readable:
+                return None
+            for connection in readable:
+                if connection is self.listener:
+                    self.accept()
+                else:
+                    self.handle(connection)
+        return self.last_done
+
+    def accept(self):
+        connection, _ = self.listener.accept()
+        self.unnamed.append(LineSocket(connection))
+
+    def name_of(self, connection):
+        for name, joined in self.joined.items():
+            if joined is connection:
+                return name
+        return None
+
+    def handle(self, connection):
+        name = self.name_of(connection)
+        try:
+            messages = connection.read()
+        except (BarrierError, socket.error):
+            self.leave(connection, name)
+            return
+        for message in messages:
+            if message[0] == "join" and name is None and len(message) == 2:
+                name = message[1]
+                if not self.join(connection, name):
+                    return
+            elif message[0] == "done" and name is not None and name in self.waiting:
+                self.waiting.discard(name)
+                self.last_done = time.time()
+                if not self.waiting:
+                    self.last[name] += 1
+
+    def join(self, connection, name):
+        """
+        Register the connection of a node, and send it the iteration it was released for
+        before it joined.
+
+        :return: False when the name is unknown or already joined, the connection is closed
+        """
+        self.unnamed.remove(connection)
+        if name not in self.last or name in self.joined:
+            connection.close()
+            return False
+        self.joined[name] = connection
+        self.left.discard(name)
+        if name in self.queued:
+            self.send_step(name, self.queued.pop(name))
+        return True
+
+    def leave(self, connection, name):
+        connection.close()
+        if name is None:
+            if connection in self.unnamed:
+                self.unnamed.remove(connection)
+            return
+        del self.joined[name]
+        self.left.add(name)
+        self.waiting.discard(name)
+        self.queued.pop(name, None)
+
+    def close(self):
+        for connection in self.unnamed + list(self.joined.values()):
+            connection.close()
+        self.listener.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def stats(self):
+        """
+        :return: dict with the counters of the barrier, and how often every node was the last
+                 one to be done
+        """
+        return {'releases': self.releases,
+                'released': self.released,
+                'joined': len(self.joined),
+                'left': sorted(self.left),
+                'last': dict(self.last)}
+
+
+class BarrierClient(object):
+    """
+    A node taking part in a :class:`BarrierServer`. The connection is made on the first
+    :meth:`wait`, and retried until the physical process has opened the barrier.
+
+    :param path: path of the Unix domain socket
+    :param name: name of this node, as in the :code:`sync` table
+    """
+
+    def __init__(self, path, name):
+        self.path = str(path)
+        self.name = name
+        self.connection = None
+
+    def connect(self):
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                break
+            except socket.error as error:
+                sock.close()
+                if error.errno not in (errno.ENOENT, errno.ECONNREFUSED):
+                    raise
+                time.sleep(CONNECT_RETRY_TIME)
+        self.connection = LineSocket(sock)
+        self.connection.send("join", self.name)
+
+    def wait(self):
+        """
+        Block until the physical process asks this node to do an iteration.
+
+        :return: the iteration of the physical process
+        :raise BarrierError: when the physical process closed the barrier
+        """
+        if self.connection is None:
+            self.connect()
+        try:
+            message = self.connection.receive()
+        except socket.error as error:
+            raise BarrierError("Connection lost: " + str(error))
+        if message[0] != "step":
+            raise BarrierError("Unexpected message: " + " ".join(message))
+        return int(message[1])
+
+    def done(self):
+        """
+        Tell the physical process this node finished its iteration.
+
+        :raise BarrierError: when the physical process closed the barrier
+        """
+        try:
+            self.connection.send("done")
+        except socket.error as error:
+            raise BarrierError("Connection lost: " + str(error))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
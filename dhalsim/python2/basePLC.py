@@ -5,37 +5,91 @@ import thread
 import numpy as np
 from minicps.devices import PLC
 
+from enip_server import EnipServer, TagTable
+from publishing import DeadbandPublisher
+from tag_io import TagIO
+
 
 class BasePLC(PLC):
 
+    PUBLISH_PERIOD = 0.05
+    """Time in seconds between two publications in periodic mode, and between two checks of
+    the master clock in deadband mode"""
+
     def send_system_state(self, a, b):
+        # The tags are read with one query per tick, through the connection of this thread
+        tag_io = TagIO(self.state['path'], [tag[0] for tag in self.tags],
+                       shared_state=self.shared_state)
+        if self.publishing['mode'] == 'deadband':
+            self.publish_on_change(tag_io)
+            return
+
         while self.reader:
-            values = []
-            # Send sensor values (may have gaussian noise)
-            for tag in self.sensors:
-                with self.lock:
-                    # noinspection PyBroadException
-                    try:
-                        # Gaussian noise added with respect to noise_scale
-                        values.append(float(self.get(tag)) + np.random.normal(0, self.noise_scale))
-                    except Exception:
-                        self.logger.error("Exception trying to get the tag.")
-                        time.sleep(0.05)
-                        continue
-            # Send actuator values (unaffected by noise)
-            for tag in self.actuators:
-                with self.lock:
-                    # noinspection PyBroadException
-                    try:
-                        values.append(self.get(tag))
-                    except Exception:
-                        self.logger.error("Exception trying to get the tag.")
-                        time.sleep(0.05)
-                        continue
-            self.send_multiple(self.tags, values, self.send_adddress)
-            time.sleep(0.05)
-
-    def set_parameters(self, sensors, actuators, values, reader, lock, send_address, noise_scale, week_index=0):
+            with self.lock:
+                # noinspection PyBroadException
+                try:
+                    tag_io.refresh()
+                    # Send sensor values (may have gaussian noise)
+                    sensors = np.array([float(tag_io.get(tag[0])) for tag in self.sensors])
+                    sensors += np.random.normal(0, self.noise_scale, len(self.sensors))
+                    values = sensors.tolist()
+                    # Send actuator values (unaffected by noise)
+                    values.extend(tag_io.get(tag[0]) for tag in self.actuators)
+                except Exception:
+                    self.logger.error("Exception trying to get the tags.")
+                    time.sleep(self.PUBLISH_PERIOD)
+                    continue
+            self.publish(self.tags, values)
+            time.sleep(self.PUBLISH_PERIOD)
+
+    def publish_on_change(self, tag_io):
+        """
+        Publish the tags once per hydraulic step, when the master clock advanced, and only the
+        tags that moved more than their deadband or reached the heartbeat.
+
+        :param tag_io: the :class:`~dhalsim.python2.tag_io.TagIO` of the publishing thread
+        """
+        self.publisher = DeadbandPublisher([tag[0] for tag in self.sensors],
+                                           [tag[0] for tag in self.actuators],
+                                           self.noise_scale,
+                                           self.publishing['deadband'],
+                                           self.publishing['tag_deadbands'],
+                                           self.publishing['heartbeat'])
+        last_time = None
+        while self.reader:
+            with self.lock:
+                # noinspection PyBroadException
+                try:
+                    master_time = tag_io.master_time()
+                    if master_time == last_time and not self.publisher.heartbeat_due(time.time()):
+                        values = None
+                    else:
+                        tag_io.refresh()
+                        values = [float(tag_io.get(tag[0])) for tag in self.tags]
+                except Exception:
+                    self.logger.error("Exception trying to get the tags.")
+                    time.sleep(self.PUBLISH_PERIOD)
+                    continue
+
+            if values is not None:
+                last_time = master_time
+                indexes, send = self.publisher.select(values, time.time())
+                if indexes:
+                    self.publish([self.tags[i] for i in indexes], send)
+            time.sleep(self.PUBLISH_PERIOD)
+
+    def publish(self, tags, values):
+        """
+        Update the values served by the ENIP server of this PLC. The server runs in this
+        process, so this is a memory write.
+
+        :param tags: the tag tuples to update
+        :param values: the new values
+        """
+        self.tag_table.update(tags, values)
+
+    def set_parameters(self, sensors, actuators, values, reader, lock, send_address, noise_scale,
+                       week_index=0, publishing=None):
         self.sensors = sensors
         self.actuators = actuators
         self.tags = self.sensors + self.actuators
@@ -45,14 +99,57 @@ class BasePLC(PLC):
         self.send_adddress = send_address
         self.noise_scale = noise_scale
         self.week_index = week_index
+        self.publishing = publishing or {'mode': 'periodic'}
+        self.publisher = None
+        self.tag_table = None
+        self.enip_server = None
 
-    def sigint_handler(self, sig, frame):
+    def receive(self, what, address, **kwargs):
+        """
+        Receive a tag from another ENIP server through the persistent sessions of
+        :code:`self.enip_client`, instead of starting a cpppo client process.
+
+        :param what: tag tuple, like :code:`('T0', 1)`
+        :param address: :code:`ip` or :code:`ip:port` of the server
+        :return: the value as a string, like the cpppo client prints it
+        """
+        return repr(self.enip_client.read_tag(address, what))
+
+    def receive_multiple(self, what, address, **kwargs):
+        """
+        Receive several tags from another ENIP server with one request.
+
+        :param what: list of tag tuples
+        :param address: :code:`ip` or :code:`ip:port` of the server
+        :return: list with the values as strings
+        """
+        return [repr(value) for value in self.enip_client.read_tags(address, what)]
+
+    def shutdown(self):
+        """
+        Stop publishing and serving the tags of this PLC.
+        """
         self.logger.debug('PLC shutdown commencing.')
         self.reader = False
+        if self.enip_server is not None:
+            self.enip_server.stop()
+
+    def sigint_handler(self, sig, frame):
+        self.shutdown()
         sys.exit(0)
 
     def startup(self):
         signal.signal(signal.SIGINT, self.sigint_handler)
         signal.signal(signal.SIGTERM, self.sigint_handler)
+        self.start_serving()
+
+    def start_serving(self):
+        """
+        Start the ENIP server of this PLC and the thread that publishes the tags to it.
+        """
+        # Serve the tags from this process, the publishing thread updates the table
+        self.tag_table = TagTable(self.tags, self.values)
+        self.enip_server = EnipServer(self.send_adddress, self.tag_table)
+        self.enip_server.start()
 
         thread.start_new_thread(self.send_system_state, (0, 0))
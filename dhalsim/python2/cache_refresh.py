@@ -0,0 +1,174 @@
+import threading
+import time
+from Queue import Queue, Empty
+
+
+class TargetStats(object):
+    """
+    Latency and failure counters of the requests sent to a single remote PLC.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def record(self, latency, failed):
+        """
+        Record a finished request.
+
+        :param latency: seconds the request took
+        :param failed: True when the request raised an exception
+        """
+        self.requests += 1
+        if failed:
+            self.failures += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    @property
+    def mean_latency(self):
+        if self.requests == 0:
+            return None
+        return self.total_latency / self.requests
+
+    def as_dict(self):
+        return {'requests': self.requests,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'mean_latency': self.mean_latency,
+                'max_latency': self.max_latency,
+                'last_latency': self.last_latency}
+
+
+class CacheRefresher(object):
+    """
+    Refreshes remote tags with one multi-tag request per owning PLC. The requests are run
+    concurrently on a small pool of worker threads, so a slow or unreachable PLC only delays
+    its own tags.
+
+    Every target gets its own timeout, counted from the moment a worker sends its request. A
+    target that does not answer in time is counted as timed out and is not asked again until its
+    pending request returns, so a dead PLC does not accumulate worker threads. Its answer is still
+    used when it arrives, by the next refresh.
+
+    :param groups: dict of IP to the list of tags owned by the PLC at that IP
+    :param fetch: function called as :code:`fetch(tags, ip)`, returning the values of the tags
+    :param workers: maximum number of worker threads
+    :param timeout: seconds to wait for the answer of each target
+    """
+
+    def __init__(self, groups, fetch, workers, timeout):
+        self.groups = groups
+        self.fetch = fetch
+        self.timeout = timeout
+
+        self.stats = {}
+        for ip in self.groups:
+            self.stats[ip] = TargetStats()
+
+        self.stats_lock = threading.Lock()
+        self.in_flight = set()
+        self.started = {}
+        self.requests = Queue()
+        self.results = Queue()
+
+        for _ in range(min(workers, len(self.groups))):
+            worker = threading.Thread(target=self._worker)
+            worker.daemon = True
+            worker.start()
+
+    def _worker(self):
+        while True:
+            ip, tags = self.requests.get()
+            start = time.time()
+            with self.stats_lock:
+                self.started[ip] = start
+            try:
+                values = self.fetch(tags, ip)
+                error = None
+            except Exception as exc:
+                values = None
+                error = exc
+            latency = time.time() - start
+
+            # The result is queued first, so the target is not asked again before it is used
+            self.results.put((ip, values, error))
+            with self.stats_lock:
+                self.stats[ip].record(latency, error is not None)
+                self.in_flight.discard(ip)
+
+    def deadline(self, ip, sent):
+        """
+        :return: the time the answer of a target is due, counted from the moment its request
+                 was taken by a worker, or from when it was sent while it waits for one
+        """
+        with self.stats_lock:
+            return self.started.get(ip, sent) + self.timeout
+
+    def refresh(self):
+        """
+        Request every target that has no request pending, and wait for the answers. Answers
+        that arrived after an earlier refresh gave up on them are used as well.
+
+        :return: tuple of a dict with the received value of each tag, and a dict with the
+                 exception of each target that failed or timed out
+        """
+        received = {}
+        errors = {}
+        pending = set()
+
+        def use(result):
+            ip, values, error = result
+            pending.discard(ip)
+            if error is not None:
+                errors[ip] = error
+                return
+            errors.pop(ip, None)
+            for tag, value in zip(self.groups[ip], values):
+                received[tag] = value
+
+        # Answers of the targets that timed out before
+        while True:
+            try:
+                use(self.results.get_nowait())
+            except Empty:
+                break
+
+        sent = time.time()
+        with self.stats_lock:
+            for ip in self.groups:
+                if ip in self.in_flight:
+                    continue
+                self.in_flight.add(ip)
+                self.started.pop(ip, None)
+                pending.add(ip)
+                self.requests.put((ip, self.groups[ip]))
+
+        while pending:
+            now = time.time()
+            deadlines = dict((ip, self.deadline(ip, sent)) for ip in pending)
+            for ip in [ip for ip in pending if deadlines[ip] <= now]:
+                pending.discard(ip)
+                with self.stats_lock:
+                    self.stats[ip].timeouts += 1
+                errors[ip] = RuntimeError("no answer within {t} seconds".format(t=self.timeout))
+            if not pending:
+                break
+            try:
+                use(self.results.get(timeout=min(deadlines[ip] for ip in pending) - now))
+            except Empty:
+                continue
+
+        return received, errors
+
+    def stats_summary(self):
+        """
+        :return: dict of IP to the counters of that target
+        """
+        with self.stats_lock:
+            return dict((ip, stats.as_dict()) for ip, stats in self.stats.items())
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+
+try:
+    from enip_client import LatencyHistogram
+except ImportError:
+    from dhalsim.python2.enip_client import LatencyHistogram
+
+
+class SecondsHistogram(LatencyHistogram):
+    """
+    Histogram of the age of values in seconds.
+    """
+
+    BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 60.0)
+    """Upper bounds of the buckets in seconds, the last bucket holds all older values"""
+
+
+class IterationsHistogram(LatencyHistogram):
+    """
+    Histogram of the age of values in iterations of the physical process.
+    """
+
+    BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+    """Upper bounds of the buckets in iterations, the last bucket holds all older values"""
+
+
+class Staleness(object):
+    """
+    Distribution of the age of the values that were used.
+    """
+
+    def __init__(self):
+        self.seconds = SecondsHistogram()
+        self.iterations = IterationsHistogram()
+        self.never_received = 0
+
+    def as_dict(self):
+        return {'seconds': self.seconds.as_dict(),
+                'iterations': self.iterations.as_dict(),
+                'never_received': self.never_received}
+
+
+class DataAge(object):
+    """
+    Tracks when the cached values of remote tags were received, in seconds and in iterations
+    of the physical process, and how old they are when a node uses them. The distribution of
+    the age is kept per tag and per PLC that owns the tags.
+
+    Receiving only stores the time, and using a value records it in two fixed histograms, so
+    the tracking can stay on in every run.
+
+    :param sources: dict of every tracked tag to the name of the PLC that owns it
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.iteration = None
+        """Iteration of the physical process the node is at, set by the node"""
+
+        self.lock = threading.Lock()
+        self.received = {}
+        self.tags = dict((tag, Staleness()) for tag in sources)
+        self.plcs = dict((plc, Staleness()) for plc in set(sources.values()))
+
+    def receive(self, tags, now=None):
+        """
+        Record that new values of tags were received.
+
+        :param tags: names of the tags
+        :param now: time the values were received
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            for tag in tags:
+                self.received[tag] = (now, self.iteration)
+
+    def use(self, tag, now=None):
+        """
+        Record the age of the value of a tag when it is used.
+
+        :param tag: name of the tag
+        :param now: time the value is used
+        """
+        if tag not in self.tags:
+            return
+        now = time.time() if now is None else now
+        with self.lock:
+            staleness = (self.tags[tag], self.plcs[self.sources[tag]])
+            if tag not in self.received:
+                for distribution in staleness:
+                    distribution.never_received += 1
+                return
+            received, iteration = self.received[tag]
+            for distribution in staleness:
+                distribution.seconds.record(now - received)
+                if iteration is not None and self.iteration is not None:
+                    distribution.iterations.record(self.iteration - iteration)
+
+    def age(self, tag, now=None):
+        """
+        :return: tuple of the age of the value of a tag in seconds and iterations, with None
+                 when it was not received yet
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            if tag not in self.received:
+                return None, None
+            received, iteration = self.received[tag]
+            iterations = self.iteration - iteration \
+                if iteration is not None and self.iteration is not None else None
+            return now - received, iterations
+
+    def as_dict(self):
+        with self.lock:
+            tags = {}
+            for tag, staleness in self.tags.items():
+                tags[tag] = staleness.as_dict()
+                tags[tag]['plc'] = self.sources[tag]
+            return {'tags': tags,
+                    'plcs': dict((plc, staleness.as_dict())
+                                 for plc, staleness in self.plcs.items())}
+
+    def write(self, path):
+        """
+        Write the distributions as json.
+
+        :param path: path of the metrics file
+        """
+        with open(str(path), 'w') as metrics:
+            json.dump(self.as_dict(), metrics, indent=2)
@@ -0,0 +1,136 @@
+import os
+import random
+import sqlite3
+import threading
+
+SHM_DIR = "/dev/shm"
+"""Memory backed directory the temporary files are placed in when it is available"""
+
+BUSY_TIMEOUT = 0.5
+"""Time in seconds SQLite waits for a lock itself, before a query fails and is retried"""
+
+WRITER_BUSY_TIMEOUT = 5.0
+"""Time in seconds SQLite waits for a lock on the connection of the physical process, the default
+of :mod:`sqlite3`. Its batches of writes are not retried, so it waits longer than the nodes"""
+
+BACKOFF_BASE = 0.005
+"""Upper bound in seconds of the wait before the first retry, doubled on every next retry"""
+
+BACKOFF_CAP = 0.5
+"""Maximum upper bound in seconds of the wait before a retry"""
+
+
+def temp_parent():
+    """
+    :return: the directory the temporary directory of an experiment is created in, which is
+             :code:`/dev/shm` when it can be written, or None for the default of :mod:`tempfile`
+    """
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return None
+
+
+def enable_wal(path):
+    """
+    Put the database in write ahead log mode. The mode is stored in the database, so this is
+    done once when it is created. Readers then do not block the writer, and the writer does not
+    block the readers.
+
+    :param path: path of the database
+    """
+    conn = sqlite3.connect(str(path))
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
+def connect(path):
+    """
+    Open a connection with the pragmas every node uses. With the write ahead log a commit
+    does not need to wait for the disk, so :code:`synchronous` is lowered to :code:`NORMAL`.
+
+    :param path: path of the database
+    :return: the connection, which may be used from every thread of the process
+    """
+    conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def set_busy_timeout(path, timeout):
+    """
+    Change how long the connection of this thread to a database waits for a lock.
+
+    :param path: path of the database
+    :param timeout: time in seconds
+    """
+    shared_connection(path).execute("PRAGMA busy_timeout = {ms}".format(ms=int(timeout * 1000)))
+
+
+_connections = threading.local()
+
+
+def shared_connection(path):
+    """
+    The connection of this thread to a database. SQLite keeps the prepared statements per
+    connection, so every query of the thread reuses them. A transaction also belongs to the
+    connection, so every thread needs its own, like the PLCs of a
+    :class:`~dhalsim.python2.plc_host.PlcHost` that each commit their own updates. A forked
+    process opens its own.
+
+    :param path: path of the database
+    """
+    if not hasattr(_connections, 'by_key'):
+        _connections.by_key = {}
+    key = (os.getpid(), str(path))
+    if key not in _connections.by_key:
+        _connections.by_key[key] = connect(path)
+    return _connections.by_key[key]
+
+
+class Contention(object):
+    """
+    Counts the queries of this process that failed on a locked database, and the time spent
+    waiting before retrying them.
+
+    The wait before a retry is drawn uniformly between zero and an upper bound that doubles on
+    every retry, from :code:`BACKOFF_BASE` up to :code:`BACKOFF_CAP` seconds. Nodes that hit the
+    lock together so retry at different times, and back off further while it stays taken.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.retries = 0
+        self.failures = 0
+        self.waited = 0.0
+
+    def backoff(self, attempt):
+        """
+        Record a failed try, and draw the time to wait before the next one.
+
+        :param attempt: amount of tries that failed before this one
+        :return: time in seconds to sleep
+        """
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        with self.lock:
+            self.retries += 1
+            self.waited += delay
+        return delay
+
+    def failed(self):
+        """
+        Record a query that still failed after all its tries.
+        """
+        with self.lock:
+            self.failures += 1
+
+    def as_dict(self):
+        with self.lock:
+            return {'retries': self.retries,
+                    'failures': self.failures,
+                    'waited': self.waited}
+
+
+CONTENTION = Contention()
+"""The counters of this process"""
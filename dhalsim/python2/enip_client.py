@@ -0,0 +1,427 @@
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+ENIP_PORT = 44818
+"""Default EtherNet/IP TCP port"""
+
+REGISTER_SESSION = 0x65
+UNREGISTER_SESSION = 0x66
+SEND_RR_DATA = 0x6F
+
+READ_TAG = 0x4C
+WRITE_TAG = 0x4D
+MULTIPLE_SERVICE_PACKET = 0x0A
+UNCONNECTED_SEND = 0x52
+
+CIP_REAL = 0xCA
+
+MESSAGE_ROUTER_PATH = b'\x20\x02\x24\x01'
+CONNECTION_MANAGER_PATH = b'\x20\x06\x24\x01'
+BACKPLANE_ROUTE = b'\x01\x00'
+"""Route path of port 1, link 0, the default route of the cpppo client"""
+
+MAX_REQUEST_SIZE = 400
+"""Maximum size in bytes of the requests packed in one Multiple Service Packet"""
+
+HEADER = struct.Struct('<HHII8sI')
+
+
+class EnipError(Exception):
+    """Raised when a request is answered with an error or not answered correctly"""
+
+
+def parse_address(address, port=ENIP_PORT):
+    """
+    Split an address in a host and a port.
+
+    :param address: :code:`ip` or :code:`ip:port`
+    :param port: the port used when the address has none
+    :return: tuple of host and port
+    """
+    if ':' in address:
+        host, address_port = address.rsplit(':', 1)
+        return host, int(address_port)
+    return address, port
+
+
+def tag_name(tag):
+    """
+    Convert a tag to the symbolic name served by the ENIP servers, :code:`T0` and
+    :code:`('T0', 1)` both become :code:`T0:1`.
+    """
+    if isinstance(tag, tuple):
+        return ':'.join(str(part) for part in tag)
+    return str(tag) + ':1'
+
+
+def symbolic_path(name):
+    """
+    Encode an ANSI extended symbolic segment.
+    """
+    encoded = name.encode('ascii')
+    path = struct.pack('<BB', 0x91, len(encoded)) + encoded
+    if len(encoded) % 2:
+        path += b'\x00'
+    return path
+
+
+def cip_request(service, path, data=b''):
+    """
+    Encode a CIP request.
+    """
+    return struct.pack('<BB', service, len(path) // 2) + path + data
+
+
+def read_tag_request(name):
+    return cip_request(READ_TAG, symbolic_path(name), struct.pack('<H', 1))
+
+
+def write_tag_request(name, value):
+    return cip_request(WRITE_TAG, symbolic_path(name),
+                       struct.pack('<HHf', CIP_REAL, 1, float(value)))
+
+
+def multiple_service_request(requests):
+    """
+    Encode a Multiple Service Packet holding several requests.
+    """
+    offsets = []
+    offset = 2 + 2 * len(requests)
+    for request in requests:
+        offsets.append(offset)
+        offset += len(request)
+    data = struct.pack('<H', len(requests)) + struct.pack('<%dH' % len(offsets), *offsets)
+    return cip_request(MULTIPLE_SERVICE_PACKET, MESSAGE_ROUTER_PATH, data + b''.join(requests))
+
+
+def unconnected_send(request):
+    """
+    Wrap a request in an Unconnected Send to the backplane, as the cpppo client does.
+    """
+    data = struct.pack('<BBH', 0x05, 0x9D, len(request)) + request
+    if len(request) % 2:
+        data += b'\x00'
+    data += struct.pack('<BB', len(BACKPLANE_ROUTE) // 2, 0) + BACKPLANE_ROUTE
+    return cip_request(UNCONNECTED_SEND, CONNECTION_MANAGER_PATH, data)
+
+
+def parse_reply(reply, service):
+    """
+    Check the header of a CIP reply.
+
+    :return: the data of the reply
+    :raise EnipError: when the reply is for another service or has an error status
+    """
+    if len(reply) < 4:
+        raise EnipError("CIP reply too short")
+    reply_service, _, status, extended = struct.unpack('<BBBB', reply[:4])
+    if reply_service != service | 0x80:
+        raise EnipError("CIP reply for service 0x{0:02x} instead of 0x{1:02x}".format(
+            reply_service & 0x7F, service))
+    if status != 0:
+        raise EnipError("CIP service 0x{0:02x} failed with status 0x{1:02x}".format(
+            service, status))
+    return reply[4 + 2 * extended:]
+
+
+def parse_read_reply(reply):
+    """
+    :return: the value of a Read Tag reply
+    """
+    data = parse_reply(reply, READ_TAG)
+    data_type, = struct.unpack('<H', data[:2])
+    if data_type != CIP_REAL:
+        raise EnipError("Unsupported data type 0x{0:04x}".format(data_type))
+    return struct.unpack('<f', data[2:6])[0]
+
+
+def parse_multiple_reply(reply):
+    """
+    :return: the list of replies in a Multiple Service Packet reply
+    """
+    data = parse_reply(reply, MULTIPLE_SERVICE_PACKET)
+    count, = struct.unpack('<H', data[:2])
+    offsets = list(struct.unpack('<%dH' % count, data[2:2 + 2 * count])) + [len(data)]
+    return [data[offsets[i]:offsets[i + 1]] for i in range(count)]
+
+
+def pack_requests(requests):
+    """
+    Split requests in groups that fit in one Multiple Service Packet.
+    """
+    groups = [[]]
+    size = 0
+    for request in requests:
+        if groups[-1] and size + len(request) + 2 > MAX_REQUEST_SIZE:
+            groups.append([])
+            size = 0
+        groups[-1].append(request)
+        size += len(request) + 2
+    return groups
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of request latencies with fixed buckets.
+    """
+
+    BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+    """Upper bounds of the buckets in seconds, the last bucket holds all slower requests"""
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency):
+        """
+        :param latency: seconds a request took
+        """
+        bucket = 0
+        while bucket < len(self.BUCKETS) and latency > self.BUCKETS[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def as_dict(self):
+        buckets = ["<={0}".format(bound) for bound in self.BUCKETS] + [">{0}".format(self.BUCKETS[-1])]
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else None,
+                'max': self.max,
+                'buckets': OrderedDict(zip(buckets, self.counts))}
+
+
+class EnipSession(object):
+    """
+    A registered EtherNet/IP session with one server, kept open between requests.
+
+    The session is opened on the first request. When a request fails on the connection, the
+    session is registered again on a new connection and the request is retried once.
+
+    :param host: address of the server
+    :param port: port of the server
+    :param timeout: socket timeout in seconds
+    """
+
+    def __init__(self, host, port=ENIP_PORT, timeout=1.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self.sock = None
+        self.session = 0
+        self.context = 0
+        self.lock = threading.Lock()
+
+        self.histogram = LatencyHistogram()
+        self.connects = 0
+        self.failures = 0
+
+    def connect(self):
+        self.close()
+        self.sock = socket.create_connection((self.host, self.port), self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.session = 0
+        self.send_frame(REGISTER_SESSION, struct.pack('<HH', 1, 0))
+        command, session, data = self.receive_frame()
+        if command != REGISTER_SESSION:
+            raise EnipError("Unexpected reply to RegisterSession")
+        self.session = session
+
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.send_frame(UNREGISTER_SESSION, b'')
+        except (socket.error, EnipError):
+            pass
+        self.sock.close()
+        self.sock = None
+
+    def send_frame(self, command, data):
+        self.context = (self.context + 1) & 0xFFFFFFFF
+        context = struct.pack('<Q', self.context)
+        self.sock.sendall(HEADER.pack(command, len(data), self.session, 0, context, 0) + data)
+
+    def receive_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise EnipError("Connection closed by {host}".format(host=self.host))
+            data += chunk
+        return data
+
+    def receive_frame(self):
+        command, length, session, status, _, _ = HEADER.unpack(self.receive_exact(HEADER.size))
+        data = self.receive_exact(length)
+        if status != 0:
+            raise EnipError("Encapsulation status 0x{0:08x}".format(status))
+        return command, session, data
+
+    def send_request(self, request):
+        """
+        Send a CIP request in a SendRRData frame.
+        """
+        request = unconnected_send(request)
+        items = struct.pack('<HH', 0, 0) + struct.pack('<HH', 0xB2, len(request)) + request
+        self.send_frame(SEND_RR_DATA, struct.pack('<IHH', 0, 0, 2) + items)
+
+    def receive_reply(self):
+        """
+        :return: the CIP reply of a SendRRData frame
+        """
+        command, _, data = self.receive_frame()
+        if command != SEND_RR_DATA:
+            raise EnipError("Unexpected reply to SendRRData")
+        offset = 8
+        for _ in range(struct.unpack('<H', data[6:8])[0]):
+            item_type, length = struct.unpack('<HH', data[offset:offset + 4])
+            offset += 4
+            if item_type == 0xB2:
+                return data[offset:offset + length]
+            offset += length
+        raise EnipError("SendRRData reply without data item")
+
+    def transact(self, requests):
+        """
+        Send requests back to back on the connection and read their replies in order.
+
+        :param requests: list of CIP requests
+        :return: list of CIP replies
+        :raise EnipError: when the requests also fail on a new connection
+        """
+        with self.lock:
+            start = time.time()
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self.connect()
+                        self.connects += 1
+                    for request in requests:
+                        self.send_request(request)
+                    replies = [self.receive_reply() for _ in requests]
+                    break
+                except (socket.error, EnipError, struct.error) as error:
+                    self.close_quietly()
+                    if attempt == 1:
+                        self.failures += 1
+                        raise EnipError("Request to {host}:{port} failed: {error}".format(
+                            host=self.host, port=self.port, error=error))
+            self.histogram.record(time.time() - start)
+            return replies
+
+    def close_quietly(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def stats(self):
+        stats = self.histogram.as_dict()
+        stats['connects'] = self.connects
+        stats['failures'] = self.failures
+        return stats
+
+
+class EnipClient(object):
+    """
+    EtherNet/IP client keeping one registered session per server.
+
+    This replaces starting a :code:`cpppo.server.enip.client` process for every request.
+    Tags of the same server are read with Multiple Service Packets, and when they do not fit in
+    one packet the packets are sent back to back on the connection before the replies are read.
+
+    This module is used by the python2 nodes and by the python3 network attacks, so it
+    must stay compatible with both.
+
+    :param timeout: socket timeout in seconds
+    """
+
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+        self.timeouts = {}
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+
+    def set_timeout(self, address, timeout):
+        """
+        Use another socket timeout for one server. Applies to sessions opened afterwards.
+
+        :param address: :code:`ip` or :code:`ip:port` of the server
+        :param timeout: socket timeout in seconds
+        """
+        with self.sessions_lock:
+            self.timeouts[address] = timeout
+
+    def session(self, address):
+        """
+        :param address: :code:`ip` or :code:`ip:port` of the server
+        :return: the :class:`EnipSession` with that server
+        """
+        with self.sessions_lock:
+            if address not in self.sessions:
+                host, port = parse_address(address)
+                self.sessions[address] = EnipSession(
+                    host, port, self.timeouts.get(address, self.timeout))
+            return self.sessions[address]
+
+    def read_tags(self, address, tags):
+        """
+        Read tags from a server.
+
+        :param address: :code:`ip` or :code:`ip:port` of the server
+        :param tags: names or :code:`(name, 1)` tuples of the tags
+        :return: list of the values of the tags
+        :raise EnipError: when a tag cannot be read
+        """
+        reads = [read_tag_request(tag_name(tag)) for tag in tags]
+        groups = pack_requests(reads)
+        replies = self.session(address).transact(
+            [multiple_service_request(group) for group in groups])
+
+        values = []
+        for reply in replies:
+            values.extend(parse_read_reply(read) for read in parse_multiple_reply(reply))
+        return values
+
+    def read_tag(self, address, tag):
+        """
+        Read one tag from a server.
+        """
+        reply, = self.session(address).transact([read_tag_request(tag_name(tag))])
+        return parse_read_reply(reply)
+
+    def write_tags(self, address, tags, values):
+        """
+        Write REAL tags on a server.
+
+        :param address: :code:`ip` or :code:`ip:port` of the server
+        :param tags: names or :code:`(name, 1)` tuples of the tags
+        :param values: the values to write
+        :raise EnipError: when a tag cannot be written
+        """
+        writes = [write_tag_request(tag_name(tag), value) for tag, value in zip(tags, values)]
+        replies = self.session(address).transact(
+            [multiple_service_request(group) for group in pack_requests(writes)])
+        for reply in replies:
+            for write in parse_multiple_reply(reply):
+                parse_reply(write, WRITE_TAG)
+
+    def stats(self):
+        """
+        :return: dict of address to the latency histogram and counters of its session
+        """
+        with self.sessions_lock:
+            return dict((address, session.stats()) for address, session in self.sessions.items())
+
+    def close(self):
+        with self.sessions_lock:
+            for session in self.sessions.values():
+                with session.lock:
+                    session.close()
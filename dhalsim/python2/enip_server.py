@@ -0,0 +1,249 @@
+import socket
+import struct
+import threading
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+try:
+    from enip_client import HEADER, REGISTER_SESSION, UNREGISTER_SESSION, SEND_RR_DATA, \
+        READ_TAG, WRITE_TAG, MULTIPLE_SERVICE_PACKET, UNCONNECTED_SEND, CIP_REAL, \
+        parse_address, tag_name
+except ImportError:
+    from dhalsim.python2.enip_client import HEADER, REGISTER_SESSION, UNREGISTER_SESSION, \
+        SEND_RR_DATA, READ_TAG, WRITE_TAG, MULTIPLE_SERVICE_PACKET, UNCONNECTED_SEND, CIP_REAL, \
+        parse_address, tag_name
+
+SUCCESS = 0x00
+PATH_DESTINATION_UNKNOWN = 0x05
+SERVICE_NOT_SUPPORTED = 0x08
+NOT_ENOUGH_DATA = 0x13
+EMBEDDED_SERVICE_ERROR = 0x1E
+
+INVALID_COMMAND = 0x01
+
+
+class TagTable(object):
+    """
+    The tags served by an :class:`EnipServer`, kept in memory.
+
+    Updating a tag is a plain dict write under a lock, there is no client request involved.
+    Tags are stored by their symbolic name, like :code:`T0:1`.
+
+    :param tags: names or :code:`(name, 1)` tuples of the tags
+    :param values: optional initial values, 0 by default
+    """
+
+    def __init__(self, tags, values=None):
+        self.lock = threading.Lock()
+        self.values = {}
+        for index, tag in enumerate(tags):
+            self.values[tag_name(tag)] = float(values[index]) if values else 0.0
+
+    def get(self, name):
+        """
+        :param name: symbolic name of the tag
+        :raise KeyError: when the tag is not in the table
+        """
+        with self.lock:
+            return self.values[name]
+
+    def set(self, name, value):
+        """
+        :param name: symbolic name of the tag
+        :raise KeyError: when the tag is not in the table
+        """
+        with self.lock:
+            if name not in self.values:
+                raise KeyError(name)
+            self.values[name] = float(value)
+
+    def update(self, tags, values):
+        """
+        Set several tags at once. Readers see either all or none of the new values.
+
+        :param tags: names or :code:`(name, 1)` tuples of the tags
+        :param values: the new values
+        """
+        names = [tag_name(tag) for tag in tags]
+        with self.lock:
+            for name, value in zip(names, values):
+                self.values[name] = float(value)
+
+    def snapshot(self):
+        """
+        :return: a copy of the table
+        """
+        with self.lock:
+            return dict(self.values)
+
+
+def parse_symbolic_path(path):
+    """
+    :return: the name in the first symbolic segment of a path, or None
+    """
+    if len(path) < 2 or struct.unpack('<B', path[:1])[0] != 0x91:
+        return None
+    length = struct.unpack('<B', path[1:2])[0]
+    return path[2:2 + length].decode('ascii')
+
+
+def cip_reply(service, status, data=b''):
+    return struct.pack('<BBBB', service | 0x80, 0, status, 0) + data
+
+
+def handle_cip(table, request):
+    """
+    Answer a CIP request with the tag table.
+
+    :return: the CIP reply
+    """
+    if len(request) < 2:
+        return cip_reply(0, NOT_ENOUGH_DATA)
+    service, path_size = struct.unpack('<BB', request[:2])
+    path = request[2:2 + 2 * path_size]
+    data = request[2 + 2 * path_size:]
+
+    if service == UNCONNECTED_SEND:
+        size, = struct.unpack('<H', data[2:4])
+        return handle_cip(table, data[4:4 + size])
+
+    if service == MULTIPLE_SERVICE_PACKET:
+        count, = struct.unpack('<H', data[:2])
+        offsets = list(struct.unpack('<%dH' % count, data[2:2 + 2 * count])) + [len(data)]
+        replies = [handle_cip(table, data[offsets[i]:offsets[i + 1]]) for i in range(count)]
+        failed = any(struct.unpack('<B', reply[2:3])[0] != SUCCESS for reply in replies)
+
+        reply_offsets = []
+        offset = 2 + 2 * count
+        for reply in replies:
+            reply_offsets.append(offset)
+            offset += len(reply)
+        return cip_reply(service, EMBEDDED_SERVICE_ERROR if failed else SUCCESS,
+                         struct.pack('<H', count) + struct.pack('<%dH' % count, *reply_offsets)
+                         + b''.join(replies))
+
+    if service == READ_TAG:
+        try:
+            value = table.get(parse_symbolic_path(path))
+        except KeyError:
+            return cip_reply(service, PATH_DESTINATION_UNKNOWN)
+        return cip_reply(service, SUCCESS, struct.pack('<Hf', CIP_REAL, value))
+
+    if service == WRITE_TAG:
+        if len(data) < 8:
+            return cip_reply(service, NOT_ENOUGH_DATA)
+        value, = struct.unpack('<f', data[4:8])
+        try:
+            table.set(parse_symbolic_path(path), value)
+        except KeyError:
+            return cip_reply(service, PATH_DESTINATION_UNKNOWN)
+        return cip_reply(service, SUCCESS)
+
+    return cip_reply(service, SERVICE_NOT_SUPPORTED)
+
+
+class EnipRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Handles the encapsulation frames of one client connection.
+    """
+
+    def receive_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self):
+        try:
+            self.serve_connection()
+        except (socket.error, struct.error):
+            return
+
+    def serve_connection(self):
+        while True:
+            header = self.receive_exact(HEADER.size)
+            if header is None:
+                return
+            command, length, session, _, context, options = HEADER.unpack(header)
+            data = self.receive_exact(length)
+            if data is None:
+                return
+
+            status = 0
+            if command == REGISTER_SESSION:
+                session = self.server.new_session()
+                reply = data
+            elif command == UNREGISTER_SESSION:
+                return
+            elif command == SEND_RR_DATA:
+                reply = self.send_rr_data(data)
+            else:
+                status = INVALID_COMMAND
+                reply = b''
+
+            self.request.sendall(HEADER.pack(command, len(reply), session, status, context, options)
+                                 + reply)
+
+    def send_rr_data(self, data):
+        item_count, = struct.unpack('<H', data[6:8])
+        offset = 8
+        request = b''
+        for _ in range(item_count):
+            item_type, length = struct.unpack('<HH', data[offset:offset + 4])
+            offset += 4
+            if item_type == 0xB2:
+                request = data[offset:offset + length]
+            offset += length
+
+        reply = handle_cip(self.server.table, request)
+        return struct.pack('<IHH', 0, 0, 2) + struct.pack('<HH', 0, 0) + \
+            struct.pack('<HH', 0xB2, len(reply)) + reply
+
+
+class EnipServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    EtherNet/IP server answering Read Tag, Write Tag and Multiple Service Packet requests,
+    directly or wrapped in an Unconnected Send, from a :class:`TagTable` in the same process.
+
+    It replaces a separate :code:`cpppo.server.enip` process per node, and the owner of the
+    table updates the served values with memory writes instead of client requests.
+
+    This module is used by the python2 nodes and by the python3 network attacks, so it
+    must stay compatible with both.
+
+    :param address: :code:`ip` or :code:`ip:port` to listen on
+    :param table: the :class:`TagTable` to serve
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, table):
+        socketserver.TCPServer.__init__(self, parse_address(address), EnipRequestHandler)
+        self.table = table
+        self.sessions = 0
+        self.sessions_lock = threading.Lock()
+        self.thread = None
+
+    def new_session(self):
+        with self.sessions_lock:
+            self.sessions += 1
+            return self.sessions
+
+    def start(self):
+        """
+        Serve in a daemon thread.
+        """
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
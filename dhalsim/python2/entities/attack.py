@@ -8,6 +8,9 @@ class Attack:
     """
     __metaclass__ = ABCMeta
 
+    sensor = None
+    """Tag that triggers the attack, None when the attack is triggered by the master clock"""
+
     def __init__(self, name, actuator, command):
         self.name = name
         self.actuator = actuator
@@ -20,6 +23,16 @@ class Attack:
                " {actuator}.".format(type=self.__class__.__name__, name=self.name,
                                       command=self.command, actuator=self.actuator)
 
+    @abstractmethod
+    def is_triggered(self, value):
+        """
+        Checks the trigger of the attack.
+
+        :param value: value of the trigger sensor, or the master clock for a time attack
+        :return: True when the attack should be running
+        """
+        pass
+
     @abstractmethod
     def apply(self, plc):
         """Applies an attack rule using a given PLC
@@ -50,13 +63,16 @@ class TimeAttack(Attack):
                                                    " occured. Ends at {end} iterations.".format(
             start=self.start, end=self.end)
 
+    def is_triggered(self, value):
+        return self.start <= value <= self.end
+
     def apply(self, plc):
         """Applies the Device Attack on a given PLC
 
         :param plc: The PLC that will apply the action
         """
         curr_time = plc.get_master_clock()
-        if self.start <= curr_time <= self.end:
+        if self.is_triggered(curr_time):
             plc.set_attack_flag(True, self.name)
             plc.logger.debug(self.__str__())
             plc.set_tag(self.actuator, self.command)
@@ -87,6 +103,9 @@ class TriggerBelowAttack(Attack):
                                                            " fell below {value}."\
             .format(sensor=self.sensor, value=self.value)
 
+    def is_triggered(self, value):
+        return value < self.value
+
     def apply(self, plc):
         """
         Applies the TriggerAttack when necessary
@@ -94,7 +113,7 @@ class TriggerBelowAttack(Attack):
         :param plc: The PLC that will apply the action
         """
         sensor_value = plc.get_tag(self.sensor)
-        if sensor_value < self.value:
+        if self.is_triggered(sensor_value):
             plc.set_attack_flag(True, self.name)
             plc.logger.debug(self.__str__())
             plc.set_tag(self.actuator, self.command)
@@ -125,6 +144,9 @@ class TriggerAboveAttack(Attack):
                                                            " fell above {value}."\
             .format(sensor=self.sensor, value=self.value)
 
+    def is_triggered(self, value):
+        return value > self.value
+
     def apply(self, plc):
         """
         Applies the TriggerAttack when necessary
@@ -132,7 +154,7 @@ class TriggerAboveAttack(Attack):
         :param plc: The PLC that will apply the action
         """
         sensor_value = plc.get_tag(self.sensor)
-        if sensor_value > self.value:
+        if self.is_triggered(sensor_value):
             plc.set_attack_flag(True, self.name)
             plc.logger.debug(self.__str__())
             plc.set_tag(self.actuator, self.command)
@@ -164,6 +186,9 @@ class TriggerBetweenAttack(Attack):
                                                              " fell between {lower} and {upper}"\
             .format(sensor=self.sensor, lower=self.lower_value, upper=self.upper_value)
 
+    def is_triggered(self, value):
+        return self.lower_value < value < self.upper_value
+
     def apply(self, plc):
         """
         Applies the TriggerAttack when necessary
@@ -171,7 +196,7 @@ class TriggerBetweenAttack(Attack):
         :param plc: The PLC that will apply the action
         """
         sensor_value = plc.get_tag(self.sensor)
-        if self.lower_value < sensor_value < self.upper_value:
+        if self.is_triggered(sensor_value):
             plc.set_attack_flag(True, self.name)
             plc.logger.debug(self.__str__())
             plc.set_tag(self.actuator, self.command)
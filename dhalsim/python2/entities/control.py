@@ -12,12 +12,25 @@ class Control:
     """
     __metaclass__ = ABCMeta
 
+    dependant = None
+    """Tag the condition depends on, None when the condition depends on the master clock"""
+
     def __init__(self, actuator, action, value):
         """Constructor method"""
         self.actuator = actuator
         self.action = action
         self.value = value
 
+    @abstractmethod
+    def is_met(self, value):
+        """
+        Checks the condition of the control.
+
+        :param value: value of the dependant, or the master clock for a time control
+        :return: True when the action should be applied
+        """
+        pass
+
     @abstractmethod
     def apply(self, generic_plc):
         """
@@ -39,13 +52,16 @@ class BelowControl(Control):
         super(BelowControl, self).__init__(actuator, action, value)
         self.dependant = dependant
 
+    def is_met(self, value):
+        return value < self.value
+
     def apply(self, generic_plc):
         """Applies the BELOW control rule using a given PLC
 
         :param generic_plc: the PLC that will apply the control actions
         """
         dep_val = generic_plc.get_tag(self.dependant)
-        if dep_val < self.value:
+        if self.is_met(dep_val):
             generic_plc.set_tag(self.actuator, self.action)
             generic_plc.logger.debug(
                 generic_plc.intermediate_plc["name"] + " applied " + str(self) +
@@ -67,6 +83,9 @@ class AboveControl(Control):
         super(AboveControl, self).__init__(actuator, action, value)
         self.dependant = dependant
 
+    def is_met(self, value):
+        return value > self.value
+
     def apply(self, generic_plc):
         """
         Applies the ABOVE control rule using a given PLC.
@@ -74,7 +93,7 @@ class AboveControl(Control):
         :param generic_plc: the PLC that will apply the control actions
         """
         dep_val = generic_plc.get_tag(self.dependant)
-        if dep_val > self.value:
+        if self.is_met(dep_val):
             generic_plc.set_tag(self.actuator, self.action)
             generic_plc.logger.debug(
                 generic_plc.intermediate_plc["name"] + " applied " + str(self) + " because dep_val " + str(dep_val))
@@ -89,13 +108,16 @@ class TimeControl(Control):
     Defines a TIME control, which takes no additional parameters.
     """
 
+    def is_met(self, value):
+        return value == self.value
+
     def apply(self, generic_plc):
         """Applies the TIME control rule using a given PLC
 
         :param generic_plc: the PLC that will apply the control actions
         """
         curr_time = generic_plc.get_master_clock()
-        if curr_time == self.value:
+        if self.is_met(curr_time):
             generic_plc.set_tag(self.actuator, self.action)
             generic_plc.logger.debug(
                 generic_plc.intermediate_plc["name"] + " applied " + str(self) + " because curr_time " + str(curr_time))
@@ -1,18 +1,29 @@
 import argparse
 import os.path
+import signal
 import sqlite3
 import threading
 import time
 from decimal import Decimal
 from pathlib import Path
-import random
 
 import yaml
 
+from barrier import BarrierClient, BarrierError
 from basePLC import BasePLC
+from enip_client import EnipClient
 from entities.attack import TimeAttack, TriggerBelowAttack, TriggerAboveAttack, TriggerBetweenAttack
 from entities.control import AboveControl, BelowControl, TimeControl
 from py2_logger import get_logger
+from tag_index import TagIndex
+from cache_refresh import CacheRefresher
+from data_age import DataAge
+from database import CONTENTION, shared_connection
+from rule_table import RuleTable
+from shared_state import open_plant_state
+from subscriptions import TagSubscriptions
+from sync_trace import open_sync_trace
+from tag_io import TagIO
 
 import threading
 import thread
@@ -44,17 +55,29 @@ class GenericPLC(BasePLC):
     DB_TRIES = 10
     """Amount of times a db query will retry on a exception"""
 
-    DB_SLEEP_TIME = random.uniform(0.01, 0.1)
-    """Amount of time a db query will wait before retrying"""
+    SYNC_POLL_TIME = 0.01
+    """Time in seconds between two reads of the sync flag"""
 
     PLC_CACHE_UPDATE_TIME = 0.5
     """ Time in seconds the SCADA server updates its cache"""
 
-    def __init__(self, intermediate_yaml_path, yaml_index):
+    PLC_CACHE_WORKERS = 4
+    """ Maximum amount of remote PLCs that are requested concurrently when updating the cache"""
+
+    PLC_CACHE_TIMEOUT = 1.0
+    """ Time in seconds a cache update waits for the answer of each remote PLC"""
+
+    ENIP_TIMEOUT = 1.0
+    """ Socket timeout in seconds of the ENIP requests to other PLCs"""
+
+    def __init__(self, intermediate_yaml_path, yaml_index, intermediate_yaml=None):
         self.yaml_index = yaml_index
 
-        with intermediate_yaml_path.open() as yaml_file:
-            self.intermediate_yaml = yaml.load(yaml_file, Loader=yaml.FullLoader)
+        # PLCs hosted in the same process share the already loaded intermediate yaml
+        if intermediate_yaml is None:
+            with intermediate_yaml_path.open() as yaml_file:
+                intermediate_yaml = yaml.load(yaml_file, Loader=yaml.FullLoader)
+        self.intermediate_yaml = intermediate_yaml
 
         self.logger = get_logger(self.intermediate_yaml['log_level'])
 
@@ -66,9 +89,29 @@ class GenericPLC(BasePLC):
         if 'actuators' not in self.intermediate_plc:
             self.intermediate_plc['actuators'] = list()
 
+        # Owner of every tag in the network, this PLC is the local one
+        self.tag_index = TagIndex(self.intermediate_yaml["plcs"], self.intermediate_plc['name'])
+
         # Initialize connection to database
         self.initialize_db()
 
+        # The plant in shared memory instead of the plant table, when configured
+        self.shared_state = open_plant_state(self.intermediate_yaml)
+
+        # Reads and writes the tags of this PLC, refreshed once per scan
+        self.tag_io = TagIO(self.intermediate_yaml['db_path'],
+                            self.intermediate_plc['sensors'] + self.intermediate_plc['actuators'],
+                            self.DB_TRIES, self.shared_state)
+
+        # Released by the physical process over a socket instead of through the sync table
+        self.barrier = None
+        if self.intermediate_yaml.get('barrier', 'sqlite') == 'socket':
+            self.barrier = BarrierClient(self.intermediate_yaml['barrier_path'],
+                                         self.intermediate_plc['name'])
+
+        # When this plc was released and done with every iteration, when the sync is traced
+        self.sync_trace = open_sync_trace(self.intermediate_yaml, self.intermediate_plc['name'])
+
         self.intermediate_controls = self.intermediate_plc['controls']
         self.controls = self.create_controls(self.intermediate_controls)
 
@@ -77,6 +120,9 @@ class GenericPLC(BasePLC):
         else:
             self.attacks = []
 
+        # Controls and attacks compiled into one table evaluated per scan
+        self.rule_table = RuleTable(self.controls, self.attacks)
+
         # Create state from db values
         state = {
             'name': "plant",
@@ -100,10 +146,10 @@ class GenericPLC(BasePLC):
                                             self.intermediate_plc['actuators'])
         }
 
-        # Create protocol
+        # Create protocol, the ENIP server is embedded in this process and started by startup
         plc_protocol = {
             'name': 'enip',
-            'mode': 1,
+            'mode': 0,
             'server': plc_server
         }
 
@@ -112,10 +158,25 @@ class GenericPLC(BasePLC):
 
         self.update_cache_flag = False
         self.plcs_ready = False
+        self.cache_refresher = None
+
+        # Persistent ENIP sessions with the remote PLCs
+        self.enip_client = EnipClient(self.ENIP_TIMEOUT)
+
+        # Remote tags are pushed by their owners instead of polled when subscriptions are on
+        self.subscriptions = None
 
         for tag in set(dependant_sensors) - set(plc_sensors):
             self.cache[tag] = Decimal(0)
 
+        # Age of the remote values when the controls use them
+        sources = {}
+        for tag in self.cache:
+            owner = self.tag_index.owner(tag)
+            if owner is not None and not owner.local:
+                sources[tag] = owner.plc_name
+        self.data_age = DataAge(sources)
+
         self.do_super_construction(plc_protocol, state)
 
     def do_super_construction(self, plc_protocol, state):
@@ -131,7 +192,7 @@ class GenericPLC(BasePLC):
         Function that initializes PLC connection to the database
         Introduced to better facilitate testing
         """
-        self.conn = sqlite3.connect(self.intermediate_yaml["db_path"])
+        self.conn = shared_connection(self.intermediate_yaml["db_path"])
         self.cur = self.conn.cursor()
 
     @staticmethod
@@ -254,17 +315,49 @@ class GenericPLC(BasePLC):
         noise_scale = self.intermediate_yaml["noise_scale"]
 
         BasePLC.set_parameters(self, sensors, actuators, values, reader, lock,
-                               self.intermediate_plc['local_ip'], noise_scale)
+                               self.intermediate_plc['local_ip'], noise_scale,
+                               publishing=self.intermediate_yaml.get('publishing'))
         self.startup()
 
+        if 'subscriptions' in self.intermediate_yaml:
+            self.start_subscriptions(self.intermediate_yaml['subscriptions'])
+
         self.keep_updating_flag = True
         self.cache_update_process = None
 
         time.sleep(sleep)
 
+    def remote_groups(self):
+        """
+        Group the remote tags the controls depend on by the PLC that owns them.
+
+        :return: ordered dict of the IP of a remote PLC to the tags it owns
+        """
+        groups = self.tag_index.group_by_owner(self.cache.keys())
+        for ip in list(groups):
+            if self.tag_index.owner(groups[ip][0]).local:
+                del groups[ip]
+        return groups
+
+    def start_subscriptions(self, settings):
+        """
+        Subscribe to the remote tags the controls depend on, and accept subscriptions to the
+        tags of this PLC.
+
+        :param settings: the subscriptions section of the intermediate yaml
+        """
+        self.subscriptions = TagSubscriptions(self.intermediate_plc['local_ip'],
+                                              self.remote_groups(),
+                                              settings['deadband'], settings['heartbeat'],
+                                              self.data_age)
+        self.subscriptions.start()
+
     def get_tag(self, tag):
         """
         Get the value of a tag that is connected to this PLC or over the network.
+        Tags of this PLC are read from the snapshot taken at the start of the scan.
+        A subscribed tag of which no update was received yet is read from its owner, as the
+        cache only holds a placeholder for it until then.
 
         :param tag: The tag to get
         :type tag: str
@@ -272,53 +365,86 @@ class GenericPLC(BasePLC):
         :rtype: int
         :raise: TagDoesNotExist if tag cannot be found
         """
-        if tag in self.intermediate_plc["sensors"] or tag in self.intermediate_plc["actuators"]:
-            return Decimal(self.get((tag, 1)))
+        if self.tag_index.is_local(tag):
+            return Decimal(self.tag_io.get(tag))
 
-        for cached_tag in self.cache:
-            if tag == cached_tag:
-                return self.cache[tag]
+        if self.subscriptions is not None and tag in self.subscriptions:
+            try:
+                value = Decimal(self.subscriptions.get(tag))
+                self.data_age.use(tag)
+                return value
+            except KeyError:
+                pass
+            try:
+                value = Decimal(self.receive((tag, 1), self.tag_index.owner(tag).ip))
+                self.cache[tag] = value
+                return value
+            except Exception as error:
+                self.logger.info(
+                    "{plc} receive {tag} before its first update failed with exception "
+                    "'{e}'".format(plc=self.intermediate_plc["name"], tag=tag, e=str(error)))
+
+        if tag in self.cache:
+            self.data_age.use(tag)
+            return self.cache[tag]
 
         self.logger.warning(
             "Cache miss in {plc} for tag {tag}".format(plc=self.intermediate_plc["name"], tag=tag))
 
-        for i, plc_data in enumerate(self.intermediate_yaml["plcs"]):
-            if i == self.yaml_index:
-                continue
-            if tag in plc_data["sensors"] or tag in plc_data["actuators"]:
-                received = Decimal(self.receive((tag, 1), plc_data["public_ip"]))
-                return received
+        owner = self.tag_index.owner(tag)
+        if owner is not None:
+            received = Decimal(self.receive((tag, 1), owner.ip))
+            return received
 
         raise TagDoesNotExist(tag)
 
     def update_cache(self, lock, cache_update_time):
         """
         Update the cache of this plc by receiving all the required tags.
+        The tags are requested with one receive_multiple per remote PLC, and the remote
+        PLCs are requested concurrently.
         When something cannot be received, the previous value is used.
         """
+        groups = self.remote_groups()
+        self.cache_refresher = CacheRefresher(groups, self.receive_cache_group,
+                                              self.PLC_CACHE_WORKERS, self.PLC_CACHE_TIMEOUT)
 
         while self.update_cache_flag:
-            for cached_tag in self.cache:
-                for i, plc_data in enumerate(self.intermediate_yaml["plcs"]):
-                    if i == self.yaml_index:
-                        continue
-                    if cached_tag in plc_data["sensors"] or cached_tag in plc_data["actuators"]:
-                        try:
-                            received = Decimal(self.receive((cached_tag, 1), plc_data["public_ip"]))
-                            with lock:
-                                self.cache[cached_tag] = received
-                        except Exception as e:
-                            self.logger.info(
-                                "{plc} receive {tag} from {ip} failed with exception '{e}'".format(
-                                    plc=self.intermediate_plc["name"], tag=cached_tag,
-                                    ip=plc_data["public_ip"], e=str(e)))
-                            time.sleep(cache_update_time)
-                            continue
+            received, errors = self.cache_refresher.refresh()
+            with lock:
+                for tag, value in received.items():
+                    self.cache[tag] = Decimal(value)
+            self.data_age.receive(received.keys())
+            for ip, error in errors.items():
+                self.logger.info(
+                    "{plc} receive {tags} from {ip} failed with exception '{e}'".format(
+                        plc=self.intermediate_plc["name"], tags=groups[ip], ip=ip, e=str(error)))
             time.sleep(cache_update_time)
 
+    def receive_cache_group(self, tags, ip):
+        """
+        Receive a group of tags owned by the same remote PLC.
+
+        :param tags: list of tag names
+        :param ip: IP of the PLC that owns the tags
+        :return: list with the values of the tags
+        """
+        return self.receive_multiple(self.generate_tags(tags), ip)
+
+    def cache_stats(self):
+        """
+        Latency and failure counters of the cache updates, per remote PLC IP.
+
+        :return: dict of IP to counters, empty when the cache update has not started
+        """
+        if self.cache_refresher is None:
+            return {}
+        return self.cache_refresher.stats_summary()
+
     def set_tag(self, tag, value):
         """
-        Set a tag that is connected to this PLC to a value.
+        Set a tag that is connected to this PLC to a value. The tag is only written when the
+        value changed.
 
         :param tag: Which tag to set
         :type tag: str
@@ -332,8 +458,8 @@ class GenericPLC(BasePLC):
         else:
             raise InvalidControlValue(value)
 
-        if tag in self.intermediate_plc["sensors"] or tag in self.intermediate_plc["actuators"]:
-            self.set((tag, 1), value)
+        if self.tag_index.is_local(tag):
+            self.tag_io.set(tag, value)
         else:
             raise TagDoesNotExist(tag + " cannot be set from " + self.intermediate_plc["name"])
 
@@ -341,7 +467,7 @@ class GenericPLC(BasePLC):
         """
         Execute a query on the database
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
         This is necessary because of the limited concurrency in SQLite.
 
         :param query: The SQL query to execute in the db
@@ -363,22 +489,26 @@ class GenericPLC(BasePLC):
                 self.logger.info(
                     "Failed to connect to db with exception {exc}. Trying {i} more times.".format(
                         exc=exc, i=self.DB_TRIES - i - 1))
-                time.sleep(self.DB_SLEEP_TIME)
+                time.sleep(CONTENTION.backoff(i))
+        CONTENTION.failed()
         self.logger.error(
             "Failed to connect to db. Tried {i} times.".format(i=self.DB_TRIES))
         raise DatabaseError("Failed to get master clock from database")
 
     def get_master_clock(self):
         """
-        Get the value of the master clock of the physical process through the database.
+        Get the value of the master clock of the physical process through the database, or the
+        shared memory when the plant is kept there.
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
 
         :return: Iteration in the physical process.
 
         :raise DatabaseError: When a :code:`sqlite3.OperationalError` is still raised after
            :code:`DB_TRIES` tries.
         """
+        if self.shared_state is not None:
+            return self.shared_state.master_time()
         self.db_query("SELECT time FROM master_time WHERE id IS 1")
         master_time = self.cur.fetchone()[0]
         return master_time
@@ -387,15 +517,23 @@ class GenericPLC(BasePLC):
         """
         Get the sync flag of this plc.
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
+        With the socket barrier this blocks until the physical process releases this plc.
 
         :return: False if physical process wants the plc to do a iteration, True if not.
 
         :raise DatabaseError: When a :code:`sqlite3.OperationalError` is still raised after
            :code:`DB_TRIES` tries.
         """
+        if self.barrier is not None:
+            master_time = self.barrier.wait()
+            if self.sync_trace is not None:
+                self.sync_trace.released(master_time)
+            return False
         self.db_query("SELECT flag FROM sync WHERE name IS ?", (self.intermediate_plc["name"],))
         flag = bool(self.cur.fetchone()[0])
+        if not flag and self.sync_trace is not None and not self.sync_trace.pending:
+            self.sync_trace.released()
         return flag
 
     def set_sync(self, flag):
@@ -403,7 +541,7 @@ class GenericPLC(BasePLC):
         Set this plcs sync flag in the sync table. When this is 1, the physical process
         knows this plc finished the requested iteration.
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
 
         :param flag: True for sync to 1, False for sync to 0
         :type flag: bool
@@ -411,16 +549,22 @@ class GenericPLC(BasePLC):
         :raise DatabaseError: When a :code:`sqlite3.OperationalError` is still raised after
            :code:`DB_TRIES` tries.
         """
-        self.db_query("UPDATE sync SET flag=? WHERE name IS ?",
-                      (int(flag), self.intermediate_plc["name"],))
-        self.conn.commit()
+        if self.barrier is not None:
+            if flag:
+                self.barrier.done()
+        else:
+            self.db_query("UPDATE sync SET flag=? WHERE name IS ?",
+                          (int(flag), self.intermediate_plc["name"],))
+            self.conn.commit()
+        if flag and self.sync_trace is not None:
+            self.sync_trace.done()
 
     def set_attack_flag(self, flag, attack_name):
         """
         Set a flag in the attack table. When it is 1, we know that the attack with the
         provided name is currently running. When it is 0, it is not.
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
 
         :param flag: True for running to 1, False for running to 0
         :type flag: bool
@@ -438,20 +582,75 @@ class GenericPLC(BasePLC):
     def stop_cache_update(self):
         self.update_cache_flag = False
 
+    def write_data_age(self):
+        """
+        Write the age of the remote values used by the controls to
+        :code:`data_age_<name>.json` in the output path.
+        """
+        if not self.data_age.sources:
+            return
+        path = Path(self.intermediate_yaml['output_path']) / "data_age_{name}.json".format(
+            name=self.intermediate_plc['name'])
+        try:
+            self.data_age.write(path)
+        except (IOError, OSError) as error:
+            self.logger.error("Writing {path} failed: {error}".format(path=path, error=error))
+
+    def shutdown(self):
+        """
+        Shutdown protocol for the PLC, logs the cache update and tag I/O counters before stopping.
+        """
+        self.stop_cache_update()
+        self.logger.debug("{plc} tag I/O: {stats}".format(
+            plc=self.intermediate_plc["name"], stats=self.tag_io.stats()))
+        self.logger.debug("{plc} database contention: {stats}".format(
+            plc=self.intermediate_plc["name"], stats=CONTENTION.as_dict()))
+        for ip, stats in self.cache_stats().items():
+            self.logger.debug("{plc} cache updates from {ip}: {stats}".format(
+                plc=self.intermediate_plc["name"], ip=ip, stats=stats))
+        for ip, stats in self.enip_client.stats().items():
+            self.logger.debug("{plc} ENIP requests to {ip}: {stats}".format(
+                plc=self.intermediate_plc["name"], ip=ip, stats=stats))
+        self.enip_client.close()
+        if self.subscriptions is not None:
+            self.logger.debug("{plc} subscriptions: {stats}".format(
+                plc=self.intermediate_plc["name"], stats=self.subscriptions.stats()))
+            self.subscriptions.stop()
+        self.write_data_age()
+        if self.sync_trace is not None:
+            self.sync_trace.close()
+        super(GenericPLC, self).shutdown()
+
     def main_loop(self, sleep=0.5, test_break=False):
         """
-        The main loop of a PLC. In here all the controls will be applied.
+        The main loop of a PLC. In here all the controls and attacks will be applied through
+        the rule table.
 
         :param sleep:  (Default value = 0.5) Not used
         :param test_break:  (Default value = False) used for unit testing, breaks the loop after one iteration
         """
         self.logger.debug(self.intermediate_plc['name'] + ' enters main_loop')
+        try:
+            self.run_scans(test_break)
+        except BarrierError as error:
+            # The physical process closes the barrier when it finishes
+            self.logger.debug("{plc} barrier closed: {error}".format(
+                plc=self.intermediate_plc['name'], error=error))
+            self.sigint_handler(signal.SIGTERM, None)
+
+    def run_scans(self, test_break=False):
+        """
+        Do a scan every time the physical process asks for one.
+
+        :param test_break:  (Default value = False) used for unit testing, breaks the loop after one iteration
+        :raise BarrierError: when the physical process closed the barrier
+        """
         while True:
             while self.get_sync():
-                time.sleep(self.DB_SLEEP_TIME)
+                time.sleep(self.SYNC_POLL_TIME)
 
             # Wait until we acquire the first sync before polling the PLCs
-            if not self.plcs_ready:
+            if not self.plcs_ready and self.subscriptions is None:
                 self.logger.debug("PLC starting update cache thread")
                 self.plcs_ready = True
                 self.update_cache_flag = True
@@ -460,11 +659,16 @@ class GenericPLC(BasePLC):
 
             #self.update_cache()
 
-            for control in self.controls:
-                control.apply(self)
+            self.tag_io.refresh()
+            # One read of the clock per scan, for the time rules and the age of remote values
+            master_time = None
+            if self.rule_table.uses_clock or self.data_age.sources:
+                master_time = self.tag_io.master_time()
+                self.data_age.iteration = master_time
+            self.rule_table.scan(self, master_time)
 
-            for attack in self.attacks:
-                attack.apply(self)
+            if self.subscriptions is not None:
+                self.subscriptions.publish(self.tag_io.shadow)
 
             self.set_sync(1)
 
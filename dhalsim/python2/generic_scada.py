@@ -1,7 +1,5 @@
 import argparse
-import csv
 import os.path
-import random
 import signal
 import sqlite3
 import sys
@@ -13,12 +11,18 @@ from decimal import Decimal
 from pathlib import Path
 
 import yaml
+from barrier import BarrierClient, BarrierError
 from basePLC import BasePLC
+from data_age import DataAge
+from database import CONTENTION, shared_connection
+from enip_client import EnipClient
+from historian import Historian
 
 from py2_logger import get_logger
-import threading
-import thread
-
+from scada_poller import PlcPoller
+from shared_state import open_plant_state
+from sync_trace import open_sync_trace
+from timeseries import QueryServer, TimeSeriesStore
 
 
 class Error(Exception):
@@ -46,20 +50,38 @@ class GenericScada(BasePLC):
     DB_TRIES = 10
     """Amount of times a db query will retry on a exception"""
 
-    DB_SLEEP_TIME = random.uniform(0.01, 0.1)
-    """Amount of time a db query will wait before retrying"""
+    SYNC_POLL_TIME = 0.01
+    """Time in seconds between two reads of the sync flag"""
 
     SCADA_CACHE_UPDATE_TIME = 2
     """ Time in seconds the SCADA server updates its cache"""
 
-    def __init__(self, intermediate_yaml_path):
-        with intermediate_yaml_path.open() as yaml_file:
-            self.intermediate_yaml = yaml.load(yaml_file, Loader=yaml.FullLoader)
+    ENIP_TIMEOUT = 1.0
+    """ Time in seconds the SCADA waits for the answer of a PLC"""
+
+    SCADA_POLL_BACKOFF = 2.0
+    """ Factor the time between polls of a PLC grows with after every consecutive failure"""
+
+    SCADA_POLL_MAX_BACKOFF = 30.0
+    """ Maximum time in seconds between polls of a PLC that fails"""
+
+    OBSERVER_POLL_TIME = 0.01
+    """ Time in seconds between two reads of the master clock in observer mode"""
+
+    def __init__(self, intermediate_yaml_path, intermediate_yaml=None):
+        # A launcher that already loaded the intermediate yaml passes it
+        if intermediate_yaml is None:
+            with intermediate_yaml_path.open() as yaml_file:
+                intermediate_yaml = yaml.load(yaml_file, Loader=yaml.FullLoader)
+        self.intermediate_yaml = intermediate_yaml
 
         self.logger = get_logger(self.intermediate_yaml['log_level'])
         # Initialize connection to the database
         self.initialize_db()
 
+        # The master clock is read from shared memory instead of the database, when configured
+        self.shared_state = open_plant_state(self.intermediate_yaml)
+
         self.output_path = Path(self.intermediate_yaml["output_path"]) / "scada_values.csv"
 
         self.output_path.touch(exist_ok=True)
@@ -76,15 +98,16 @@ class GenericScada(BasePLC):
             'tags': self.generate_real_tags(self.intermediate_yaml['plcs'])
         }
 
-        # Create protocol
+        # Create protocol. Nothing reads from the SCADA server, and the local runtime runs
+        # without root, where the cpppo server cannot bind its web interface
         scada_protocol = {
             'name': 'enip',
-            'mode': 1,
+            'mode': 0 if 'local_runtime' in self.intermediate_yaml else 1,
             'server': scada_server
         }
 
         self.plc_data = self.generate_plcs()
-        self.saved_values = [['iteration', 'timestamp']]
+        header = ['iteration', 'timestamp']
 
         for PLC in self.intermediate_yaml['plcs']:
             if 'sensors' not in PLC:
@@ -92,15 +115,49 @@ class GenericScada(BasePLC):
 
             if 'actuators' not in PLC:
                 PLC['actuators'] = list()
-            self.saved_values[0].extend(PLC['sensors'])
-            self.saved_values[0].extend(PLC['actuators'])
+            header.extend(PLC['sensors'])
+            header.extend(PLC['actuators'])
+
+        # The rows are streamed to the output file, only the last ones are kept in memory
+        self.historian = Historian(self.output_path, header,
+                                   **self.intermediate_yaml.get('historian', {}))
+
+        # Compressed history of every tag, that can be queried while the simulation runs
+        self.timeseries = None
+        self.query_server = None
+        if 'timeseries' in self.intermediate_yaml:
+            self.timeseries = TimeSeriesStore(
+                header[2:], self.intermediate_yaml['timeseries']['max_points'])
 
         self.update_cache_flag = False
         self.plcs_ready = False
 
-        self.cache = {}
-        for ip in self.plc_data:
-            self.cache[ip] = [0] * len(self.plc_data[ip])
+        # In observer mode the SCADA follows the master clock instead of taking part in the sync
+        self.observer = self.intermediate_yaml.get('scada_observer', False)
+        self.observed_time = None
+        self.missed_iterations = 0
+
+        # Released by the physical process over a socket instead of through the sync table
+        self.barrier = None
+        if self.intermediate_yaml.get('barrier', 'sqlite') == 'socket' and not self.observer:
+            self.barrier = BarrierClient(self.intermediate_yaml['barrier_path'], 'scada')
+
+        # When the scada was released and done with every iteration, when the sync is traced
+        self.sync_trace = None
+        if not self.observer:
+            self.sync_trace = open_sync_trace(self.intermediate_yaml, 'scada')
+
+        # Persistent ENIP sessions with the remote PLCs
+        self.enip_client = EnipClient(self.ENIP_TIMEOUT)
+
+        # Age of the values of every tag when they are recorded
+        sources = {}
+        for PLC in self.intermediate_yaml['plcs']:
+            for tag in PLC['sensors'] + PLC['actuators']:
+                sources[tag] = PLC['name']
+        self.data_age = DataAge(sources)
+
+        self.pollers = self.generate_pollers()
 
         self.do_super_construction(scada_protocol, state)
 
@@ -116,7 +173,7 @@ class GenericScada(BasePLC):
         Function that initializes PLC connection to the database
         Introduced to better facilitate testing
         """
-        self.conn = sqlite3.connect(self.intermediate_yaml["db_path"])
+        self.conn = shared_connection(self.intermediate_yaml["db_path"])
         self.cur = self.conn.cursor()
 
     @staticmethod
@@ -171,16 +228,34 @@ class GenericScada(BasePLC):
         signal.signal(signal.SIGINT, self.sigint_handler)
         signal.signal(signal.SIGTERM, self.sigint_handler)
 
+        self.historian.start()
+        if self.timeseries is not None:
+            self.start_query_server()
+
         self.keep_updating_flag = True
         self.cache_update_process = None
 
         time.sleep(sleep)
 
+    def start_query_server(self):
+        """
+        Answer queries to the time series store on :code:`scada_timeseries.sock` in the output
+        path. The SCADA keeps running without it when the socket cannot be created.
+        """
+        path = str(self.output_path.parent / "scada_timeseries.sock")
+        try:
+            self.query_server = QueryServer(self.timeseries, path)
+            self.query_server.start()
+        except (OSError, IOError) as error:
+            self.query_server = None
+            self.logger.error("SCADA time series queries not available on {path}: {error}".format(
+                path=path, error=error))
+
     def db_query(self, query, parameters=None):
         """
         Execute a query on the database
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
         This is necessary because of the limited concurrency in SQLite.
 
         :param query: The SQL query to execute in the db
@@ -202,7 +277,8 @@ class GenericScada(BasePLC):
                 self.logger.info(
                     "Failed to connect to db with exception {exc}. Trying {i} more times.".format(
                         exc=exc, i=self.DB_TRIES - i - 1))
-                time.sleep(self.DB_SLEEP_TIME)
+                time.sleep(CONTENTION.backoff(i))
+        CONTENTION.failed()
         self.logger.error(
             "Failed to connect to db. Tried {i} times.".format(i=self.DB_TRIES))
         raise DatabaseError("Failed to get master clock from database")
@@ -211,15 +287,23 @@ class GenericScada(BasePLC):
         """
         Get the sync flag of the scada.
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
+        With the socket barrier this blocks until the physical process releases the scada.
 
         :return: False if physical process wants the plc to do a iteration, True if not.
 
         :raise DatabaseError: When a :code:`sqlite3.OperationalError` is still raised after
            :code:`DB_TRIES` tries.
         """
+        if self.barrier is not None:
+            master_time = self.barrier.wait()
+            if self.sync_trace is not None:
+                self.sync_trace.released(master_time)
+            return False
         self.db_query("SELECT flag FROM sync WHERE name IS 'scada'")
         flag = bool(self.cur.fetchone()[0])
+        if not flag and self.sync_trace is not None and not self.sync_trace.pending:
+            self.sync_trace.released()
         return flag
 
     def set_sync(self, flag):
@@ -227,7 +311,7 @@ class GenericScada(BasePLC):
         Set the scada's sync flag in the sync table. When this is 1, the physical process
         knows that the scada finished the requested iteration.
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
 
         :param flag: True for sync to 1, False for sync to 0
         :type flag: bool
@@ -235,12 +319,20 @@ class GenericScada(BasePLC):
         :raise DatabaseError: When a :code:`sqlite3.OperationalError` is still raised after
            :code:`DB_TRIES` tries.
         """
-        self.db_query("UPDATE sync SET flag=? WHERE name IS 'scada'",
-                         (int(flag),))
-        self.conn.commit()
+        if self.barrier is not None:
+            if flag:
+                self.barrier.done()
+        else:
+            self.db_query("UPDATE sync SET flag=? WHERE name IS 'scada'",
+                             (int(flag),))
+            self.conn.commit()
+        if flag and self.sync_trace is not None:
+            self.sync_trace.done()
 
     def stop_cache_update(self):
         self.update_cache_flag = False
+        for poller in self.pollers.values():
+            poller.stop()
 
     def sigint_handler(self, sig, frame):
         """
@@ -248,17 +340,39 @@ class GenericScada(BasePLC):
         """
         self.stop_cache_update()
         self.logger.debug("SCADA shutdown")
-        self.write_output()
+        for ip, poller in self.pollers.items():
+            self.logger.debug("SCADA polling of {ip}: {stats}".format(ip=ip, stats=poller.stats()))
+        for ip, stats in self.enip_client.stats().items():
+            self.logger.debug("SCADA ENIP requests to {ip}: {stats}".format(ip=ip, stats=stats))
+        self.enip_client.close()
+        self.logger.debug("SCADA historian: {stats}".format(stats=self.historian.stats()))
+        self.logger.debug("SCADA database contention: {stats}".format(stats=CONTENTION.as_dict()))
+        if self.observer:
+            self.logger.info("SCADA missed {n} iterations".format(n=self.missed_iterations))
+        if self.query_server is not None:
+            self.query_server.stop()
+        self.write_data_age()
+        self.historian.close()
+        if self.sync_trace is not None:
+            self.sync_trace.close()
 
         sys.exit(0)
 
+    def write_data_age(self):
+        """
+        Write the age of the recorded values to :code:`data_age_scada.json` in the output path.
+        """
+        path = self.output_path.parent / "data_age_scada.json"
+        try:
+            self.data_age.write(path)
+        except (IOError, OSError) as error:
+            self.logger.error("Writing {path} failed: {error}".format(path=path, error=error))
+
     def write_output(self):
         """
-        Writes the csv output of the scada
+        Flushes the rows recorded until now to the csv output of the scada
         """
-        with self.output_path.open(mode='wb') as output:
-            writer = csv.writer(output)
-            writer.writerows(self.saved_values)
+        self.historian.flush()
 
     def generate_plcs(self):
         """
@@ -283,43 +397,86 @@ class GenericScada(BasePLC):
 
         return plcs
 
+    def polling_settings(self, plc):
+        """
+        Gets the settings of the poller of a PLC. The settings of the PLC override the
+        :code:`scada_polling` settings of the experiment, which override the defaults.
+
+        :param plc: the PLC from the intermediate yaml
+        :return: dict with the interval, timeout, backoff and max_backoff
+        """
+        settings = {'interval': self.SCADA_CACHE_UPDATE_TIME,
+                    'timeout': self.ENIP_TIMEOUT,
+                    'backoff': self.SCADA_POLL_BACKOFF,
+                    'max_backoff': self.SCADA_POLL_MAX_BACKOFF}
+        settings.update(self.intermediate_yaml.get('scada_polling', {}))
+        settings.update(plc.get('scada_polling', {}))
+        return settings
+
+    def generate_pollers(self):
+        """
+        Generates a :class:`~dhalsim.python2.scada_poller.PlcPoller` for every PLC, in the
+        order of :code:`plc_data`. The pollers are started once the PLCs are ready.
+        """
+        pollers = OrderedDict()
+        for PLC in self.intermediate_yaml['plcs']:
+            ip = PLC['public_ip']
+            settings = self.polling_settings(PLC)
+            self.enip_client.set_timeout(ip, settings['timeout'])
+            pollers[ip] = PlcPoller(ip, self.plc_data[ip], self.receive_multiple,
+                                    settings['interval'], settings['backoff'],
+                                    settings['max_backoff'], self.data_age, self.logger)
+        return pollers
+
     def get_master_clock(self):
         """
-        Get the value of the master clock of the physical process through the database.
+        Get the value of the master clock of the physical process through the database, or the
+        shared memory when the plant is kept there.
         On a :code:`sqlite3.OperationalError` it will retry with a max of :code:`DB_TRIES` tries.
-        Before it reties, it will sleep for :code:`DB_SLEEP_TIME` seconds.
+        Before it retries, it sleeps for a jittered exponential backoff.
 
         :return: Iteration in the physical process.
 
         :raise DatabaseError: When a :code:`sqlite3.OperationalError` is still raised after
            :code:`DB_TRIES` tries.
         """
+        if self.shared_state is not None:
+            return self.shared_state.master_time()
         self.db_query("SELECT time FROM master_time WHERE id IS 1")
         master_time = self.cur.fetchone()[0]
         return master_time
 
-    def update_cache(self, lock, cache_update_time):
-        """
-        Update the cache of the scada by receiving all the required tags.
-        When something cannot be received, the previous values are used.
-        """
-
-        while self.update_cache_flag:
-            for plc_ip in self.cache:
-                try:
-                    values = self.receive_multiple(self.plc_data[plc_ip], plc_ip)
-                    with lock:
-                        self.cache[plc_ip] = values
-                    self.logger.debug("PLC values received by SCADA from IP: " + str(plc_ip)
-                                      + " is " + str(values) + ".")
-                except Exception as e:
-                    self.logger.error(
-                        "PLC receive_multiple with tags {tags} from {ip} failed with exception '{e}'".format(
-                            tags=self.plc_data[plc_ip],
-                            ip=plc_ip, e=str(e)))
-                    time.sleep(cache_update_time)
-                    continue
-            time.sleep(cache_update_time)
+    def start_cache_update(self):
+        """
+        Start polling every PLC in its own thread. The pollers keep the last values of their
+        PLC, so a PLC that does not answer only delays its own values.
+        """
+        self.update_cache_flag = True
+        for poller in self.pollers.values():
+            poller.start()
+
+    def record_values(self, master_time):
+        """
+        Records a row with the last values of every PLC for an iteration.
+
+        :param master_time: the iteration
+        """
+        results = [master_time, datetime.now()]
+        self.data_age.iteration = master_time
+        now = time.time()
+        for plc_ip in self.plc_data:
+            values, _ = self.pollers[plc_ip].latest()
+            results.extend(values)
+            for tag in self.pollers[plc_ip].names:
+                self.data_age.use(tag, now)
+        self.historian.record(results)
+        if self.timeseries is not None:
+            self.timeseries.append(master_time, results[2:])
+
+        # Save scada_values.csv when needed
+        if 'saving_interval' in self.intermediate_yaml and master_time != 0 and \
+                master_time % self.intermediate_yaml['saving_interval'] == 0:
+            self.write_output()
 
     def main_loop(self, sleep=0.5, test_break=False):
         """
@@ -329,38 +486,84 @@ class GenericScada(BasePLC):
         :param test_break:  (Default value = False) used for unit testing, breaks the loop after one iteration
         """
         self.logger.debug("SCADA enters main_loop")
-        lock = None
 
+        if self.observer:
+            self.observe(test_break)
+            return
+
+        try:
+            self.record_iterations(test_break)
+        except BarrierError as error:
+            # The physical process closes the barrier when it finishes
+            self.logger.debug("SCADA barrier closed: {error}".format(error=error))
+            self.sigint_handler(signal.SIGTERM, None)
+
+    def record_iterations(self, test_break=False):
+        """
+        Record the values every time the physical process asks for an iteration.
+
+        :param test_break:  (Default value = False) used for unit testing, breaks the loop after one iteration
+        :raise BarrierError: when the physical process closed the barrier
+        """
         while True:
             while self.get_sync():
-                time.sleep(self.DB_SLEEP_TIME)
+                time.sleep(self.SYNC_POLL_TIME)
 
             # Wait until we acquire the first sync before polling the PLCs
             if not self.plcs_ready:
                 self.plcs_ready = True
-                self.update_cache_flag = True
-                self.logger.debug("SCADA starting update cache thread")
-                lock = threading.Lock()
-                thread.start_new_thread(self.update_cache, (lock, self.SCADA_CACHE_UPDATE_TIME))
+                self.logger.debug("SCADA starting the PLC pollers")
+                self.start_cache_update()
 
             master_time = self.get_master_clock()
-            #self.update_cache()
-            results = [master_time, datetime.now()]
-            with lock:
-                for plc_ip in self.plc_data:
-                    results.extend(self.cache[plc_ip])
-            self.saved_values.append(results)
-
-            # Save scada_values.csv when needed
-            if 'saving_interval' in self.intermediate_yaml and master_time != 0 and \
-                    master_time % self.intermediate_yaml['saving_interval'] == 0:
-                self.write_output()
+            self.record_values(master_time)
 
             self.set_sync(1)
 
             if test_break:
                 break
 
+    def observe(self, test_break=False):
+        """
+        The main loop of a SCADA in observer mode. The SCADA has no sync flag, so the physical
+        process does not wait for it. It follows the master clock and records a row for every
+        iteration it sees, starting with the one the clock is at, like the first iteration the
+        synced SCADA is released for. Iterations that passed while it was busy are counted and
+        logged.
+
+        :param test_break:  (Default value = False) used for unit testing, breaks the loop after one recorded row
+        """
+        if self.observed_time is None:
+            self.observed_time = self.get_master_clock()
+            self.record_values(self.observed_time)
+            if test_break:
+                return
+
+        while True:
+            time.sleep(self.OBSERVER_POLL_TIME)
+            master_time = self.get_master_clock()
+            if master_time == self.observed_time:
+                continue
+
+            # The clock only moves once every PLC did its first scan, so the PLCs are serving
+            if not self.plcs_ready:
+                self.plcs_ready = True
+                self.logger.debug("SCADA starting the PLC pollers")
+                self.start_cache_update()
+
+            missed = master_time - self.observed_time - 1
+            if missed > 0:
+                self.missed_iterations += missed
+                self.logger.warning("SCADA missed {n} iterations before iteration {t}".format(
+                    n=missed, t=master_time))
+            self.observed_time = master_time
+
+            self.record_values(master_time)
+
+            if test_break:
+                break
+
+
 def is_valid_file(parser_instance, arg):
     """
     Verifies whether the intermediate yaml path is valid.
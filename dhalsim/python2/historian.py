@@ -0,0 +1,165 @@
+import csv
+import gzip
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from Queue import Queue, Empty
+
+FLUSH = object()
+"""Marker asking the writer to flush the file"""
+
+STOP = object()
+"""Marker asking the writer to write the remaining rows and stop"""
+
+
+class Historian(object):
+    """
+    Streams the rows of the SCADA to a csv file, appending them from a background writer
+    thread. This replaces keeping every row in memory and rewriting the whole file at every
+    :code:`saving_interval`.
+
+    The file can be rotated when it grows over :code:`max_bytes` bytes or gets older than
+    :code:`max_seconds` seconds. The rotated files are numbered in order, like
+    :code:`scada_values.1.csv`, and are gzipped when :code:`compress` is set. The rows of the
+    current file stay in the file at :code:`path`, and every file starts with the header.
+
+    Only the last :code:`tail` rows are kept in memory.
+
+    :param path: path of the csv file
+    :type path: Path
+    :param header: list with the names of the columns
+    :param max_bytes: size in bytes after which the file is rotated, 0 to not rotate on size
+    :param max_seconds: age in seconds after which the file is rotated, 0 to not rotate on age
+    :param compress: gzip the rotated files
+    :param tail: amount of rows kept in memory
+    :param flush_interval: maximum time in seconds a written row stays in the file buffer
+    """
+
+    def __init__(self, path, header, max_bytes=0, max_seconds=0, compress=False, tail=1000,
+                 flush_interval=1.0):
+        self.path = path
+        self.header = header
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compress = compress
+        self.flush_interval = flush_interval
+
+        self.tail = deque(maxlen=tail)
+        self.rows = Queue()
+        self.thread = None
+
+        self.file = None
+        self.writer = None
+        self.opened = None
+        self.rotations = 0
+
+        # Counters
+        self.rows_written = 0
+        self.bytes_written = 0
+
+    def start(self):
+        """
+        Start the writer thread. The file at :code:`path` is overwritten.
+        """
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record(self, row):
+        """
+        Add a row. It is written by the writer thread, so this does not wait for the disk.
+
+        :param row: list with a value for every column
+        """
+        self.tail.append(row)
+        self.rows.put(row)
+
+    def flush(self):
+        """
+        Ask the writer thread to flush the rows recorded until now to the file.
+        """
+        self.rows.put(FLUSH)
+
+    def close(self, timeout=None):
+        """
+        Write the remaining rows and close the file.
+
+        :param timeout: maximum time in seconds to wait for the writer thread
+        """
+        if self.thread is None:
+            return
+        self.rows.put(STOP)
+        self.thread.join(timeout)
+
+    def open(self):
+        self.file = open(str(self.path), 'wb')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.header)
+        self.opened = time.time()
+
+    def needs_rotation(self, now):
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            return True
+        return bool(self.max_seconds) and now - self.opened >= self.max_seconds
+
+    def rotated_path(self, number):
+        """
+        :return: path of the rotated file with that number
+        """
+        name = "{stem}.{number}{suffix}".format(stem=self.path.stem, number=number,
+                                                suffix=self.path.suffix)
+        if self.compress:
+            name += ".gz"
+        return self.path.with_name(name)
+
+    def rotate(self):
+        """
+        Move the current file to the next rotated file, and start a new file.
+        """
+        self.file.close()
+        self.rotations += 1
+        target = self.rotated_path(self.rotations)
+        if self.compress:
+            with open(str(self.path), 'rb') as plain, gzip.open(str(target), 'wb') as packed:
+                shutil.copyfileobj(plain, packed)
+            os.remove(str(self.path))
+        else:
+            os.rename(str(self.path), str(target))
+        self.open()
+
+    def run(self):
+        self.open()
+        last_flush = time.time()
+        while True:
+            try:
+                row = self.rows.get(timeout=self.flush_interval)
+            except Empty:
+                row = FLUSH
+
+            if row is STOP:
+                break
+            if row is not FLUSH:
+                start = self.file.tell()
+                self.writer.writerow(row)
+                self.rows_written += 1
+                self.bytes_written += self.file.tell() - start
+
+            now = time.time()
+            if row is FLUSH or now - last_flush >= self.flush_interval:
+                self.file.flush()
+                last_flush = now
+            if row is not FLUSH and self.needs_rotation(now):
+                self.rotate()
+
+        self.file.close()
+
+    def stats(self):
+        """
+        :return: dict with the counters of the historian
+        """
+        return {'rows_written': self.rows_written,
+                'bytes_written': self.bytes_written,
+                'rows_queued': self.rows.qsize(),
+                'rotations': self.rotations}
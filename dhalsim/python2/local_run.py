@@ -0,0 +1,163 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+import py2_logger
+from plc_host import assign_local_addresses
+
+
+class LocalCPS(object):
+    """
+    This class can run a experiment from a intermediate yaml file without Mininet and root.
+    The PLCs are split over :code:`processes` :class:`~dhalsim.python2.plc_host.PlcHost`
+    processes, and every PLC serves its tags on its own port of the loopback interface.
+
+    :param intermediate_yaml: The path to the intermediate yaml file
+    :type intermediate_yaml: Path
+    """
+
+    def __init__(self, intermediate_yaml):
+
+        # Create logs directory in working directory
+        try:
+            os.mkdir('logs')
+        except OSError:
+            pass
+
+        self.intermediate_yaml = intermediate_yaml
+
+        with self.intermediate_yaml.open(mode='r') as file:
+            self.data = yaml.safe_load(file)
+
+        self.logger = py2_logger.get_logger(self.data['log_level'])
+
+        # Create directory output path
+        try:
+            os.makedirs(str(Path(self.data["output_path"])))
+        except OSError:
+            pass
+
+        signal.signal(signal.SIGINT, self.interrupt)
+        signal.signal(signal.SIGTERM, self.interrupt)
+
+        # Write the loopback addresses of the nodes back to the file, like the topologies do
+        assign_local_addresses(self.data, self.data['local_runtime']['base_port'])
+        with self.intermediate_yaml.open(mode='w') as file:
+            yaml.safe_dump(self.data, file)
+
+        self.plc_processes = None
+        self.scada_process = None
+        self.plant_process = None
+
+        self.automatic_start()
+        self.poll_processes()
+        self.finish()
+
+    def interrupt(self, sig, frame):
+        """
+        Interrupt handler for :class:`~signal.SIGINT` and :class:`~signal.SIGINT`.
+        """
+        self.finish()
+        sys.exit(0)
+
+    def automatic_start(self):
+        """
+        This starts the plc host processes, the scada and the plant.
+        """
+        self.plc_processes = []
+        if self.data.get("plcs"):
+            plc_host_path = Path(__file__).parent.absolute() / "plc_host.py"
+            shards = min(self.data['local_runtime']['processes'], len(self.data["plcs"]))
+            for shard in range(shards):
+                cmd = ["python2", str(plc_host_path), str(self.intermediate_yaml), str(shard),
+                       str(shards)]
+                self.plc_processes.append(
+                    subprocess.Popen(cmd, stderr=sys.stderr, stdout=sys.stdout))
+
+        self.logger.info("Launched the PLC host processes.")
+
+        generic_scada_path = Path(__file__).parent.absolute() / "generic_scada.py"
+        scada_cmd = ["python2", str(generic_scada_path), str(self.intermediate_yaml)]
+        self.scada_process = subprocess.Popen(scada_cmd, stderr=sys.stderr, stdout=sys.stdout)
+
+        self.logger.info("Launched the SCADA process.")
+
+        automatic_plant_path = Path(__file__).parent.absolute() / "automatic_plant.py"
+
+        cmd = ["python2", str(automatic_plant_path), str(self.intermediate_yaml)]
+        self.plant_process = subprocess.Popen(cmd, stderr=sys.stderr, stdout=sys.stdout)
+
+        self.logger.debug("Launched the plant processes.")
+
+    def poll_processes(self):
+        """Polls for all processes and finishes if one closes"""
+        processes = []
+        processes.extend(self.plc_processes)
+        processes.append(self.scada_process)
+        processes.append(self.plant_process)
+        # We wait until the simulation ends
+        while True:
+            for process in processes:
+                if process.poll() is not None:
+                    self.logger.debug("process has finished, stopping simulation...")
+                    return
+            time.sleep(0.1)
+
+    @staticmethod
+    def end_process(process):
+        """
+        End a process.
+
+        :param process: the process to end
+        """
+        process.send_signal(signal.SIGINT)
+        process.wait()
+        if process.poll() is None:
+            process.terminate()
+        if process.poll() is None:
+            process.kill()
+
+    def finish(self):
+        """
+        Terminate the plc hosts, scada and physical process.
+        """
+        self.logger.info("Simulation finished.")
+
+        processes = [('SCADA', self.scada_process)]
+        processes.extend(('plc host', process) for process in self.plc_processes or [])
+        processes.append(('plant_process', self.plant_process))
+
+        for name, process in processes:
+            if process is not None and process.poll() is None:
+                try:
+                    self.end_process(process)
+                except Exception as msg:
+                    self.logger.error("Exception shutting down " + name + ": " + str(msg))
+
+        sys.exit(0)
+
+
+def is_valid_file(parser_instance, arg):
+    """Verifies whether the intermediate yaml path is valid"""
+    if not os.path.exists(arg):
+        parser_instance.error(arg + " does not exist.")
+    else:
+        return arg
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run experiment from intermediate yaml file '
+                                                 'without Mininet')
+    parser.add_argument(dest="intermediate_yaml",
+                        help="intermediate yaml file", metavar="FILE",
+                        type=lambda x: is_valid_file(parser, x))
+
+    args = parser.parse_args()
+
+    local_cps = LocalCPS(intermediate_yaml=Path(args.intermediate_yaml))
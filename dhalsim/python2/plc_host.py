@@ -0,0 +1,189 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+import yaml
+
+from generic_plc import GenericPLC
+from py2_logger import get_logger
+
+LOCALHOST = "127.0.0.1"
+
+
+def local_address(base_port, plc_index):
+    """
+    :param base_port: port of the ENIP server of the first PLC
+    :param plc_index: index of the PLC in the intermediate yaml
+    :return: the :code:`ip:port` the ENIP server of the PLC listens on in the local runtime
+    """
+    return "{ip}:{port}".format(ip=LOCALHOST, port=base_port + plc_index)
+
+
+def assign_local_addresses(data, base_port):
+    """
+    Give every PLC its own port on the loopback interface, instead of an IP in a Mininet
+    network. The other PLCs, the SCADA and the attackers reach a PLC at that address.
+
+    :param data: the dict resulting from a dump of the intermediate yaml
+    :param base_port: port of the ENIP server of the first PLC
+    """
+    data['scada'] = {'name': "scada", 'local_ip': LOCALHOST, 'public_ip': LOCALHOST}
+    for index, plc in enumerate(data.get('plcs', [])):
+        plc['local_ip'] = local_address(base_port, index)
+        plc['public_ip'] = plc['local_ip']
+
+
+def shard_indexes(n_plcs, shard, shards):
+    """
+    Split the PLCs over several host processes. PLCs are dealt round robin, so every shard
+    gets a mix of the PLCs in the yaml.
+
+    :param n_plcs: amount of PLCs in the intermediate yaml
+    :param shard: index of this host process
+    :param shards: amount of host processes
+    :return: the indexes of the PLCs hosted by this shard
+    """
+    return list(range(shard, n_plcs, shards))
+
+
+class HostedPLC(GenericPLC):
+    """
+    A :class:`~dhalsim.python2.generic_plc.GenericPLC` running in a thread of a
+    :class:`PlcHost`. Signals can only be handled by the main thread, so the host handles
+    them and shuts the PLC down.
+
+    :param host: the :class:`PlcHost` running this PLC
+    """
+
+    def __init__(self, host, intermediate_yaml_path, yaml_index, intermediate_yaml):
+        self.host = host
+        super(HostedPLC, self).__init__(intermediate_yaml_path, yaml_index, intermediate_yaml)
+
+    def startup(self):
+        self.host.register(self)
+        self.start_serving()
+
+    def sigint_handler(self, sig, frame):
+        """
+        Called when the barrier is closed. Only this PLC stops, its thread ends when the main
+        loop returns.
+        """
+        self.host.unregister(self)
+        self.shutdown()
+
+
+class PlcHost(object):
+    """
+    Runs a shard of the PLCs of an experiment in one process, every PLC in its own thread.
+    The PLCs share the database with the other processes and serve their tags on their own
+    port of the loopback interface, so no Mininet host or root is needed per PLC.
+
+    :param intermediate_yaml: The path to the intermediate yaml file
+    :type intermediate_yaml: Path
+    :param shard: index of this host process
+    :param shards: amount of host processes
+    """
+
+    def __init__(self, intermediate_yaml, shard=0, shards=1):
+        self.intermediate_yaml = intermediate_yaml
+
+        with self.intermediate_yaml.open(mode='r') as file:
+            self.data = yaml.load(file, Loader=yaml.FullLoader)
+
+        self.logger = get_logger(self.data['log_level'])
+
+        self.plc_indexes = shard_indexes(len(self.data.get('plcs', [])), shard, shards)
+        self.plcs = []
+        self.plcs_lock = threading.Lock()
+        self.threads = []
+
+        signal.signal(signal.SIGINT, self.sigint_handler)
+        signal.signal(signal.SIGTERM, self.sigint_handler)
+
+    def register(self, plc):
+        """
+        Called by a :class:`HostedPLC` when it starts serving, so it is shut down with the host.
+        """
+        with self.plcs_lock:
+            self.plcs.append(plc)
+
+    def unregister(self, plc):
+        """
+        Called by a :class:`HostedPLC` that shut itself down.
+        """
+        with self.plcs_lock:
+            if plc in self.plcs:
+                self.plcs.remove(plc)
+
+    def run_plc(self, plc_index):
+        """
+        Run one PLC until it stops. An exception only stops that PLC.
+        """
+        # noinspection PyBroadException
+        try:
+            HostedPLC(self, self.intermediate_yaml, plc_index, self.data)
+        except Exception:
+            self.logger.error("PLC {name} stopped with exception:\n{trace}".format(
+                name=self.data['plcs'][plc_index]['name'], trace=traceback.format_exc()))
+
+    def main(self):
+        """
+        Start a thread for every PLC of this shard and wait while they run.
+        """
+        for plc_index in self.plc_indexes:
+            plc_thread = threading.Thread(target=self.run_plc, args=(plc_index,))
+            plc_thread.daemon = True
+            plc_thread.start()
+            self.threads.append(plc_thread)
+
+        self.logger.info("Hosting {n} PLCs in process {pid}.".format(
+            n=len(self.threads), pid=os.getpid()))
+
+        # Sleeping instead of joining, so the main thread keeps handling signals
+        while any(plc_thread.is_alive() for plc_thread in self.threads):
+            time.sleep(0.5)
+
+    def terminate(self):
+        """
+        Shut down all the PLCs that started serving.
+        """
+        with self.plcs_lock:
+            plcs = list(self.plcs)
+        for plc in plcs:
+            # noinspection PyBroadException
+            try:
+                plc.shutdown()
+            except Exception as msg:
+                self.logger.error("Exception shutting down plc: " + str(msg))
+
+    def sigint_handler(self, sig, frame):
+        """
+        Interrupt handler for :class:`~signal.SIGINT` and :class:`~signal.SIGINT`.
+        """
+        self.terminate()
+        sys.exit(0)
+
+
+def is_valid_file(parser_instance, arg):
+    if not os.path.exists(arg):
+        parser_instance.error(arg + " does not exist")
+    else:
+        return arg
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a shard of the PLCs in one process')
+    parser.add_argument(dest="intermediate_yaml",
+                        help="intermediate yaml file", metavar="FILE",
+                        type=lambda x: is_valid_file(parser, x))
+    parser.add_argument(dest="shard", help="Index of this host process", type=int, metavar="N")
+    parser.add_argument(dest="shards", help="Amount of host processes", type=int, metavar="M")
+
+    args = parser.parse_args()
+    plc_host = PlcHost(Path(args.intermediate_yaml), args.shard, args.shards)
+    plc_host.main()
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class DeadbandPublisher(object):
+    """
+    Decides which tags of a PLC are pushed to its ENIP server.
+
+    A tag is published when its value moved more than its deadband away from the last
+    published value, or when it has not been published for :code:`heartbeat` seconds. Actuators
+    have no deadband, so every change of an actuator is published. The first call publishes
+    every tag.
+
+    The deadband is applied to the values read from the plant, the gaussian noise is added
+    afterwards with one draw for all the published sensors.
+
+    :param sensors: names of the sensor tags
+    :param actuators: names of the actuator tags
+    :param noise_scale: standard deviation of the noise added to the sensor values
+    :param deadband: deadband of the sensors without an entry in :code:`tag_deadbands`
+    :param tag_deadbands: dict of sensor name to its deadband
+    :param heartbeat: maximum time in seconds between two publications of a tag
+    """
+
+    def __init__(self, sensors, actuators, noise_scale=0.0, deadband=0.0, tag_deadbands=None,
+                 heartbeat=10.0):
+        tag_deadbands = tag_deadbands or {}
+
+        self.names = list(sensors) + list(actuators)
+        self.sensor_count = len(sensors)
+        self.noise_scale = noise_scale
+        self.heartbeat = heartbeat
+        self.deadbands = np.array([tag_deadbands.get(name, deadband) for name in sensors]
+                                  + [0.0] * len(actuators), dtype=np.float64)
+
+        self.published = None
+        self.published_at = np.zeros(len(self.names), dtype=np.float64)
+
+        # Counters
+        self.publications = 0
+        self.tags_published = 0
+        self.tags_suppressed = 0
+
+    def heartbeat_due(self, now):
+        """
+        :return: True when a tag has not been published for :code:`heartbeat` seconds
+        """
+        return self.published is None or bool(np.any(now - self.published_at >= self.heartbeat))
+
+    def select(self, values, now):
+        """
+        Select the tags to publish and remember them as published.
+
+        :param values: values of all the tags, sensors first, as read from the plant
+        :param now: the current time in seconds
+        :return: tuple of the indexes of the tags to publish and the values to send for them
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if self.published is None:
+            selected = np.ones(len(self.names), dtype=bool)
+            self.published = values.copy()
+        else:
+            selected = np.abs(values - self.published) > self.deadbands
+            selected |= now - self.published_at >= self.heartbeat
+
+        self.published[selected] = values[selected]
+        self.published_at[selected] = now
+
+        indexes = np.flatnonzero(selected)
+        send = values[indexes]
+        if self.noise_scale > 0:
+            sensors = indexes < self.sensor_count
+            send[sensors] += np.random.normal(0, self.noise_scale, int(sensors.sum()))
+
+        self.publications += 1 if indexes.size else 0
+        self.tags_published += indexes.size
+        self.tags_suppressed += len(self.names) - indexes.size
+        return indexes.tolist(), send.tolist()
+
+    def stats(self):
+        """
+        :return: dict with the amount of publications, and tags published and suppressed
+        """
+        return {'publications': self.publications,
+                'tags_published': self.tags_published,
+                'tags_suppressed': self.tags_suppressed}
@@ -0,0 +1,164 @@
+from bisect import bisect_right
+from collections import OrderedDict
+
+
+class RuleTable(object):
+    """
+    The controls and device attacks of a PLC compiled into a table that is evaluated once
+    per scan.
+
+    Rules that depend on a tag are grouped by that tag, so every dependant is read once per
+    scan no matter how many rules use it. Time controls are kept in a schedule of master clock
+    values to the rules that fire at that time, and the master clock is only read when the PLC
+    has time based rules. A PLC that does not scan every iteration fires the time controls
+    scheduled since its last scan, the latest one per actuator.
+
+    Conflicting rules are resolved in one pass in the order of the original lists: a later
+    control overrides an earlier one on the same actuator, and attacks override controls.
+    An actuator is only written when the resolved action differs from the last action written
+    to it, and an attack flag is only written when the attack starts or stops.
+
+    :param controls: list of :class:`~dhalsim.python2.entities.control.Control`
+    :param attacks: list of :class:`~dhalsim.python2.entities.attack.Attack`
+    """
+
+    def __init__(self, controls, attacks):
+        self.controls = list(controls)
+        self.attacks = list(attacks)
+        self.rules = self.controls + self.attacks
+
+        self.dependant_rules = OrderedDict()
+        self.schedule = {}
+        self.time_windows = []
+
+        for index, control in enumerate(self.controls):
+            if control.dependant is None:
+                self.schedule.setdefault(control.value, []).append(index)
+            else:
+                self.dependant_rules.setdefault(control.dependant, []).append(index)
+
+        for offset, attack in enumerate(self.attacks):
+            index = len(self.controls) + offset
+            if attack.sensor is None:
+                self.time_windows.append(index)
+            else:
+                self.dependant_rules.setdefault(attack.sensor, []).append(index)
+
+        self.schedule_times = sorted(self.schedule)
+        self.uses_clock = bool(self.schedule or self.time_windows)
+        self.last_time = None
+
+        # Last action written to every actuator and last flag written for every attack
+        self.written = {}
+        self.attack_flags = {}
+
+    @property
+    def dependants(self):
+        """
+        :return: the tags read on every scan
+        """
+        return list(self.dependant_rules)
+
+    def scheduled_rules(self, since, master_time):
+        """
+        Get the time controls scheduled after :code:`since` up to and including
+        :code:`master_time`. When several of them set the same actuator, only the one
+        scheduled last is returned.
+
+        :param since: master clock of the previous scan, or None to only get the time
+                      controls scheduled at :code:`master_time`
+        :param master_time: the master clock of this scan
+        :return: list of rule indexes
+        """
+        if since is None or since >= master_time:
+            return self.schedule.get(master_time, [])
+
+        latest = OrderedDict()
+        first = bisect_right(self.schedule_times, since)
+        last = bisect_right(self.schedule_times, master_time)
+        for scheduled in self.schedule_times[first:last]:
+            for index in self.schedule[scheduled]:
+                latest.pop(self.rules[index].actuator, None)
+                latest[self.rules[index].actuator] = index
+        return sorted(latest.values())
+
+    def evaluate(self, master_time, values, since=None):
+        """
+        Evaluate all the rules against one snapshot of the master clock and the dependants.
+
+        :param master_time: the master clock, only used when there are time based rules
+        :param values: dict of dependant tag to its value
+        :param since: master clock of the previous scan, time controls scheduled after it
+                      fire too
+        :return: list with a bool for every rule, True when the rule fires
+        """
+        fired = [False] * len(self.rules)
+
+        for tag, indexes in self.dependant_rules.items():
+            value = values[tag]
+            for index in indexes:
+                rule = self.rules[index]
+                if index < len(self.controls):
+                    fired[index] = rule.is_met(value)
+                else:
+                    fired[index] = rule.is_triggered(value)
+
+        if self.uses_clock:
+            for index in self.scheduled_rules(since, master_time):
+                fired[index] = True
+            for index in self.time_windows:
+                fired[index] = self.rules[index].is_triggered(master_time)
+
+        return fired
+
+    def resolve(self, fired):
+        """
+        Resolve the fired rules into one action per actuator.
+
+        :param fired: the result of :meth:`evaluate`
+        :return: ordered dict of actuator to the rule that decides its action
+        """
+        commands = OrderedDict()
+        for index, rule in enumerate(self.rules):
+            if fired[index]:
+                commands[rule.actuator] = rule
+        return commands
+
+    @staticmethod
+    def action_of(rule):
+        """
+        :return: the action a control or attack sets its actuator to
+        """
+        return rule.action if hasattr(rule, 'action') else rule.command
+
+    def scan(self, plc, master_time=None):
+        """
+        Run one scan on a PLC: take the snapshot, evaluate and resolve the rules, and write
+        the actuators and attack flags that changed.
+
+        :param plc: the :class:`~dhalsim.python2.generic_plc.GenericPLC` running the rules
+        :param master_time: the master clock, when the PLC already read it for this scan
+        """
+        if master_time is None and self.uses_clock:
+            master_time = plc.get_master_clock()
+        values = {}
+        for tag in self.dependant_rules:
+            values[tag] = plc.get_tag(tag)
+
+        fired = self.evaluate(master_time, values, self.last_time)
+        self.last_time = master_time
+
+        for actuator, rule in self.resolve(fired).items():
+            action = self.action_of(rule)
+            if self.written.get(actuator) == action.lower():
+                continue
+            plc.set_tag(actuator, action)
+            self.written[actuator] = action.lower()
+            plc.logger.debug(
+                plc.intermediate_plc["name"] + " applied " + str(rule) + ".")
+
+        for offset, attack in enumerate(self.attacks):
+            flag = fired[len(self.controls) + offset]
+            if self.attack_flags.get(attack.name) != flag:
+                plc.set_attack_flag(flag, attack.name)
+                self.attack_flags[attack.name] = flag
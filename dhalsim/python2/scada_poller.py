@@ -0,0 +1,126 @@
+import threading
+import time
+
+
+class PlcPoller(object):
+    """
+    Polls the tags of one PLC for the SCADA, in its own daemon thread and at its own rate.
+
+    The PLC is asked every :code:`interval` seconds. After a failed request the next one is
+    delayed to :code:`interval * backoff ** failures` seconds, at most :code:`max_backoff`
+    seconds, until the PLC answers again. The last values received are kept together with
+    the time they were received, so an unreachable PLC only makes its own values older.
+
+    :param ip: :code:`ip` or :code:`ip:port` of the PLC
+    :param tags: list of the tags to poll
+    :param fetch: function called as :code:`fetch(tags, ip)`, returning the values of the tags
+    :param interval: seconds between two polls of a PLC that answers
+    :param backoff: factor the delay grows with after every consecutive failure
+    :param max_backoff: maximum delay in seconds after a failure
+    :param data_age: the :class:`~dhalsim.python2.data_age.DataAge` of the SCADA, told about
+                     every answer that is received
+    :param logger: logger told about the first failure of a PLC and when it answers again
+    """
+
+    def __init__(self, ip, tags, fetch, interval, backoff, max_backoff, data_age=None,
+                 logger=None):
+        self.ip = ip
+        self.tags = tags
+        self.fetch = fetch
+        self.interval = interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.data_age = data_age
+        self.logger = logger
+        self.names = [tag[0] if isinstance(tag, tuple) else tag for tag in tags]
+
+        self.lock = threading.Lock()
+        self.values = [0] * len(tags)
+        self.received = None
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+        # Counters
+        self.polls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def delay(self):
+        """
+        :return: seconds to wait before the next poll
+        """
+        if self.consecutive_failures == 0:
+            return self.interval
+        return min(self.interval * self.backoff ** self.consecutive_failures, self.max_backoff)
+
+    def poll(self):
+        """
+        Request the tags once and store the answer.
+
+        :return: seconds to wait before the next poll
+        """
+        self.polls += 1
+        try:
+            values = self.fetch(self.tags, self.ip)
+        except Exception as exc:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = exc
+            # Only the first failure, a PLC that stays down is retried quietly
+            if self.logger is not None and self.consecutive_failures == 1:
+                self.logger.error(
+                    "PLC receive_multiple with tags {tags} from {ip} failed with exception "
+                    "'{e}'".format(tags=self.tags, ip=self.ip, e=str(exc)))
+            return self.delay()
+
+        received = time.time()
+        with self.lock:
+            self.values = values
+            self.received = received
+        if self.data_age is not None:
+            self.data_age.receive(self.names, received)
+        if self.logger is not None and self.consecutive_failures:
+            self.logger.info("PLC {ip} answered again after {n} failed polls".format(
+                ip=self.ip, n=self.consecutive_failures))
+        self.consecutive_failures = 0
+        return self.delay()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.stopped.wait(self.poll())
+
+    def start(self):
+        """
+        Start polling in a daemon thread.
+        """
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop polling. A request that is in progress still finishes.
+        """
+        self.stopped.set()
+
+    def latest(self):
+        """
+        :return: tuple of the last values received, and the time they were received, which
+                 is None when the PLC did not answer yet
+        """
+        with self.lock:
+            return list(self.values), self.received
+
+    def stats(self):
+        """
+        :return: dict with the counters of this poller
+        """
+        with self.lock:
+            received = self.received
+        return {'polls': self.polls,
+                'failures': self.failures,
+                'consecutive_failures': self.consecutive_failures,
+                'last_error': str(self.last_error) if self.last_error else None,
+                'age': time.time() - received if received is not None else None}
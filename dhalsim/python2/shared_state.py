@@ -0,0 +1,201 @@
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+
+MAGIC = b"DHSM"
+"""First bytes of a shared state file"""
+
+HEADER = struct.Struct("<4sI8x")
+"""Magic and amount of slots"""
+
+SLOT = struct.Struct("<Qd")
+"""Sequence number and value of a tag"""
+
+SEQUENCE = struct.Struct("<Q")
+VALUE = struct.Struct("<d")
+
+MASTER_TIME = "master_time"
+"""Slot of the master clock of the physical process, before the slots of the tags"""
+
+MAX_RETRIES = 1000
+"""Amount of times a read is retried while the slot is being written"""
+
+RETRY_SLEEP_TIME = 0.00001
+"""Time in seconds a read waits before it is retried, so the writer can finish"""
+
+
+class SharedStateError(Exception):
+    """
+    Raised when the shared state file does not match the intermediate yaml, or a read keeps
+    colliding with writes.
+    """
+
+
+def plant_tags(data):
+    """
+    The tags of the plant, in the order of their slots. This is the order the plant table is
+    filled in, so the index is the same for every node that reads the intermediate yaml.
+
+    :param data: the dict resulting from a dump of the intermediate yaml
+    :return: list of the names of the tags
+    """
+    tags = OrderedDict()
+    for actuator in data.get("actuators", []):
+        tags[actuator["name"]] = None
+    for plc in data.get("plcs", []):
+        for sensor in plc.get("sensors", []):
+            tags[sensor] = None
+    return list(tags)
+
+
+def open_plant_state(data):
+    """
+    Map the shared state of the plant when the experiment keeps it in shared memory.
+
+    :param data: the dict resulting from a dump of the intermediate yaml
+    :return: the :class:`SharedState`, or None when the plant table is used
+    """
+    if data.get('plant_state', 'sqlite') != 'shared_memory':
+        return None
+    return SharedState(data['plant_state_path'], plant_tags(data))
+
+
+def format_value(value):
+    """
+    Format a value like the plant table stores it, so whole numbers like the state of an
+    actuator can still be read with :code:`int`.
+    """
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class SharedState(object):
+    """
+    The plant table in a memory mapped file, with a fixed slot of a sequence number and a double
+    for every tag. The physical process, the PLCs and the SCADA map the same file, so reading or
+    writing a tag is a memory access instead of a query.
+
+    Every slot is a seqlock. A writer makes the sequence number odd, writes the value, and makes
+    it even again. A reader retries when the sequence number is odd or changed while it read the
+    value, so it never sees half a write without taking a lock. A tag must have only one writer
+    at a time, like every tag of the plant has one owner.
+
+    The slot of a tag is its index in :func:`plant_tags`, after the slot of the master clock.
+
+    :param path: path of the memory mapped file, created by :meth:`create`
+    :param tags: names of the tags, as returned by :func:`plant_tags`
+    :raise SharedStateError: when the file was created for other tags
+    """
+
+    def __init__(self, path, tags):
+        self.path = str(path)
+        self.slots = dict((tag, HEADER.size + SLOT.size * index)
+                          for index, tag in enumerate([MASTER_TIME] + list(tags)))
+
+        with open(self.path, 'r+b') as state_file:
+            self.map = mmap.mmap(state_file.fileno(), 0)
+
+        magic, count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or count != len(self.slots):
+            self.map.close()
+            raise SharedStateError("{path} does not hold the {count} slots of this plant".format(
+                path=self.path, count=len(self.slots)))
+
+        # Counters
+        self.reads = 0
+        self.writes = 0
+        self.retries = 0
+
+    @staticmethod
+    def create(path, tags, values):
+        """
+        Create the file with a slot for the master clock and every tag.
+
+        :param path: path of the memory mapped file, an existing file is overwritten
+        :param tags: names of the tags, as returned by :func:`plant_tags`
+        :param values: dict of tag to its initial value, tags without one start at 0
+        """
+        data = bytearray(HEADER.size + SLOT.size * (len(tags) + 1))
+        HEADER.pack_into(data, 0, MAGIC, len(tags) + 1)
+        for index, tag in enumerate(tags):
+            SLOT.pack_into(data, HEADER.size + SLOT.size * (index + 1), 0,
+                           float(values.get(tag, 0)))
+        with open(str(path), 'wb') as state_file:
+            state_file.write(data)
+        os.chmod(str(path), 0o666)
+
+    def __contains__(self, tag):
+        return tag in self.slots
+
+    def read(self, tag):
+        """
+        Read the value of a tag.
+
+        :param tag: name of the tag
+        :return: the value as a float
+        :raise KeyError: when the plant has no such tag
+        :raise SharedStateError: when the slot is still being written after
+           :code:`MAX_RETRIES` tries
+        """
+        offset = self.slots[tag]
+        for _ in range(MAX_RETRIES):
+            before = SEQUENCE.unpack_from(self.map, offset)[0]
+            if not before & 1:
+                value = VALUE.unpack_from(self.map, offset + SEQUENCE.size)[0]
+                if SEQUENCE.unpack_from(self.map, offset)[0] == before:
+                    self.reads += 1
+                    return value
+            # The writer may be a thread of this process waiting for the interpreter lock
+            self.retries += 1
+            time.sleep(RETRY_SLEEP_TIME)
+        raise SharedStateError("Slot of {tag} is still being written".format(tag=tag))
+
+    def write(self, tag, value):
+        """
+        Write the value of a tag.
+
+        :param tag: name of the tag
+        :param value: the new value, anything :code:`float` accepts
+        :return: False when the plant has no such tag, like an update of a missing row
+        """
+        if tag not in self.slots:
+            return False
+        offset = self.slots[tag]
+        sequence = SEQUENCE.unpack_from(self.map, offset)[0]
+        SEQUENCE.pack_into(self.map, offset, sequence + 1)
+        VALUE.pack_into(self.map, offset + SEQUENCE.size, float(value))
+        SEQUENCE.pack_into(self.map, offset, sequence + 2)
+        self.writes += 1
+        return True
+
+    def get(self, tag):
+        """
+        Read the value of a tag as text, like it is stored in the plant table.
+        """
+        return format_value(self.read(tag))
+
+    def set(self, tag, value):
+        """
+        Write the value of a tag. Same as :meth:`write`.
+        """
+        return self.write(tag, value)
+
+    def master_time(self):
+        """
+        :return: the iteration of the physical process
+        """
+        return int(self.read(MASTER_TIME))
+
+    def close(self):
+        self.map.close()
+
+    def stats(self):
+        """
+        :return: dict with the amount of reads and writes, and the reads retried on a write
+        """
+        return {'reads': self.reads,
+                'writes': self.writes,
+                'retries': self.retries}
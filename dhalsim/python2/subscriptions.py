@@ -0,0 +1,238 @@
+import json
+import socket
+import threading
+import time
+
+try:
+    from enip_client import parse_address
+except ImportError:
+    from dhalsim.python2.enip_client import parse_address
+
+MAX_TAGS_PER_DATAGRAM = 50
+"""Updates with more tags are split, so a datagram stays well below the MTU"""
+
+
+class TagAge(object):
+    """
+    Staleness of a subscribed tag: the age of its value, from the moment the owner scanned it
+    until the subscriber used it.
+    """
+
+    def __init__(self):
+        self.updates = 0
+        self.reads = 0
+        self.last_age = None
+        self.max_age = 0.0
+        self.total_age = 0.0
+
+    def record_read(self, age):
+        self.reads += 1
+        self.last_age = age
+        self.max_age = max(self.max_age, age)
+        self.total_age += age
+
+    def as_dict(self):
+        return {'updates': self.updates,
+                'reads': self.reads,
+                'mean_age': self.total_age / self.reads if self.reads else None,
+                'max_age': self.max_age,
+                'last_age': self.last_age}
+
+
+class TagSubscriptions(object):
+    """
+    Push based exchange of tags between PLCs, over UDP on the same IP and port as the ENIP
+    server of the PLC.
+
+    As a subscriber, a PLC asks the owners of the remote tags its controls depend on to send
+    it those tags, and renews that request every :code:`RENEW_INTERVAL` seconds. As an owner,
+    a PLC sends its subscribers the tags that moved more than the deadband at the end of its
+    scan, and all of them when they have not been sent for :code:`heartbeat` seconds.
+    A subscription that is not renewed expires after :code:`LEASE` seconds.
+
+    This replaces polling every remote tag every :code:`PLC_CACHE_UPDATE_TIME` seconds.
+
+    :param address: :code:`ip` or :code:`ip:port` of this PLC
+    :param remote_groups: dict of owner address to the list of tags to subscribe to
+    :param deadband: change a tag must make before it is sent again
+    :param heartbeat: seconds after which a tag is sent again without a change
+    :param data_age: the :class:`~dhalsim.python2.data_age.DataAge` of the PLC, told about
+                     every update that is received
+    """
+
+    RENEW_INTERVAL = 2.0
+    """Time in seconds between two subscription requests to the same owner"""
+
+    LEASE = 3 * RENEW_INTERVAL
+    """Time in seconds after which a subscription that was not renewed expires"""
+
+    def __init__(self, address, remote_groups, deadband=0.0, heartbeat=5.0, data_age=None):
+        self.address = parse_address(address)
+        self.remote_groups = dict((parse_address(owner), list(tags))
+                                  for owner, tags in remote_groups.items())
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self.data_age = data_age
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(self.address)
+        self.socket.settimeout(self.RENEW_INTERVAL / 2)
+
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.values = {}
+        self.ages = dict((tag, TagAge()) for tags in self.remote_groups.values() for tag in tags)
+
+        self.running = False
+        self.last_renew = 0.0
+        self.thread = None
+
+        # Counters
+        self.datagrams_sent = 0
+        self.tags_sent = 0
+        self.tags_suppressed = 0
+
+    def __contains__(self, tag):
+        return tag in self.ages
+
+    def start(self):
+        """
+        Subscribe to the remote tags and handle datagrams in a daemon thread.
+        """
+        self.running = True
+        self.renew(time.time())
+        self.thread = threading.Thread(target=self.receive_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.socket.close()
+
+    def send(self, message, address):
+        """
+        Send a datagram. Called with the lock held, as both the scan and the receive thread send.
+        """
+        self.socket.sendto(json.dumps(message).encode('ascii'), address)
+        self.datagrams_sent += 1
+
+    def renew(self, now):
+        """
+        Send a subscription request to every owner.
+        """
+        self.last_renew = now
+        with self.lock:
+            for owner, tags in self.remote_groups.items():
+                try:
+                    self.send({'type': 'subscribe', 'tags': tags}, owner)
+                except socket.error:
+                    pass
+
+    def receive_loop(self):
+        while self.running:
+            try:
+                data, sender = self.socket.recvfrom(65535)
+            except socket.timeout:
+                data = None
+            except socket.error:
+                return
+            now = time.time()
+            if data:
+                try:
+                    message = json.loads(data.decode('ascii'))
+                except ValueError:
+                    message = None
+                if isinstance(message, dict) and 'type' in message:
+                    self.handle(message, sender, now)
+            if now - self.last_renew >= self.RENEW_INTERVAL:
+                self.renew(now)
+
+    def handle(self, message, sender, now):
+        """
+        Handle a subscription request or an update.
+
+        :param message: the decoded datagram
+        :param sender: address of the sender
+        :param now: time the datagram was received
+        """
+        with self.lock:
+            if message['type'] == 'subscribe':
+                subscription = self.subscribers.setdefault(sender, {'sent': {}})
+                subscription['tags'] = set(message['tags'])
+                subscription['expires'] = now + self.LEASE
+            elif message['type'] == 'update':
+                for tag, value in message['values'].items():
+                    if tag in self.ages:
+                        self.values[tag] = (value, message['scanned'])
+                        self.ages[tag].updates += 1
+                if self.data_age is not None:
+                    self.data_age.receive([tag for tag in message['values'] if tag in self.ages],
+                                          now)
+
+    def get(self, tag):
+        """
+        Get the last value received for a remote tag, and record its age.
+
+        :param tag: the tag
+        :raise KeyError: when no value was received yet
+        """
+        with self.lock:
+            value, scanned = self.values[tag]
+            self.ages[tag].record_read(time.time() - scanned)
+        return value
+
+    def publish(self, values, now=None):
+        """
+        Send the changed tags to every subscriber. Called by the owner at the end of a scan.
+
+        :param values: dict of tag to its value, for the tags of this PLC
+        :param now: time of the scan
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            for subscriber in list(self.subscribers):
+                subscription = self.subscribers[subscriber]
+                if subscription['expires'] < now:
+                    del self.subscribers[subscriber]
+                    continue
+                changed = self.select(subscription, values, now)
+                for start in range(0, len(changed), MAX_TAGS_PER_DATAGRAM):
+                    chunk = dict(changed[start:start + MAX_TAGS_PER_DATAGRAM])
+                    try:
+                        self.send({'type': 'update', 'scanned': now, 'values': chunk},
+                                  subscriber)
+                    except socket.error:
+                        break
+
+    def select(self, subscription, values, now):
+        """
+        :return: list of the :code:`(tag, value)` a subscriber has to be sent
+        """
+        changed = []
+        sent = subscription['sent']
+        for tag in subscription['tags']:
+            if tag not in values:
+                continue
+            value = float(values[tag])
+            if tag in sent:
+                last_value, last_time = sent[tag]
+                if abs(value - last_value) <= self.deadband and \
+                        now - last_time < self.heartbeat:
+                    self.tags_suppressed += 1
+                    continue
+            sent[tag] = (value, now)
+            changed.append((tag, value))
+        self.tags_sent += len(changed)
+        return changed
+
+    def stats(self):
+        """
+        :return: dict with the traffic counters and the age of every subscribed tag
+        """
+        with self.lock:
+            return {'subscribers': len(self.subscribers),
+                    'datagrams_sent': self.datagrams_sent,
+                    'tags_sent': self.tags_sent,
+                    'tags_suppressed': self.tags_suppressed,
+                    'ages': dict((tag, age.as_dict()) for tag, age in self.ages.items())}
@@ -0,0 +1,312 @@
+import argparse
+import atexit
+import bisect
+import errno
+import json
+import math
+import os
+import struct
+import time
+
+RECORD = struct.Struct("<qdd")
+"""Iteration, time the node was released and time it was done"""
+
+FLUSH_RECORDS = 256
+"""Amount of records kept in memory before they are appended to the trace file"""
+
+SUFFIX = ".trace"
+
+PHYSICAL_PROCESS = "physical_process"
+"""Name of the trace of the physical process, which holds the iterations the nodes are aligned to"""
+
+PERCENTILES = (50, 90, 99)
+
+HISTOGRAM_BOUNDS = tuple(0.01 * 2 ** exponent for exponent in range(21))
+"""Upper bounds in milliseconds of the buckets of a :class:`Histogram`, from 10 us to 10 s"""
+
+
+def open_sync_trace(data, name):
+    """
+    Open the trace of a node when the experiment traces the sync.
+
+    :param data: the dict resulting from a dump of the intermediate yaml
+    :param name: name of the node, as in the :code:`sync` table
+    :return: the :class:`SyncTrace`, or None when the sync is not traced
+    """
+    if not data.get('sync_trace', False):
+        return None
+    return SyncTrace(os.path.join(str(data['output_path']), 'sync_trace', name + SUFFIX))
+
+
+class SyncTrace(object):
+    """
+    Records when a node was released for an iteration and when it was done with it. A record is
+    three numbers packed in a fixed size, and records are appended to the file in batches, so
+    tracing costs two clock reads per iteration. The records left are written when the
+    process exits.
+
+    The iteration is the master clock when the node knows it, like with the socket barrier, and
+    -1 otherwise. The report matches the records of the nodes to the iterations of the physical
+    process by the time they were released, so the sync table and the socket barrier are traced
+    the same way.
+
+    :param path: path of the trace file, an existing file is overwritten
+    :param flush_records: amount of records kept in memory before they are written
+    """
+
+    def __init__(self, path, flush_records=FLUSH_RECORDS):
+        self.path = str(path)
+        self.flush_records = flush_records
+        try:
+            os.makedirs(os.path.dirname(self.path))
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+        self.file = open(self.path, 'wb')
+        self.buffer = bytearray()
+        self.iteration = -1
+        self.released_at = None
+        self.records = 0
+
+        # A node that stops on an unexpected exception still writes the records it has
+        atexit.register(self.close)
+
+    @property
+    def pending(self):
+        """
+        True when the node was released and is not done yet.
+        """
+        return self.released_at is not None
+
+    def released(self, iteration=-1):
+        """
+        Record that the node was released.
+
+        :param iteration: the master clock, -1 when it is not known
+        """
+        self.iteration = iteration
+        self.released_at = time.time()
+
+    def done(self):
+        """
+        Record that the node is done with the iteration it was released for. Nothing is recorded
+        when the node was not released.
+        """
+        if self.released_at is None:
+            return
+        self.buffer += RECORD.pack(self.iteration, self.released_at, time.time())
+        self.released_at = None
+        self.records += 1
+        if self.records % self.flush_records == 0:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.buffer = bytearray()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+def read_trace(path):
+    """
+    Read the records of a trace file. A record cut off when the node was killed is left out.
+
+    :param path: path of the trace file
+    :return: list of (iteration, released, done) tuples
+    """
+    with open(str(path), 'rb') as trace_file:
+        data = trace_file.read()
+    end = len(data) - len(data) % RECORD.size
+    return [RECORD.unpack_from(data, offset) for offset in range(0, end, RECORD.size)]
+
+
+def read_traces(directory):
+    """
+    :param directory: directory with the trace files of a run
+    :return: dict of the name of every node to its records
+    """
+    return dict((name[:-len(SUFFIX)], read_trace(os.path.join(str(directory), name)))
+                for name in sorted(os.listdir(str(directory))) if name.endswith(SUFFIX))
+
+
+def percentile(values, percent):
+    """
+    Nearest rank percentile.
+
+    :param values: sorted list of numbers
+    :param percent: percentile between 0 and 100
+    """
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def summarize(values):
+    """
+    :param values: durations in seconds
+    :return: dict with the mean, percentiles and maximum in milliseconds
+    """
+    values = sorted(value * 1000 for value in values)
+    summary = {'count': len(values),
+               'mean': sum(values) / len(values) if values else None}
+    for percent in PERCENTILES:
+        summary['p{percent}'.format(percent=percent)] = percentile(values, percent)
+    summary['max'] = values[-1] if values else None
+    return summary
+
+
+class Histogram(object):
+    """
+    Durations counted in fixed buckets that double in size, so a process can summarize what it
+    measured for the whole run in constant memory. A percentile is the upper bound of the bucket
+    it falls in, and never more than the maximum.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def record(self, duration):
+        """
+        :param duration: duration in seconds
+        """
+        value = duration * 1000
+        self.counts[bisect.bisect_left(HISTOGRAM_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percent):
+        """
+        Nearest rank percentile, like :func:`percentile`.
+
+        :param percent: percentile between 0 and 100
+        :return: the percentile in milliseconds, or None without durations
+        """
+        if not self.count:
+            return None
+        rank = min(max(int(math.ceil(percent / 100.0 * self.count)), 1), self.count)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if index == len(HISTOGRAM_BOUNDS):
+            return self.max
+        return min(HISTOGRAM_BOUNDS[index], self.max)
+
+    def summary(self):
+        """
+        :return: dict with the same keys as :func:`summarize`
+        """
+        summary = {'count': self.count,
+                   'mean': self.total / self.count if self.count else None}
+        for percent in PERCENTILES:
+            summary['p{percent}'.format(percent=percent)] = self.percentile(percent)
+        summary['max'] = self.max
+        return summary
+
+
+def report(traces):
+    """
+    Compute the latencies of every node and rank the stragglers.
+
+    Every record of a node belongs to the last iteration the physical process released before
+    the node saw it was released. For every node this gives:
+
+    * *wake*: from the release by the physical process until the node saw it, which is the
+      polling delay of the sync table or the latency of the barrier
+    * *work*: from the node seeing the release until it was done
+    * *lag*: from the release by the physical process until the node was done
+
+    The node that was done last in an iteration held back the physical process, the ranking
+    counts how often every node was last and by how much it was later than the node before it.
+
+    :param traces: dict of node name to records, as returned by :func:`read_traces`
+    :return: dict with the summary of the iterations, every node and the ranking
+    """
+    plant = sorted(traces.get(PHYSICAL_PROCESS, []), key=lambda record: record[1])
+    releases = [record[1] for record in plant]
+
+    durations = {}
+    done_times = [dict() for _ in plant]
+    for name, records in traces.items():
+        if name == PHYSICAL_PROCESS:
+            continue
+        wake, work, lag = [], [], []
+        for _, released, done in records:
+            work.append(done - released)
+            if not plant:
+                continue
+            index = max(bisect.bisect_right(releases, released) - 1, 0)
+            wake.append(max(released - releases[index], 0))
+            lag.append(done - releases[index])
+            done_times[index][name] = max(done, done_times[index].get(name, done))
+        durations[name] = {'wake': summarize(wake), 'work': summarize(work),
+                           'lag': summarize(lag)}
+
+    ranking = dict((name, {'last': 0, 'margin': 0.0}) for name in durations)
+    for dones in done_times:
+        if not dones:
+            continue
+        order = sorted(dones, key=dones.get)
+        last = order[-1]
+        ranking[last]['last'] += 1
+        if len(order) > 1:
+            ranking[last]['margin'] += (dones[last] - dones[order[-2]]) * 1000
+    ranked = sorted(ranking.items(), key=lambda item: (-item[1]['last'], -item[1]['margin']))
+
+    return {'iterations': summarize([done - released for _, released, done in plant]),
+            'nodes': durations,
+            'stragglers': [dict(name=name, **counts) for name, counts in ranked]}
+
+
+def format_report(result):
+    """
+    :param result: dict as returned by :func:`report`
+    :return: the report as a table in text
+    """
+    columns = ['count', 'mean'] + ['p{percent}'.format(percent=percent)
+                                    for percent in PERCENTILES] + ['max']
+
+    def row(label, summary):
+        cells = [str(summary['count'])] + ['-' if summary[column] is None
+                                           else "{0:.2f}".format(summary[column])
+                                           for column in columns[1:]]
+        return "{0:<24}".format(label) + "".join("{0:>10}".format(cell) for cell in cells)
+
+    header = "{0:<24}".format("latency (ms)") + "".join("{0:>10}".format(column)
+                                                       for column in columns)
+    lines = [header, row("iteration", result['iterations'])]
+    for name in sorted(result['nodes']):
+        for kind in ('wake', 'work', 'lag'):
+            lines.append(row("{name} {kind}".format(name=name, kind=kind),
+                             result['nodes'][name][kind]))
+    lines.append("")
+    lines.append("{0:<24}{1:>10}{2:>12}".format("straggler", "last", "margin (ms)"))
+    for straggler in result['stragglers']:
+        lines.append("{0:<24}{1:>10}{2:>12.2f}".format(
+            straggler['name'], straggler['last'], straggler['margin']))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report the latencies of the nodes and the '
+                                                 'stragglers of a run from its sync traces')
+    parser.add_argument(dest="directory", help="sync_trace directory in the output path")
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    args = parser.parse_args()
+
+    run_report = report(read_traces(args.directory))
+    if args.json:
+        print(json.dumps(run_report, indent=2, sort_keys=True))
+    else:
+        print(format_report(run_report))
@@ -0,0 +1,72 @@
+from collections import namedtuple, OrderedDict
+
+TagOwner = namedtuple('TagOwner', ['plc_name', 'ip', 'local'])
+"""
+Owner of a tag.
+
+:param plc_name: name of the PLC that has the tag as a sensor or actuator
+:param ip: address to request the tag from, the local IP when the owner is the local PLC
+           and the public IP otherwise
+:param local: True when the owner is the local PLC
+"""
+
+
+class TagIndex(object):
+    """
+    Index of the PLC that owns every sensor and actuator tag, built once from the plcs section
+    of the intermediate yaml. It replaces scanning all the PLCs on every tag lookup.
+
+    This module is used by the python2 nodes and by the python3 network attacks, so it
+    must stay compatible with both.
+
+    :param plcs: the plcs section of the intermediate yaml
+    :param local_plc: name of the PLC that is considered local. Its tags are reached through
+                      its local IP, and it owns a tag even when another PLC also lists it
+    """
+
+    def __init__(self, plcs, local_plc=None):
+        self.owners = {}
+
+        for plc in plcs:
+            local = plc['name'] == local_plc
+            ip = plc.get('local_ip') if local else plc.get('public_ip')
+            owner = TagOwner(plc['name'], ip, local)
+            for tag in plc.get('sensors', []) + plc.get('actuators', []):
+                if tag == "":
+                    continue
+                if local or tag not in self.owners:
+                    self.owners[tag] = owner
+
+    def owner(self, tag):
+        """
+        Get the owner of a tag.
+
+        :param tag: the tag to look up
+        :return: the :class:`TagOwner` of the tag, or None if no PLC has the tag
+        """
+        return self.owners.get(tag)
+
+    def is_local(self, tag):
+        """
+        :param tag: the tag to look up
+        :return: True when the tag is a sensor or actuator of the local PLC
+        """
+        owner = self.owners.get(tag)
+        return owner is not None and owner.local
+
+    def group_by_owner(self, tags):
+        """
+        Group tags by the IP of the PLC that owns them. Tags without an owner are left out.
+
+        :param tags: the tags to group
+        :return: ordered dict of IP to the list of tags owned by the PLC at that IP
+        """
+        groups = OrderedDict()
+        for tag in tags:
+            owner = self.owners.get(tag)
+            if owner is not None:
+                groups.setdefault(owner.ip, []).append(tag)
+        return groups
+
+    def __contains__(self, tag):
+        return tag in self.owners
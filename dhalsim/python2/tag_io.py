@@ -0,0 +1,167 @@
+import sqlite3
+import time
+
+try:
+    from database import CONTENTION, shared_connection
+except ImportError:
+    from dhalsim.python2.database import CONTENTION, shared_connection
+
+
+class DatabaseError(Exception):
+    """Raised when not being able to connect to the database"""
+
+
+class TagIO(object):
+    """
+    Reads and writes the tags of one PLC in the plant table of the database.
+
+    All the tags are read with one query by :meth:`refresh` into a shadow copy, and
+    :meth:`get` answers from that copy until the next refresh. :meth:`set` only writes a tag
+    when the new value differs from the shadow copy. This replaces a separate connection and
+    query for every tag that is read or written.
+
+    The queries go through the connection of the thread that first uses the instance, and an
+    instance must only be used from that thread. The PLC main loop and the publishing thread
+    each have their own instance.
+
+    With a :class:`~dhalsim.python2.shared_state.SharedState`, the tags and the master clock
+    are read from and written to the shared memory instead of the database.
+
+    :param db_path: path of the database
+    :param tags: names of the tags of the PLC
+    :param db_tries: amount of times a query is tried on a :code:`sqlite3.OperationalError`
+    :param shared_state: the :class:`~dhalsim.python2.shared_state.SharedState` of the plant,
+                         None to use the plant table
+    """
+
+    def __init__(self, db_path, tags, db_tries=10, shared_state=None):
+        self.db_path = db_path
+        self.tags = [tag for tag in tags if tag != ""]
+        self.db_tries = db_tries
+        self.shared_state = shared_state
+
+        self.conn = None
+        self.shadow = {}
+
+        self.read_query = "SELECT name, value FROM plant WHERE pid IS 1 AND name IN ({tags})"\
+            .format(tags=", ".join("?" * len(self.tags)))
+
+        # Counters
+        self.queries = 0
+        self.reads_saved = 0
+        self.writes = 0
+        self.writes_saved = 0
+
+    def execute(self, query, parameters=()):
+        """
+        Execute a query, retrying on a :code:`sqlite3.OperationalError` after a jittered
+        exponential backoff.
+
+        :return: the rows returned by the query
+        :raise DatabaseError: when the query still fails after :code:`db_tries` tries
+        """
+        if self.conn is None:
+            self.conn = shared_connection(self.db_path)
+
+        for attempt in range(self.db_tries):
+            try:
+                cur = self.conn.execute(query, parameters)
+                return cur.fetchall()
+            except sqlite3.OperationalError:
+                time.sleep(CONTENTION.backoff(attempt))
+        CONTENTION.failed()
+        raise DatabaseError("Failed to execute '{query}' after {tries} tries".format(
+            query=query, tries=self.db_tries))
+
+    def commit(self):
+        """
+        Commit the connection, retrying on a :code:`sqlite3.OperationalError` like
+        :meth:`execute`.
+
+        :raise DatabaseError: when the commit still fails after :code:`db_tries` tries
+        """
+        for attempt in range(self.db_tries):
+            try:
+                self.conn.commit()
+                return
+            except sqlite3.OperationalError:
+                time.sleep(CONTENTION.backoff(attempt))
+        CONTENTION.failed()
+        raise DatabaseError("Failed to commit after {tries} tries".format(tries=self.db_tries))
+
+    def refresh(self):
+        """
+        Read all the tags with one query into the shadow copy.
+
+        :return: dict of tag to its value
+        """
+        if self.shared_state is not None:
+            for tag in self.tags:
+                if tag in self.shared_state:
+                    self.shadow[tag] = self.shared_state.get(tag)
+        else:
+            for name, value in self.execute(self.read_query, tuple(self.tags)):
+                self.shadow[name] = value
+        self.queries += 1
+        # One query instead of one per tag
+        self.reads_saved += len(self.tags) - 1
+        return self.shadow
+
+    def master_time(self):
+        """
+        Read the master clock of the physical process.
+
+        :return: iteration in the physical process
+        """
+        if self.shared_state is not None:
+            return self.shared_state.master_time()
+        return self.execute("SELECT time FROM master_time WHERE id IS 1")[0][0]
+
+    def get(self, tag):
+        """
+        Get the value of a tag as read by the last :meth:`refresh`.
+
+        :param tag: name of the tag
+        :raise KeyError: when the tag has not been read
+        """
+        return self.shadow[tag]
+
+    def set(self, tag, value):
+        """
+        Write a tag, unless it already has the value.
+
+        :param tag: name of the tag
+        :param value: the new value
+        :return: True when the tag was written
+        """
+        if tag in self.shadow and self.same_value(self.shadow[tag], value):
+            self.writes_saved += 1
+            return False
+
+        if self.shared_state is not None:
+            self.shared_state.set(tag, value)
+        else:
+            self.execute("UPDATE plant SET value = ? WHERE name IS ? AND pid IS 1", (value, tag))
+            self.commit()
+        self.shadow[tag] = value
+        self.writes += 1
+        return True
+
+    @staticmethod
+    def same_value(old, new):
+        """
+        Compare two tag values. The plant table stores text, so numbers are compared by value.
+        """
+        try:
+            return float(old) == float(new)
+        except (TypeError, ValueError):
+            return str(old) == str(new)
+
+    def stats(self):
+        """
+        :return: dict with the amount of queries, writes, and the reads and writes saved
+        """
+        return {'queries': self.queries,
+                'reads_saved': self.reads_saved,
+                'writes': self.writes,
+                'writes_saved': self.writes_saved}
@@ -0,0 +1,493 @@
+import binascii
+import json
+import os
+import socket
+import struct
+import threading
+from collections import OrderedDict, deque
+
+BLOCK_SIZE = 256
+"""Amount of points of a tag compressed together in a block"""
+
+# Buckets of the delta of delta encoding of the times: prefix, length of the prefix, value bits
+TIME_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+class QueryError(Exception):
+    """Raised when a query to the time series store fails"""
+
+
+def float_bits(value):
+    return struct.unpack('>Q', struct.pack('>d', value))[0]
+
+
+def bits_float(bits):
+    return struct.unpack('>d', struct.pack('>Q', bits))[0]
+
+
+class BitWriter(object):
+    """
+    Collects values of a given amount of bits, most significant bit first.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def write(self, value, bits):
+        self.value = (self.value << bits) | value
+        self.length += bits
+
+    def getvalue(self):
+        padding = -self.length % 8
+        size = (self.length + padding) // 8
+        if size == 0:
+            return b''
+        return binascii.unhexlify('%0*x' % (2 * size, self.value << padding))
+
+
+class BitReader(object):
+    """
+    Reads the values written by a :class:`BitWriter`.
+    """
+
+    def __init__(self, data):
+        self.value = int(binascii.hexlify(data), 16) if data else 0
+        self.length = len(data) * 8
+        self.position = 0
+
+    def read(self, bits):
+        self.position += bits
+        return (self.value >> (self.length - self.position)) & ((1 << bits) - 1)
+
+
+def encode_block(times, values):
+    """
+    Compress the points of a block. The times are stored as the delta of their deltas, which
+    is a single bit for a tag read on every iteration. The values are stored as the XOR with
+    the previous value, of which only the bits that changed are kept.
+
+    :param times: list of the increasing integer times of the points
+    :param values: list of the float values of the points
+    :return: the compressed points
+    """
+    writer = BitWriter()
+    writer.write(times[0], 64)
+    writer.write(float_bits(values[0]), 64)
+
+    previous_time, previous_delta = times[0], 0
+    previous_bits, window = float_bits(values[0]), None
+    for time, value in zip(times[1:], values[1:]):
+        delta = time - previous_time
+        delta_of_delta = delta - previous_delta
+        previous_time, previous_delta = time, delta
+        if delta_of_delta == 0:
+            writer.write(0, 1)
+        else:
+            for prefix, prefix_bits, bits in TIME_BUCKETS:
+                offset = (1 << (bits - 1)) - 1
+                if -offset <= delta_of_delta <= offset + 1:
+                    writer.write(prefix, prefix_bits)
+                    writer.write(delta_of_delta + offset, bits)
+                    break
+            else:
+                writer.write(0b1111, 4)
+                writer.write(delta_of_delta + (1 << 63), 64)
+
+        bits = float_bits(value)
+        xor = bits ^ previous_bits
+        previous_bits = bits
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if window is not None and leading >= window[0] and trailing >= window[1]:
+            writer.write(0b10, 2)
+            writer.write(xor >> window[1], 64 - window[0] - window[1])
+        else:
+            window = (leading, trailing)
+            meaningful = 64 - leading - trailing
+            writer.write(0b11, 2)
+            writer.write(leading, 5)
+            writer.write(meaningful - 1, 6)
+            writer.write(xor >> trailing, meaningful)
+    return writer.getvalue()
+
+
+def decode_block(data, count):
+    """
+    Decompress the points of a block.
+
+    :param data: the compressed points
+    :param count: amount of points in the block
+    :return: list of :code:`(time, value)` tuples
+    """
+    reader = BitReader(data)
+    time = reader.read(64)
+    bits = reader.read(64)
+    points = [(time, bits_float(bits))]
+
+    delta, window = 0, None
+    for _ in range(count - 1):
+        if reader.read(1) == 0:
+            delta_of_delta = 0
+        else:
+            # Every bucket adds a bit to the prefix, a 0 ends it
+            for _, _, value_bits in TIME_BUCKETS:
+                if reader.read(1) == 0:
+                    offset = (1 << (value_bits - 1)) - 1
+                    delta_of_delta = reader.read(value_bits) - offset
+                    break
+            else:
+                delta_of_delta = reader.read(64) - (1 << 63)
+        delta += delta_of_delta
+        time += delta
+
+        if reader.read(1) == 1:
+            if reader.read(1) == 1:
+                leading = reader.read(5)
+                meaningful = reader.read(6) + 1
+                window = (leading, 64 - leading - meaningful)
+            bits ^= reader.read(64 - window[0] - window[1]) << window[1]
+        points.append((time, bits_float(bits)))
+    return points
+
+
+class Block(object):
+    """
+    Compressed points of a tag, with a summary so aggregates over the whole block do not need
+    to decompress it.
+    """
+
+    def __init__(self, times, values):
+        self.count = len(times)
+        self.first_time = times[0]
+        self.last_time = times[-1]
+        self.first_value = values[0]
+        self.last_value = values[-1]
+        self.minimum = min(values)
+        self.maximum = max(values)
+        self.total = sum(values)
+        self.data = encode_block(times, values)
+
+    def points(self):
+        return decode_block(self.data, self.count)
+
+
+class Aggregate(object):
+    """
+    Count, mean, extremes and rate of change of the points in a window.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.first = None
+        self.last = None
+
+    def add(self, time, value):
+        if self.count == 0:
+            self.first = (time, value)
+            self.minimum = self.maximum = value
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.last = (time, value)
+
+    def add_block(self, block):
+        if self.count == 0:
+            self.first = (block.first_time, block.first_value)
+            self.minimum, self.maximum = block.minimum, block.maximum
+        self.count += block.count
+        self.total += block.total
+        self.minimum = min(self.minimum, block.minimum)
+        self.maximum = max(self.maximum, block.maximum)
+        self.last = (block.last_time, block.last_value)
+
+    def as_dict(self):
+        if self.count == 0:
+            return {'count': 0}
+        (first_time, first_value), (last_time, last_value) = self.first, self.last
+        rate = (last_value - first_value) / (last_time - first_time) \
+            if last_time != first_time else None
+        return {'count': self.count,
+                'mean': self.total / self.count,
+                'min': self.minimum,
+                'max': self.maximum,
+                'first': [first_time, first_value],
+                'last': [last_time, last_value],
+                'rate': rate}
+
+
+def in_window(time, start, end):
+    return (start is None or time >= start) and (end is None or time < end)
+
+
+class TagSeries(object):
+    """
+    The points of one tag: compressed blocks and the block that is being filled. The oldest
+    block is dropped when there are more than :code:`max_blocks` blocks.
+
+    :param max_blocks: maximum amount of compressed blocks
+    """
+
+    def __init__(self, max_blocks):
+        self.max_blocks = max_blocks
+        self.blocks = deque()
+        self.times = []
+        self.values = []
+        self.dropped = 0
+
+    def append(self, time, value):
+        self.times.append(time)
+        self.values.append(value)
+        if len(self.times) == BLOCK_SIZE:
+            self.blocks.append(Block(self.times, self.values))
+            self.times, self.values = [], []
+            while len(self.blocks) > self.max_blocks:
+                self.dropped += self.blocks.popleft().count
+
+    def blocks_in(self, start, end):
+        """
+        :return: the compressed blocks with points in the window, and whether all their
+                 points are in the window
+        """
+        for block in self.blocks:
+            if (end is not None and block.first_time >= end) or \
+                    (start is not None and block.last_time < start):
+                continue
+            yield block, in_window(block.first_time, start, end) and \
+                in_window(block.last_time, start, end)
+
+    def points(self, start=None, end=None):
+        """
+        :return: list of the :code:`(time, value)` tuples in the window
+        """
+        points = []
+        for block, _ in self.blocks_in(start, end):
+            points.extend(point for point in block.points() if in_window(point[0], start, end))
+        points.extend(point for point in zip(self.times, self.values)
+                      if in_window(point[0], start, end))
+        return points
+
+    def aggregate(self, start=None, end=None):
+        """
+        :return: the :class:`Aggregate` of the points in the window
+        """
+        aggregate = Aggregate()
+        for block, inside in self.blocks_in(start, end):
+            if inside:
+                aggregate.add_block(block)
+            else:
+                for time, value in block.points():
+                    if in_window(time, start, end):
+                        aggregate.add(time, value)
+        for time, value in zip(self.times, self.values):
+            if in_window(time, start, end):
+                aggregate.add(time, value)
+        return aggregate
+
+    def downsample(self, bucket, start=None, end=None):
+        """
+        :param bucket: width of the buckets, in the unit of the times
+        :return: list of the aggregates of the buckets with points in the window, each with
+                 the start of its bucket
+        """
+        buckets = OrderedDict()
+        for block, inside in self.blocks_in(start, end):
+            if inside and block.first_time // bucket == block.last_time // bucket:
+                buckets.setdefault(block.first_time // bucket, Aggregate()).add_block(block)
+                continue
+            for time, value in block.points():
+                if in_window(time, start, end):
+                    buckets.setdefault(time // bucket, Aggregate()).add(time, value)
+        for time, value in zip(self.times, self.values):
+            if in_window(time, start, end):
+                buckets.setdefault(time // bucket, Aggregate()).add(time, value)
+
+        result = []
+        for index, aggregate in buckets.items():
+            row = aggregate.as_dict()
+            row['start'] = index * bucket
+            result.append(row)
+        return result
+
+    def stats(self):
+        return {'points': sum(block.count for block in self.blocks) + len(self.times),
+                'bytes': sum(len(block.data) for block in self.blocks) + 16 * len(self.times),
+                'dropped': self.dropped}
+
+
+class TimeSeriesStore(object):
+    """
+    In memory store of the values the SCADA reads, one compressed column per tag, that can be
+    queried while the simulation runs. The times are the iterations of the simulation.
+
+    A tag keeps its last :code:`max_points` points, rounded up to whole blocks, so the memory
+    stays bounded however long the simulation runs.
+
+    :param tags: list of the names of the tags, in the order of the values that are appended
+    :param max_points: amount of points kept per tag
+    """
+
+    QUERIES = ('tags', 'stats', 'points', 'aggregate', 'downsample')
+
+    def __init__(self, tags, max_points=100000):
+        max_blocks = max(1, -(-max_points // BLOCK_SIZE))
+        self.tags = list(tags)
+        self.series = OrderedDict((tag, TagSeries(max_blocks)) for tag in self.tags)
+        self.lock = threading.Lock()
+
+    def append(self, time, values):
+        """
+        Add the values of an iteration. Values that are not numbers are skipped.
+
+        :param time: the iteration
+        :param values: list of the values, in the order of the tags
+        """
+        with self.lock:
+            for tag, value in zip(self.tags, values):
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+                self.series[tag].append(time, value)
+
+    def stats(self):
+        """
+        :return: dict of tag to its amount of points, compressed bytes and dropped points
+        """
+        with self.lock:
+            return dict((tag, series.stats()) for tag, series in self.series.items())
+
+    def query(self, request):
+        """
+        Answer a query, like :code:`{"query": "aggregate", "tag": "T0", "start": 0, "end": 100}`.
+        The window from :code:`start` up to, but not including, :code:`end` is optional.
+
+        * :code:`tags`: the names of the tags
+        * :code:`stats`: the result of :meth:`stats`
+        * :code:`points`: the :code:`[time, value]` points in the window
+        * :code:`aggregate`: count, mean, min, max, first, last and rate of change per
+          iteration in the window
+        * :code:`downsample`: the aggregate of every :code:`bucket` iterations in the window
+
+        :param request: dict with the query
+        :return: the result of the query
+        :raise QueryError: when the query is not valid
+        """
+        kind = request.get('query')
+        if kind not in self.QUERIES:
+            raise QueryError("Unknown query: {kind}".format(kind=kind))
+        if kind == 'tags':
+            return list(self.tags)
+        if kind == 'stats':
+            return self.stats()
+
+        tag = request.get('tag')
+        if tag not in self.series:
+            raise QueryError("Unknown tag: {tag}".format(tag=tag))
+        start, end = request.get('start'), request.get('end')
+        with self.lock:
+            series = self.series[tag]
+            if kind == 'points':
+                return [list(point) for point in series.points(start, end)]
+            if kind == 'aggregate':
+                return series.aggregate(start, end).as_dict()
+            bucket = request.get('bucket')
+            if not isinstance(bucket, int) or bucket <= 0:
+                raise QueryError("'bucket' must be a positive integer")
+            return series.downsample(bucket, start, end)
+
+
+class QueryServer(object):
+    """
+    Answers json queries to a :class:`TimeSeriesStore` on a Unix domain socket, one query per
+    line. The answer is a line with :code:`{"result": ...}`, or :code:`{"error": ...}`.
+
+    :param store: the :class:`TimeSeriesStore`
+    :param path: path of the socket
+    """
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.socket = None
+        self.running = False
+
+    def start(self):
+        """
+        Listen on the socket and answer queries in daemon threads.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(self.path)
+        self.socket.listen(5)
+        self.running = True
+        thread = threading.Thread(target=self.accept_loop)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.socket is not None:
+            self.socket.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                connection, _ = self.socket.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self.serve, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, connection):
+        stream = connection.makefile('rwb')
+        try:
+            for line in iter(stream.readline, b''):
+                try:
+                    reply = {'result': self.store.query(json.loads(line.decode('utf-8')))}
+                except (QueryError, ValueError, AttributeError) as error:
+                    reply = {'error': str(error)}
+                stream.write(json.dumps(reply).encode('utf-8') + b'\n')
+                stream.flush()
+        except socket.error:
+            pass
+        finally:
+            stream.close()
+            connection.close()
+
+
+def query(path, request, timeout=5.0):
+    """
+    Send a query to a :class:`QueryServer`. This works from python2 and python3.
+
+    :param path: path of the socket of the server
+    :param request: dict with the query
+    :param timeout: socket timeout in seconds
+    :return: the result of the query
+    :raise QueryError: when the server answers with an error
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(path)
+        stream = connection.makefile('rwb')
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        reply = json.loads(stream.readline().decode('utf-8'))
+        stream.close()
+    finally:
+        connection.close()
+    if 'error' in reply:
+        raise QueryError(reply['error'])
+    return reply['result']
@@ -0,0 +1,209 @@
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import random
+import signal
+import sys
+import time
+import traceback
+from pathlib import Path
+
+# The heavy modules are imported once here, the workers are forked with them loaded
+import numpy as np
+import yaml
+
+from generic_plc import GenericPLC
+from generic_scada import GenericScada
+from py2_logger import get_logger
+
+CLONE_NEWNET = 0x40000000
+"""Flag of :code:`setns` for a network namespace"""
+
+REPORT_HEADER = "node,launched,first_sync,seconds\n"
+
+
+def enter_network_namespace(pid):
+    """
+    Move this process into the network namespace of another process, like a Mininet host.
+
+    :param pid: pid of a process in the network namespace, like the shell of the host
+    :raise OSError: when :code:`setns` fails
+    """
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    fd = os.open('/proc/{pid}/ns/net'.format(pid=pid), os.O_RDONLY)
+    try:
+        if libc.setns(fd, CLONE_NEWNET) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+    finally:
+        os.close(fd)
+
+
+class FirstSyncReport(object):
+    """
+    Mixin for a node that appends the time between the launch request and the first time the
+    node gets the sync, so it can do iteration 0, to a report.
+
+    :param report_path: path of the report
+    :param launched: time of the launch request
+    """
+
+    def __init__(self, report_path, launched, *args, **kwargs):
+        self.report_path = report_path
+        self.launched = launched
+        super(FirstSyncReport, self).__init__(*args, **kwargs)
+
+    def node_name(self):
+        return self.intermediate_plc['name'] if hasattr(self, 'intermediate_plc') else 'scada'
+
+    def get_sync(self):
+        flag = super(FirstSyncReport, self).get_sync()
+        if not flag and self.launched is not None:
+            first_sync = time.time()
+            # One short append per node, so the lines of the nodes do not interleave
+            with open(str(self.report_path), 'a') as report:
+                report.write("{node},{launched:.6f},{first_sync:.6f},{seconds:.6f}\n".format(
+                    node=self.node_name(), launched=self.launched, first_sync=first_sync,
+                    seconds=first_sync - self.launched))
+            self.logger.info("{node} got its first sync {seconds:.3f}s after launch".format(
+                node=self.node_name(), seconds=first_sync - self.launched))
+            self.launched = None
+        return flag
+
+
+class ZygotePLC(FirstSyncReport, GenericPLC):
+    """A :class:`~dhalsim.python2.generic_plc.GenericPLC` forked by the :class:`Zygote`"""
+
+
+class ZygoteScada(FirstSyncReport, GenericScada):
+    """A :class:`~dhalsim.python2.generic_scada.GenericScada` forked by the :class:`Zygote`"""
+
+
+class Zygote(object):
+    """
+    Process that has the PLC and SCADA modules imported and the intermediate yaml loaded, and
+    forks a ready node into the network namespace of a Mininet host on request. This replaces
+    a cold python2 start per node, each loading minicps, numpy and the whole yaml.
+
+    Requests are json lines on stdin, like
+    :code:`{"kind": "plc", "index": 0, "netns": 1234, "launched": 1600000000.0}`, where
+    :code:`netns` is the pid of the host shell. The pid of the forked node is answered as a
+    json line on stdout. The zygote exits when stdin is closed.
+
+    The time to first sync of every node is written to :code:`time_to_first_sync.csv` in the
+    output path.
+
+    :param intermediate_yaml: The path to the intermediate yaml file
+    :type intermediate_yaml: Path
+    """
+
+    def __init__(self, intermediate_yaml):
+        self.intermediate_yaml = intermediate_yaml
+
+        with self.intermediate_yaml.open(mode='r') as file:
+            self.data = yaml.load(file, Loader=yaml.FullLoader)
+
+        self.logger = get_logger(self.data['log_level'])
+
+        self.report_path = Path(self.data['output_path']) / 'time_to_first_sync.csv'
+        with self.report_path.open(mode='w') as report:
+            report.write(unicode(REPORT_HEADER))
+
+        self.replies = None
+
+        # Interrupts are for the nodes, the launcher closes stdin to stop the zygote.
+        # Finished nodes are reaped by the kernel, the launcher only checks if they are alive
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    def spawn(self, kind, index, netns, launched):
+        """
+        Fork a node.
+
+        :param kind: :code:`plc` or :code:`scada`
+        :param index: index of the PLC in the intermediate yaml
+        :param netns: pid of a process in the network namespace of the node
+        :param launched: time of the launch request
+        :return: pid of the node
+        """
+        pid = os.fork()
+        if pid:
+            return pid
+
+        code = 0
+        # noinspection PyBroadException
+        try:
+            self.run_node(kind, index, netns, launched)
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 0
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+    def run_node(self, kind, index, netns, launched):
+        """
+        Runs in the forked process, until the node stops.
+        """
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        if self.replies is not None:
+            self.replies.close()
+
+        # The forked nodes would otherwise all draw the same noise and db retry times
+        random.seed()
+        np.random.seed()
+
+        # Output of the nodes is only shown in debug mode, like the launcher scripts do
+        if self.data['log_level'] != 'debug':
+            no_output = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(no_output, 1)
+            os.dup2(no_output, 2)
+
+        enter_network_namespace(netns)
+
+        if kind == 'plc':
+            ZygotePLC(self.report_path, launched, self.intermediate_yaml, index, self.data)
+        elif kind == 'scada':
+            ZygoteScada(self.report_path, launched, self.intermediate_yaml, self.data)
+        else:
+            raise ValueError("Unknown kind of node: " + str(kind))
+
+    def serve(self):
+        """
+        Answer launch requests until stdin is closed.
+        """
+        # Replies get their own copy of stdout, the output of the nodes goes to stderr
+        self.replies = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+        for line in iter(sys.stdin.readline, ''):
+            request = json.loads(line)
+            pid = self.spawn(request['kind'], request.get('index'), request['netns'],
+                             request['launched'])
+            self.replies.write(json.dumps({'pid': pid}) + "\n")
+            self.replies.flush()
+
+        self.logger.debug("Zygote stopped.")
+
+
+def is_valid_file(parser_instance, arg):
+    if not os.path.exists(arg):
+        parser_instance.error(arg + " does not exist")
+    else:
+        return arg
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fork nodes from one preloaded process')
+    parser.add_argument(dest="intermediate_yaml",
+                        help="intermediate yaml file", metavar="FILE",
+                        type=lambda x: is_valid_file(parser, x))
+
+    args = parser.parse_args()
+    zygote = Zygote(Path(args.intermediate_yaml))
+    zygote.serve()
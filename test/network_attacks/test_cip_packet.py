@@ -0,0 +1,110 @@
+import struct
+
+import pytest
+from scapy.layers.inet import IP, TCP
+from scapy.packet import Raw
+
+from dhalsim.network_attacks.cip_packet import real_offsets, rewrite_reals, adjust_checksum
+from dhalsim.python2.enip_client import HEADER, SEND_RR_DATA, read_tag_request, \
+    multiple_service_request, tag_name
+from dhalsim.python2.enip_server import TagTable, handle_cip
+
+
+@pytest.fixture
+def table():
+    return TagTable(["T0", "T1", "P_RAW1"], [0.5, 1.25, 1])
+
+
+def enip_reply(cip):
+    items = struct.pack('<IHH', 0, 0, 2) + struct.pack('<HH', 0, 0) + \
+        struct.pack('<HH', 0xB2, len(cip)) + cip
+    return HEADER.pack(SEND_RR_DATA, len(items), 1, 0, b'\x00' * 8, 0) + items
+
+
+def ip_packet(payload, options=()):
+    packet = IP(src="192.168.1.1", dst="192.168.1.2") / \
+        TCP(sport=44818, dport=40000, flags="PA", options=list(options)) / Raw(load=payload)
+    return bytearray(bytes(packet))
+
+
+def read_reply(table, tags):
+    if len(tags) == 1:
+        return handle_cip(table, read_tag_request(tag_name(tags[0])))
+    return handle_cip(table, multiple_service_request(
+        [read_tag_request(tag_name(tag)) for tag in tags]))
+
+
+def values_at(packet, offsets):
+    return [struct.unpack_from('<f', packet, offset)[0] for offset in offsets]
+
+
+def assert_checksum_valid(packet):
+    parsed = IP(bytes(packet))
+    checksum = parsed[TCP].chksum
+    del parsed[TCP].chksum
+    assert IP(bytes(parsed))[TCP].chksum == checksum
+
+
+@pytest.mark.parametrize("options", [(), [('Timestamp', (1, 2)), ('NOP', None), ('NOP', None)]])
+def test_read_tag_reply(table, options):
+    packet = ip_packet(enip_reply(read_reply(table, ["T1"])), options)
+
+    offsets = real_offsets(packet)
+
+    assert values_at(packet, offsets) == [1.25]
+    assert offsets == [len(packet) - 4]
+
+
+def test_multiple_service_reply(table):
+    packet = ip_packet(enip_reply(read_reply(table, ["T0", "T1", "P_RAW1"])))
+
+    assert values_at(packet, real_offsets(packet)) == [0.5, 1.25, 1.0]
+
+
+@pytest.mark.parametrize("payload", [
+    b"",
+    b"\x00" * 10,
+    b"garbage that is long enough to look like an encapsulation header" * 2,
+])
+def test_other_packets_have_no_values(payload):
+    assert real_offsets(ip_packet(payload)) == []
+
+
+def test_write_reply_has_no_values(table):
+    request = struct.pack('<BB', 0x4D, 0) + struct.pack('<Hf', 0xCA, 1.0)
+    packet = ip_packet(enip_reply(handle_cip(table, request)))
+
+    assert real_offsets(packet) == []
+
+
+def test_incomplete_frame_is_left_alone(table):
+    packet = ip_packet(enip_reply(read_reply(table, ["T1"]))[:-2])
+
+    assert real_offsets(packet) == []
+
+
+@pytest.mark.parametrize("options", [(), [('NOP', None)] * 3 + [('EOL', None)]])
+def test_rewrite_updates_checksum(table, options):
+    packet = ip_packet(enip_reply(read_reply(table, ["T0", "T1", "P_RAW1"])), options)
+    offsets = real_offsets(packet)
+
+    rewrite_reals(packet, offsets, lambda value: value + 2)
+
+    assert values_at(packet, offsets) == [2.5, 3.25, 3.0]
+    assert_checksum_valid(packet)
+
+
+def internet_checksum(data):
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def test_adjust_checksum():
+    data = bytearray(range(40))
+    checksum = internet_checksum(bytes(data))
+    old = bytes(data[10:16])
+    data[10:16] = b"\xff\x00\x12\x34\xab\xcd"
+
+    assert adjust_checksum(checksum, old, bytes(data[10:16])) == internet_checksum(bytes(data))
@@ -1,11 +1,13 @@
-import subprocess
 import threading
 from pathlib import Path
 
 import pytest
 import yaml
 
+from dhalsim.network_attacks import mitm_attack
 from dhalsim.network_attacks.mitm_attack import SyncedAttack, MitmAttack
+from dhalsim.python2.enip_client import EnipClient, EnipError
+from dhalsim.python2.enip_server import EnipServer
 
 
 @pytest.fixture
@@ -27,17 +29,6 @@ def os_mock(mocker):
     return mocked_os
 
 
-@pytest.fixture
-def subprocess_mock(mocker):
-    process = mocker.Mock()
-    process.communicate.return_value = None
-    process.wait.return_value = None
-    process.terminate.return_value = None
-
-    mocker.patch("subprocess.Popen", return_value=process)
-    return process
-
-
 @pytest.fixture
 def thread_mock(mocker):
     thread = mocker.Mock()
@@ -79,15 +70,21 @@ def test_init(intermediate_yaml_path, yaml_index, os_mock, mocker):
     assert os_mock.system.call_count == 1
 
 
-def test_setup(os_mock, subprocess_mock, attack, thread_mock, launch_arp_poison_mock, mocker):
+@pytest.fixture
+def server_mock(mocker):
+    server = mocker.Mock()
+    mocker.patch("dhalsim.network_attacks.mitm_attack.EnipServer", return_value=server)
+    return server
+
+
+def test_setup(os_mock, server_mock, attack, thread_mock, launch_arp_poison_mock, mocker):
     # Mock self.update_tags_dict()
     mocker.patch.object(MitmAttack, "update_tags_dict", return_value=None)
     attack.setup()
 
     assert os_mock.system.call_count == 5
-    subprocess.Popen.assert_called_with(
-        ['/usr/bin/python2', '-m', 'cpppo.server.enip', '--print', '--address', '192.168.1.4:44818',
-         'V_ER2i:1=REAL', 'T2:1=REAL'], shell=False)
+    mitm_attack.EnipServer.assert_called_once_with('192.168.1.4:44818', attack.table)
+    assert server_mock.start.call_count == 1
     assert attack.update_tags_dict.call_count == 1
     assert attack.run_thread == True
     assert threading.Thread.call_count == 1
@@ -95,45 +92,70 @@ def test_setup(os_mock, subprocess_mock, attack, thread_mock, launch_arp_poison_
     assert launch_arp_poison_mock.call_count == 1
 
 
-def test_receive_original_tags(subprocess_mock, attack):
-    attack.receive_original_tags()
+def test_receive_original_tags(attack, mocker):
+    read_tags = mocker.patch.object(attack.enip_client, "read_tags", return_value=[1.0, 0.5])
+
+    assert attack.receive_original_tags() == {'V_ER2i': 1.0, 'T2': 0.5}
+    read_tags.assert_called_once_with('192.168.1.1', ['V_ER2i', 'T2'])
+
+
+def test_receive_original_tags_error(attack, mocker):
+    mocker.patch.object(attack.enip_client, "read_tags", side_effect=EnipError("timeout"))
 
-    subprocess.Popen.assert_called_with(
-        ['/usr/bin/python2', '-m', 'cpppo.server.enip.client', '--print', '--address',
-         '192.168.1.1:44818', 'V_ER2i:1', 'T2:1'], shell=False, stdout=-1)
-    assert subprocess_mock.communicate.call_count == 1
+    assert attack.receive_original_tags() is None
 
 
 def test_update_tags_dict(mocker, attack):
-    # Mock self.receive_original_tags() as this function is already tested
-    mocker.patch.object(MitmAttack, "receive_original_tags", return_value=None)
-    attack.tags = {
-        "V_ER2i": 1,
-        "T2": 0.1
-    }
+    mocker.patch.object(MitmAttack, "receive_original_tags",
+                        return_value={"V_ER2i": 1, "T2": 0.1})
     attack.update_tags_dict()
 
     assert attack.tags == {
         "V_ER2i": 0,
         "T2": 3.1
     }
+    assert attack.table.snapshot() == {"V_ER2i:1": 0.0, "T2:1": pytest.approx(3.1)}
+    assert attack.stats()['updates'] == 1
 
 
-def test_make_client_cmd(attack):
-    cmd = attack.make_client_cmd()
+def test_update_tags_dict_keeps_serving_on_error(mocker, attack):
+    mocker.patch.object(MitmAttack, "receive_original_tags",
+                        side_effect=[{"V_ER2i": 1, "T2": 0.1}, None])
+    attack.update_tags_dict()
+    attack.update_tags_dict()
 
-    assert cmd == ['/usr/bin/python2', '-m', 'cpppo.server.enip.client', '--print', '--address',
-                   '192.168.1.4']
+    assert attack.table.snapshot() == {"V_ER2i:1": 0.0, "T2:1": pytest.approx(3.1)}
+    assert attack.stats()['updates'] == 1
+    assert attack.stats()['failed_updates'] == 1
 
 
-def test_cpppo_thread(subprocess_mock, attack):
+def test_fetch_thread(attack, mocker):
+    mocker.patch.object(MitmAttack, "update_tags_dict", return_value=None)
     attack.run_thread = True
-    attack.cpppo_thread(interrupt_test=True)
+    attack.fetch_thread(interrupt_test=True)
+
+    assert attack.update_tags_dict.call_count == 1
+
+
+def test_spoofed_values_are_served(attack, mocker):
+    mocker.patch.object(attack.enip_client, "read_tags", return_value=[1.0, 0.5])
+    attack.attacker_ip = "127.0.0.1"
+    mocker.patch.object(MitmAttack, "FETCH_INTERVAL", 0.01)
+    mocker.patch("dhalsim.network_attacks.mitm_attack.EnipServer",
+                 side_effect=lambda address, table: EnipServer("127.0.0.1:0", table))
+    mocker.patch("dhalsim.network_attacks.mitm_attack.launch_arp_poison")
+    mocker.patch("os.system")
+    attack.setup()
 
-    subprocess.Popen.assert_called_with(
-        ['/usr/bin/python2', '-m', 'cpppo.server.enip.client', '--print', '--address',
-         '192.168.1.4'], shell=False)
-    assert subprocess_mock.wait.call_count == 1
+    client = EnipClient(1.0)
+    try:
+        address = "127.0.0.1:{port}".format(port=attack.server.server_address[1])
+        assert client.read_tags(address, ['V_ER2i', 'T2']) == [0.0, pytest.approx(3.5)]
+    finally:
+        client.close()
+        attack.run_thread = False
+        attack.thread.join()
+        attack.server.stop()
 
 
 def test_interrupt_from_state_1(attack, mocker):
@@ -151,13 +173,13 @@ def test_interrupt_from_state_0(attack, mocker):
 
     assert attack.teardown.call_count == 0
 
-def test_teardown(attack, restore_arp_mock, os_mock, subprocess_mock, thread_mock, mocker):
+def test_teardown(attack, restore_arp_mock, os_mock, server_mock, thread_mock, mocker):
     attack.thread = thread_mock
-    attack.server = subprocess_mock
+    attack.server = server_mock
     attack.teardown()
 
     assert restore_arp_mock.call_count == 1
     assert os_mock.system.call_count == 4
-    assert subprocess_mock.terminate.call_count == 1
+    assert server_mock.stop.call_count == 1
     assert attack.run_thread == False
     assert thread_mock.join.call_count == 1
\ No newline at end of file
@@ -1,11 +1,19 @@
+import struct
 import threading
 from pathlib import Path
 
 import fnfqueue
 import pytest
 import yaml
+from scapy.layers.inet import IP, TCP
+from scapy.packet import Raw
 
-from dhalsim.network_attacks.naive_attack import SyncedAttack, PacketAttack
+from dhalsim.network_attacks.cip_packet import real_offsets
+from dhalsim.network_attacks.naive_attack import SyncedAttack, PacketAttack, PacketCounters
+from dhalsim.python2.barrier import BarrierError
+from dhalsim.python2.enip_client import HEADER, SEND_RR_DATA, read_tag_request, \
+    multiple_service_request, tag_name
+from dhalsim.python2.enip_server import TagTable, handle_cip
 
 
 @pytest.fixture
@@ -118,11 +126,30 @@ def test_setup(os_mock, attack_time, thread_mock, launch_arp_poison_mock, fnfque
     assert os_mock.system.call_count == 5
     assert launch_arp_poison_mock.call_count == 1
     assert fnfqueue.Connection.call_count == 1
+    # fnfqueue needs at least a chunk of allocated buffers for every receive
+    kwargs = fnfqueue.Connection.call_args[1]
+    assert kwargs['chunk_size'] == PacketAttack.RECEIVE_CHUNK
+    assert kwargs['alloc_size'] >= kwargs['chunk_size']
     fnfqueue_mock.bind.assert_called_with(1)
-    fnfqueue_bound_mock.set_mode.assert_called_with(fnfqueue.MAX_PAYLOAD, fnfqueue.COPY_PACKET)
+    fnfqueue_bound_mock.set_mode.assert_called_with(PacketAttack.COPY_RANGE, fnfqueue.COPY_PACKET)
+    fnfqueue_bound_mock.set_maxlen.assert_called_with(PacketAttack.QUEUE_MAXLEN)
     assert attack_time.run_thread == True
     assert threading.Thread.call_count == 1
     assert thread_mock.start.call_count == 1
+    assert attack_time.queues == [fnfqueue_bound_mock]
+    assert attack_time.threads == [thread_mock]
+    assert "--queue-num 1 --queue-bypass" in os_mock.system.call_args_list[1][0][0]
+
+
+def test_setup_queues(os_mock, attack_time, thread_mock, launch_arp_poison_mock, fnfqueue_mock,
+                      fnfqueue_bound_mock):
+    attack_time.n_queues = 4
+    attack_time.setup()
+
+    assert [call[0][0] for call in fnfqueue_mock.bind.call_args_list] == [1, 2, 3, 4]
+    assert threading.Thread.call_count == 4
+    assert len(attack_time.counters) == 4
+    assert "--queue-balance 1:4 --queue-bypass" in os_mock.system.call_args_list[1][0][0]
 
 
 def test_interrupt_from_state_1(attack_time, mocker):
@@ -141,10 +168,22 @@ def test_interrupt_from_state_0(attack_time, mocker):
     assert attack_time.teardown.call_count == 0
 
 
-def test_teardown(attack_time, restore_arp_mock, os_mock, thread_mock, fnfqueue_mock, fnfqueue_bound_mock):
-    attack_time.thread = thread_mock
-    attack_time.queue = fnfqueue_mock
-    attack_time.q = fnfqueue_bound_mock
+def test_closed_barrier_stops_attack(attack_time, mocker):
+    mocker.patch.object(SyncedAttack, 'get_sync', side_effect=BarrierError("Connection closed"))
+    sigint_handler = mocker.patch.object(SyncedAttack, 'sigint_handler')
+
+    attack_time.main_loop()
+
+    assert sigint_handler.call_count == 1
+
+
+def test_teardown(attack_time, restore_arp_mock, os_mock, thread_mock, fnfqueue_mock, fnfqueue_bound_mock,
+                  mocker):
+    mocker.patch('time.sleep')
+    attack_time.threads = [thread_mock]
+    attack_time.connections = [fnfqueue_mock]
+    attack_time.queues = [fnfqueue_bound_mock]
+    attack_time.counters = [PacketCounters()]
     attack_time.teardown()
 
     assert restore_arp_mock.call_count == 1
@@ -153,6 +192,98 @@ def test_teardown(attack_time, restore_arp_mock, os_mock, thread_mock, fnfqueue_
     assert fnfqueue_bound_mock.unbind.call_count == 1
     assert fnfqueue_mock.close.call_count == 1
     assert thread_mock.join.call_count == 1
+    assert attack_time.threads == []
+
+
+@pytest.fixture
+def read_reply():
+    table = TagTable(["T0", "T1"], [0.5, 1.25])
+    cip = handle_cip(table, multiple_service_request([read_tag_request(tag_name("T0")),
+                                                      read_tag_request(tag_name("T1"))]))
+    items = struct.pack('<IHH', 0, 0, 2) + struct.pack('<HH', 0, 0) + \
+        struct.pack('<HH', 0xB2, len(cip)) + cip
+    enip = HEADER.pack(SEND_RR_DATA, len(items), 1, 0, b'\x00' * 8, 0) + items
+    return bytes(IP(src="192.168.1.1", dst="192.168.1.2") /
+                 TCP(sport=44818, dport=40000, flags="PA") / Raw(load=enip))
+
+
+def queued_packet(mocker, payload, truncated=False):
+    packet = mocker.Mock()
+    packet.payload = payload
+    packet.truncated = truncated
+    return packet
+
+
+@pytest.mark.parametrize("change, expected", [({'value': 3.0}, [3.0, 3.0]),
+                                              ({'offset': 1.0}, [1.5, 2.25])])
+def test_handle_packet_rewrites_reals(attack_time, read_reply, mocker, change, expected):
+    attack_time.intermediate_attack.pop('value', None)
+    attack_time.intermediate_attack.pop('offset', None)
+    attack_time.intermediate_attack.update(change)
+    packet = queued_packet(mocker, read_reply)
+    counters = PacketCounters()
+
+    attack_time.handle_packet(packet, counters)
+
+    rewritten = IP(packet.payload)
+    offsets = real_offsets(packet.payload)
+    assert [struct.unpack_from('<f', packet.payload, offset)[0] for offset in offsets] == expected
+    checksum = rewritten[TCP].chksum
+    del rewritten[TCP].chksum
+    assert IP(bytes(rewritten))[TCP].chksum == checksum
+    assert packet.mangle.call_count == 1
+    assert counters.as_dict() == {'packets': 1, 'rewritten': 1, 'values': 2, 'truncated': 0,
+                                  'overflows': 0, 'errors': 0}
+
+
+def test_handle_packet_passes_other_packets(attack_time, mocker):
+    payload = bytes(IP(src="192.168.1.1", dst="192.168.1.2") / TCP(sport=44818, flags="A"))
+    packet = queued_packet(mocker, payload)
+    counters = PacketCounters()
+
+    attack_time.handle_packet(packet, counters)
+
+    assert packet.payload == payload
+    assert packet.mangle.call_count == 1
+    assert counters.rewritten == 0
+
+
+def test_handle_packet_accepts_truncated(attack_time, read_reply, mocker):
+    packet = queued_packet(mocker, read_reply, truncated=True)
+    counters = PacketCounters()
+
+    attack_time.handle_packet(packet, counters)
+
+    assert packet.payload == read_reply
+    assert packet.accept.call_count == 1
+    assert packet.mangle.call_count == 0
+    assert counters.truncated == 1
+
+
+def test_handle_packet_accepts_on_error(attack_time, read_reply, mocker):
+    mocker.patch('dhalsim.network_attacks.naive_attack.rewrite_reals', side_effect=ValueError)
+    packet = queued_packet(mocker, read_reply)
+    counters = PacketCounters()
+
+    attack_time.handle_packet(packet, counters)
+
+    assert packet.payload == read_reply
+    assert packet.accept.call_count == 1
+    assert packet.mangle.call_count == 0
+    assert counters.errors == 1
+
+
+def test_stats(attack_time, mocker):
+    first, second = PacketCounters(), PacketCounters()
+    first.packets, second.packets = 30, 10
+    first.started = second.started = 100.0
+    mocker.patch('time.time', return_value=104.0)
+    attack_time.counters = [first, second]
+
+    stats = attack_time.stats()
+
+    assert stats['packets'] == 40
+    assert stats['packets_per_second'] == 10.0
 
 
 def test_time_trigger_true(attack_time, mocker):
@@ -192,4 +323,44 @@ def test_between_trigger_true(attack_between, mocker):
 
 def test_between_trigger_false(attack_between, mocker):
     mocker.patch.object(SyncedAttack, "receive_tag", return_value=0.21)
-    assert not attack_between.check_trigger()
\ No newline at end of file
+    assert not attack_between.check_trigger()
+
+
+def test_trigger_owner_is_looked_up_once(attack_above, mocker):
+    read_tag = mocker.patch.object(attack_above.enip_client, "read_tag", return_value=0.20)
+    owner = mocker.patch.object(attack_above.tag_index, "owner")
+
+    assert attack_above.check_trigger()
+    assert attack_above.check_trigger()
+
+    owner.assert_not_called()
+    read_tag.assert_called_with(attack_above.trigger_owner.ip,
+                                attack_above.intermediate_attack['trigger']['sensor'])
+    assert attack_above.trigger_times.count == 2
+
+
+def test_unanswered_trigger_does_not_run(attack_below, mocker):
+    mocker.patch.object(SyncedAttack, "receive_tag", return_value=None)
+    assert not attack_below.check_trigger()
+
+
+def test_plant_trigger_reads_plant_table(attack_above, mocker):
+    receive_tag = mocker.patch.object(SyncedAttack, "receive_tag")
+    attack_above.trigger['source'] = 'plant'
+    attack_above.cur = mocker.Mock()
+    attack_above.cur.fetchone.return_value = ["0.25"]
+
+    assert attack_above.check_trigger()
+
+    receive_tag.assert_not_called()
+    attack_above.cur.execute.assert_called_once_with("SELECT value FROM plant WHERE name = ?",
+                                                     (attack_above.trigger['sensor'],))
+
+
+def test_plant_trigger_reads_shared_state(attack_between, mocker):
+    attack_between.trigger['source'] = 'plant'
+    attack_between.shared_state = mocker.Mock()
+    attack_between.shared_state.read.return_value = 0.21
+
+    assert not attack_between.check_trigger()
+    attack_between.shared_state.read.assert_called_once_with(attack_between.trigger['sensor'])
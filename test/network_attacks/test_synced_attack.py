@@ -13,7 +13,7 @@ def patched_attack(mocker):
     mocker.patch.object(SyncedAttack, "__init__", return_value=None)
     mocker.patch.object(MitmAttack, "__init__", return_value=None)
     mocker.patch.object(SyncedAttack, "DB_TRIES", 3)
-    mocker.patch.object(SyncedAttack, "DB_SLEEP_TIME", 1.5)
+    mocker.patch("random.uniform", return_value=1.5)
 
     cur_mock = mocker.Mock()
     conn_mock = mocker.Mock()
@@ -23,6 +23,9 @@ def patched_attack(mocker):
     attacker.cur = cur_mock
     attacker.conn = conn_mock
     attacker.logger = logger_mock
+    attacker.barrier = None
+    attacker.sync_trace = None
+    attacker.shared_state = None
     attacker.intermediate_attack = {
         'name': 'attack123'
     }
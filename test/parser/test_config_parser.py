@@ -5,7 +5,8 @@ from unittest.mock import MagicMock
 import pytest
 import yaml
 
-from dhalsim.parser.config_parser import ConfigParser, TooManyNodes
+from dhalsim.parser.config_parser import ConfigParser, TooManyNodes, NetworkAttackError
+from dhalsim.python2.database import temp_parent
 
 
 @pytest.fixture
@@ -83,7 +84,7 @@ def test_generate_intermediate_yaml(mocker, tmpdir, wadi_config_yaml_path, fille
     actual.pop('start_time')
 
     assert actual == expected
-    directory_mock.mkdtemp.assert_called_with(prefix='dhalsim_')
+    directory_mock.mkdtemp.assert_called_with(prefix='dhalsim_', dir=temp_parent())
     directory_mock.chmod.assert_called_with(directory_mock.mkdtemp(), 0o775)
 
 
@@ -136,6 +137,20 @@ def test_not_too_many_nodes_bad_weather(plcs, network_attacks):
         ConfigParser.not_too_many_nodes({'plcs': plcs, 'attacks': {'network_attacks': network_attacks}})
 
 
+def test_not_too_many_nodes_local_runtime():
+    ConfigParser.not_too_many_nodes({'plcs': [i for i in range(500)],
+                                     'local_runtime': {'processes': 4, 'base_port': 44900}})
+
+
+def test_local_runtime_without_network_attacks():
+    ConfigParser.local_runtime_without_network_attacks(
+        {'local_runtime': {}, 'attacks': {'device_attacks': [1]}})
+    ConfigParser.local_runtime_without_network_attacks({'attacks': {'network_attacks': [1]}})
+    with pytest.raises(NetworkAttackError):
+        ConfigParser.local_runtime_without_network_attacks(
+            {'local_runtime': {}, 'attacks': {'network_attacks': [1]}})
+
+
 @pytest.mark.parametrize('network_attacks',
                          [
                              251,
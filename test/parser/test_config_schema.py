@@ -147,6 +147,15 @@ def test_required_config(required_key, test_dict):
     ('mininet_cli', ""),
     ('mininet_cli', 1),
     ('mininet_cli', 0),
+    ('zygote', "True"),
+    ('zygote', 1),
+    ('scada_observer', "True"),
+    ('barrier', "invalid"),
+    ('barrier', 1),
+    ('plant_state', "shm"),
+    ('plant_state', True),
+    ('sync_trace', "True"),
+    ('sync_trace', 1),
     ('log_level', 1),
     ('log_level', "invalid"),
     ('log_level', ""),
@@ -166,6 +175,23 @@ def test_required_config(required_key, test_dict):
     ('saving_interval', '3'),
     ('noise_scale', -1.0),
     ('noise_scale', '1'),
+    ('publishing', {'mode': 'invalid'}),
+    ('publishing', {'deadband': -0.1}),
+    ('publishing', {'tag_deadbands': {'T0': -1}}),
+    ('publishing', {'heartbeat': 0}),
+    ('publishing', {'heartbeat': '5'}),
+    ('subscriptions', {'deadband': -1}),
+    ('subscriptions', {'heartbeat': 0}),
+    ('scada_polling', {'interval': 0}),
+    ('scada_polling', {'timeout': '1'}),
+    ('scada_polling', {'backoff': 0.5}),
+    ('historian', {'max_bytes': -1}),
+    ('historian', {'compress': 'yes'}),
+    ('historian', {'tail': 0}),
+    ('timeseries', {'max_points': 0}),
+    ('local_runtime', {'processes': 0}),
+    ('local_runtime', {'base_port': 80}),
+    ('local_runtime', {'base_port': '44900'}),
 ])
 def test_invalid_config(key, invalid_value, test_dict):
     test_dict[key] = invalid_value
@@ -181,6 +207,16 @@ def test_invalid_config(key, invalid_value, test_dict):
     ('iterations', 100, 100),
     ('mininet_cli', True, True),
     ('mininet_cli', False, False),
+    ('zygote', True, True),
+    ('zygote', False, False),
+    ('scada_observer', True, True),
+    ('scada_observer', False, False),
+    ('barrier', 'sqlite', 'sqlite'),
+    ('barrier', 'SOCKET', 'socket'),
+    ('plant_state', 'sqlite', 'sqlite'),
+    ('plant_state', 'Shared_Memory', 'shared_memory'),
+    ('sync_trace', True, True),
+    ('sync_trace', False, False),
     ('log_level', 'debug', 'debug'),
     ('log_level', 'DEBUG', 'debug'),
     ('log_level', 'info', 'info'),
@@ -202,6 +238,24 @@ def test_invalid_config(key, invalid_value, test_dict):
     ('batch_simulations', 100, 100),
     ('saving_interval', 2, 2),
     ('noise_scale', 0.0, 0.0),
+    ('publishing', {}, {'mode': 'periodic', 'deadband': 0.0, 'tag_deadbands': {},
+                        'heartbeat': 10.0}),
+    ('publishing', {'mode': 'DEADBAND', 'deadband': 1, 'tag_deadbands': {'T0': 0.01},
+                    'heartbeat': 5},
+     {'mode': 'deadband', 'deadband': 1.0, 'tag_deadbands': {'T0': 0.01}, 'heartbeat': 5.0}),
+    ('subscriptions', {}, {'deadband': 0.0, 'heartbeat': 5.0}),
+    ('subscriptions', {'deadband': 1, 'heartbeat': 2}, {'deadband': 1.0, 'heartbeat': 2.0}),
+    ('scada_polling', {}, {'interval': 2.0, 'timeout': 1.0, 'backoff': 2.0,
+                           'max_backoff': 30.0}),
+    ('scada_polling', {'interval': 1, 'max_backoff': 10},
+     {'interval': 1.0, 'timeout': 1.0, 'backoff': 2.0, 'max_backoff': 10.0}),
+    ('historian', {}, {'max_bytes': 0, 'max_seconds': 0.0, 'compress': False, 'tail': 1000}),
+    ('historian', {'max_seconds': 3600, 'compress': True},
+     {'max_bytes': 0, 'max_seconds': 3600.0, 'compress': True, 'tail': 1000}),
+    ('timeseries', {}, {'max_points': 100000}),
+    ('timeseries', {'max_points': 5000}, {'max_points': 5000}),
+    ('local_runtime', {}, {'processes': 1, 'base_port': 44900}),
+    ('local_runtime', {'processes': 4, 'base_port': 50000}, {'processes': 4, 'base_port': 50000}),
 ])
 def test_valid_config(key, input_value, expected_value, test_dict):
     test_dict[key] = input_value
@@ -248,6 +302,11 @@ def test_required_plcs(required_key, test_dict):
     ('actuators', [4.2]),
     ('actuators', ['&']),
     ('actuators', ["木头"]),
+    ('scan_period', 0),
+    ('scan_period', 2.5),
+    ('scan_period', "2"),
+    ('scada_polling', {'interval': -1}),
+    ('scada_polling', {'unknown': 1}),
 ])
 def test_invalid_plc(key, invalid_value, test_dict):
     test_dict['plcs'][0][key] = invalid_value
@@ -270,6 +329,9 @@ def test_invalid_plc(key, invalid_value, test_dict):
     ('actuators', ["Valve"], ["Valve"]),
     ('actuators', [], []),
     ('actuators', ["valve_42"], ["valve_42"]),
+    ('scan_period', 5, 5),
+    ('scada_polling', {}, {}),
+    ('scada_polling', {'timeout': 2}, {'timeout': 2.0}),
 ])
 def test_valid_plc(key, input_value, expected_value, test_dict):
     test_dict['plcs'][0][key] = input_value
@@ -375,7 +437,10 @@ def test_valid_network_attacks_mitm(key, input_value, expected, attack_dict_1):
     ('trigger', {'type': 'NoType', 'start': 5, 'end': 10}),
     ('trigger', {'type': 'NoType', 'start': 5, 'end': '10'}),
     ('target', True),
-    ('wrong', 1)
+    ('wrong', 1),
+    ('queues', 0),
+    ('queues', 17),
+    ('queues', '4'),
 ])
 def test_invalid_attacks_naive(key, input_value, attack_dict_2):
     attack_dict_2[key] = input_value
@@ -390,6 +455,7 @@ def test_invalid_attacks_naive(key, input_value, attack_dict_2):
     ('name', '10', '10'),
     ('name', 'atak', 'atak'),
     ('trigger', {'type': 'Time', 'start': 5, 'end': 10}, {'type': 'time', 'start': 5, 'end': 10}),
+    ('queues', 4, 4),
 ])
 def test_valid_attacks_naive(key, input_value, expected, attack_dict_2):
     attack_dict_2[key] = input_value
@@ -427,6 +493,8 @@ def test_required_attack_fields_naive(required_key, attack_dict_2):
     ({'type': 'Below', 'sensor': 't_5', 'value': 3.0},{'type': 'below', 'sensor': 't_5', 'value': 3.0}),
     ({'type': 'Between', 'sensor': 't_5', 'lower_value': 3.0, 'upper_value': 4.0},{'type': 'between', 'sensor': 't_5', 'lower_value': 3.0, 'upper_value': 4.0}),
     ({'type': 'Above', 'sensor': 'T1', 'value': 3},{'type': 'above', 'sensor': 'T1', 'value': 3.0}),
+    ({'type': 'Above', 'sensor': 'T1', 'value': 3.0, 'source': 'Plant'},
+     {'type': 'above', 'sensor': 'T1', 'value': 3.0, 'source': 'plant'}),
     ({'type': 'Below', 'sensor': 't_5', 'value': 3},{'type': 'below', 'sensor': 't_5', 'value': 3.0}),
     ({'type': 'Between', 'sensor': 't_5', 'lower_value': 3, 'upper_value': 4.0},{'type': 'between', 'sensor': 't_5', 'lower_value': 3.0, 'upper_value': 4.0}),
     ({'type': 'Between', 'sensor': 't_5', 'lower_value': 3.0, 'upper_value': 4},{'type': 'between', 'sensor': 't_5', 'lower_value': 3.0, 'upper_value': 4.0}),
@@ -450,6 +518,8 @@ def test_valid_trigger(trigger, expected):
     {'type': 'Between', 'lower_value': '3.0', 'upper_value': 4.0},
     {'type': 'Between', 'sensor': 't_5', 'upper_value': 4.0},
     {'type': 'Between', 'sensor': 't_5', 'lower_value': '3.0'},
+    {'type': 'Above', 'sensor': 'T1', 'value': 3.0, 'source': 'network'},
+    {'type': 'Time', 'start': 5, 'end': 10, 'source': 'plant'},
 ])
 def test_invalid_trigger(trigger):
     with pytest.raises(SchemaError):
@@ -0,0 +1,96 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from epynet.epynet.adjacency import AdjacencyIndex
+from epynet.network import WaterDistributionNetwork
+
+
+@pytest.fixture
+def line_index():
+    # R -> J1 -> J2 -> T1, plus J2 - J3 as a dead end
+    return AdjacencyIndex(['R', 'J1', 'J2', 'T1', 'J3'],
+                          ['P1', 'P2', 'P3', 'P4'],
+                          [0, 1, 2, 4],
+                          [1, 2, 3, 2])
+
+
+def test_csr_layout(line_index):
+    np.testing.assert_array_equal(line_index.indptr, [0, 1, 3, 6, 7, 8])
+    assert sorted(line_index.incident_links('J2').tolist()) == [1, 2, 3]
+    assert line_index.incident_links('R').tolist() == [0]
+
+
+def test_upstream_downstream(line_index):
+    flows = np.array([1.0, 1.0, 0.5, -0.5])
+
+    assert line_index.upstream_links('J2', flows).tolist() == [1]
+    assert sorted(line_index.downstream_links('J2', flows).tolist()) == [2, 3]
+    assert line_index.upstream_links('J3', flows).tolist() == [3]
+
+
+def test_node_queries_match_whole_network(line_index):
+    flows = np.array([2.0, -1.5, 0.0, 0.75])
+    inflow = line_index.inflow(flows)
+    outflow = line_index.outflow(flows)
+
+    for slot, node in enumerate(line_index.node_uids):
+        assert np.abs(flows[line_index.upstream_links(node, flows)]).sum() == inflow[slot]
+        assert np.abs(flows[line_index.downstream_links(node, flows)]).sum() == outflow[slot]
+
+
+def test_inflow_outflow(line_index):
+    flows = np.array([1.0, 1.0, 0.5, -0.5])
+
+    np.testing.assert_allclose(line_index.inflow(flows), [0, 1, 1, 0.5, 0.5])
+    np.testing.assert_allclose(line_index.outflow(flows), [1, 1, 1, 0, 0])
+
+
+def test_reachable_follows_flow(line_index):
+    flows = np.array([1.0, 1.0, 0.5, 0.0])
+
+    downstream = line_index.reachable(['J1'], flows)
+    upstream = line_index.reachable(['J2'], flows, direction='upstream')
+    undirected = line_index.reachable(['T1'])
+
+    assert downstream.tolist() == [False, True, True, True, False]
+    assert upstream.tolist() == [True, True, True, False, False]
+    assert undirected.all()
+
+
+def test_reachable_invalid_direction(line_index):
+    with pytest.raises(ValueError):
+        line_index.reachable(['R'], direction='sideways')
+
+
+def test_isolation_zones(line_index):
+    zones = line_index.isolation_zones(np.array([True, False, True, True]))
+
+    assert zones[0] == zones[1]
+    assert zones[2] == zones[3] == zones[4]
+    assert zones[0] != zones[2]
+    assert len(set(line_index.isolation_zones().tolist())) == 1
+
+
+def test_network_index_matches_links(tmpdir):
+    inp_file = Path(str(tmpdir)) / "minitown_map.inp"
+    shutil.copy("examples/minitown_topology/minitown_map.inp", str(inp_file))
+    wn = WaterDistributionNetwork(str(inp_file))
+
+    index = wn.adjacency
+    assert index.node_uids == list(wn.nodes.keys())
+    assert index.link_uids == list(wn.links.keys())
+    for slot, link in enumerate(wn.links):
+        assert index.node_uids[index.from_nodes[slot]] == link.from_node.uid
+        assert index.node_uids[index.to_nodes[slot]] == link.to_node.uid
+
+    wn.init_simulation()
+    _, state = wn.simulate_step(0)
+    flows = state.links['flow']
+    for node in wn.nodes:
+        expected = sum(abs(link.results['flow'][-1]) for link in node.links
+                       if (link.to_node == node and link.results['flow'][-1] >= 1e-3) or
+                       (link.from_node == node and link.results['flow'][-1] <= -1e-3))
+        assert index.inflow(flows)[index.node_index[node.uid]] == pytest.approx(expected)
@@ -0,0 +1,62 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from epynet.network import NetworkState, WaterDistributionNetwork
+
+
+@pytest.fixture
+def minitown(tmpdir):
+    inp_file = Path(str(tmpdir)) / "minitown_map.inp"
+    shutil.copy("examples/minitown_topology/minitown_map.inp", str(inp_file))
+    return WaterDistributionNetwork(str(inp_file))
+
+
+def test_state_layout():
+    state = NetworkState(['J1', 'T1'], ['P1', 'V1', 'PIPE1'])
+
+    assert len(state) == 5
+    assert 'T1' in state
+    assert 'P2' not in state
+    assert state.nodes.dtype.names == ('pressure',)
+    assert state.links.dtype.names == ('status', 'flow')
+    np.testing.assert_array_equal(state.node_slots(['T1', 'J1']), [1, 0])
+    np.testing.assert_array_equal(state.link_slots(['PIPE1', 'P1']), [2, 0])
+
+
+def test_state_record_access():
+    state = NetworkState(['J1', 'T1'], ['P1'])
+    state.nodes['pressure'][state.node_index['T1']] = 3.5
+    state.links[0] = (1, 0.25)
+
+    assert state['T1']['pressure'] == 3.5
+    assert state['P1']['status'] == 1
+    assert state['P1']['flow'] == 0.25
+
+
+def test_state_matches_results(minitown):
+    minitown.init_simulation()
+    state = None
+    sim_time = 0
+    for _ in range(3):
+        timestep, state = minitown.simulate_step(sim_time)
+        sim_time += timestep
+
+    assert state is minitown.network_state
+    for uid in minitown.tanks.keys():
+        assert state[uid]['pressure'] == minitown.nodes[uid].results['pressure'][-1]
+    for uid in minitown.pumps.keys():
+        assert state[uid]['flow'] == minitown.links[uid].results['flow'][-1]
+        assert state[uid]['status'] == minitown.links[uid].results['status'][-1]
+
+
+def test_state_is_reused(minitown):
+    minitown.init_simulation()
+    _, first = minitown.simulate_step(0)
+    nodes_buffer = first.nodes
+    _, second = minitown.simulate_step(0)
+
+    assert first is second
+    assert second.nodes is nodes_buffer
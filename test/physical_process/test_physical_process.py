@@ -1,7 +1,10 @@
 from dhalsim.physical_process import PhysicalPlant
+from dhalsim.python2.shared_state import SharedState
+from dhalsim.python2.sync_trace import PHYSICAL_PROCESS, SyncTrace, read_trace
 from pathlib import Path
 import pytest
 import filecmp
+import sqlite3
 import yaml
 
 @pytest.fixture
@@ -35,3 +38,96 @@ def get_physical_plant():
     #no_control_process = processed_inp_filename.open(mode='r')
 
     #filecmp.cmp(no_controls_path, processed_inp_filename, shallow=True)
+
+
+@pytest.fixture
+def sync_db(tmpdir):
+    conn = sqlite3.connect(str(tmpdir.join("sync.sqlite")))
+    conn.execute("CREATE TABLE sync (name TEXT NOT NULL, flag INT NOT NULL, PRIMARY KEY (name))")
+    for name in ["PLC1", "PLC2", "PLC3", "scada"]:
+        conn.execute("INSERT INTO sync (name, flag) VALUES (?, 1)", (name,))
+    conn.commit()
+    return conn
+
+
+@pytest.mark.parametrize("master_time, expected", [
+    (6, {"PLC1": 0, "PLC2": 0, "PLC3": 0, "scada": 0}),
+    (4, {"PLC1": 0, "PLC2": 0, "PLC3": 1, "scada": 0}),
+    (3, {"PLC1": 0, "PLC2": 1, "PLC3": 0, "scada": 0}),
+    (5, {"PLC1": 0, "PLC2": 1, "PLC3": 1, "scada": 0}),
+])
+def test_request_scans_only_due_plcs(mocker, sync_db, master_time, expected):
+    mocker.patch.object(PhysicalPlant, "__init__", return_value=None)
+    plant = PhysicalPlant(None)
+    plant.scan_periods = {"PLC2": 2, "PLC3": 3}
+    plant.barrier_scans = 0
+    plant.barrier = None
+    plant.sync_trace = None
+    plant.master_time = master_time
+
+    plant.request_scans(sync_db.cursor())
+
+    assert dict(sync_db.execute("SELECT name, flag FROM sync").fetchall()) == expected
+    assert plant.barrier_scans == list(expected.values()).count(0)
+
+
+@pytest.mark.parametrize("master_time, expected", [
+    (6, ["PLC1", "PLC2", "PLC3", "scada"]),
+    (4, ["PLC1", "PLC2", "scada"]),
+    (5, ["PLC1", "scada"]),
+])
+def test_request_scans_releases_due_nodes_on_barrier(mocker, sync_db, master_time, expected):
+    mocker.patch.object(PhysicalPlant, "__init__", return_value=None)
+    plant = PhysicalPlant(None)
+    plant.scan_periods = {"PLC2": 2, "PLC3": 3}
+    plant.barrier_scans = 0
+    plant.barrier = mocker.Mock(participants=["PLC1", "PLC2", "PLC3", "scada"])
+    plant.barrier.release.return_value = len(expected)
+    plant.sync_trace = None
+    plant.master_time = master_time
+
+    plant.request_scans(sync_db.cursor())
+
+    plant.barrier.release.assert_called_once_with(expected, master_time)
+    assert plant.barrier_scans == len(expected)
+    assert dict(sync_db.execute("SELECT name, flag FROM sync").fetchall()) == \
+        {"PLC1": 1, "PLC2": 1, "PLC3": 1, "scada": 1}
+
+
+def test_plant_values_in_shared_state(mocker, tmpdir):
+    path = str(tmpdir.join("plant_state"))
+    SharedState.create(path, ["T0", "P_RAW1"], {"P_RAW1": "1"})
+    mocker.patch.object(PhysicalPlant, "__init__", return_value=None)
+    plant = PhysicalPlant(None)
+    plant.shared_state = SharedState(path, ["T0", "P_RAW1"])
+    plant.master_time = 3
+
+    cursor = mocker.Mock()
+
+    plant.set_to_db("T0", 0.75)
+    assert plant.get_from_db("T0") == "0.75"
+    plant.update_db(cursor, "T0", "0.5")
+    plant.write_master_time(cursor)
+
+    cursor.execute.assert_called_once_with("REPLACE INTO master_time (id, time) VALUES(1, ?)",
+                                           ("3",))
+    assert plant.get_from_db("T0") == "0.5"
+    assert int(plant.get_from_db("P_RAW1")) == 1
+    assert plant.shared_state.master_time() == 3
+
+
+def test_wait_for_plcs_is_traced(mocker, tmpdir):
+    mocker.patch.object(PhysicalPlant, "__init__", return_value=None)
+    plant = PhysicalPlant(None)
+    plant.barrier = mocker.Mock()
+    plant.barrier_wait = 0.0
+    plant.master_time = 4
+    plant.sync_trace = SyncTrace(str(tmpdir.join(PHYSICAL_PROCESS + ".trace")))
+
+    plant.wait_for_plcs()
+    plant.sync_trace.close()
+
+    records = read_trace(plant.sync_trace.path)
+    assert len(records) == 1
+    assert records[0][0] == 4
+    assert records[0][1] <= records[0][2]
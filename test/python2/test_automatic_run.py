@@ -1,7 +1,10 @@
+import os
+import subprocess
+
 import pytest
 from mock import call
 
-from dhalsim.python2.automatic_run import GeneralCPS
+from dhalsim.python2.automatic_run import GeneralCPS, ZygoteWorker
 
 
 @pytest.fixture
@@ -94,3 +97,17 @@ def test_scada_process_shutdown(patched_auto_run, online_process, offline_after_
     assert logger_mock.debug.call_count == 1
     assert offline_after_five_process.poll.call_count == 5
     assert online_process.poll.call_count == 14
+
+
+def test_zygote_worker_alive():
+    worker = ZygoteWorker(os.getpid())
+    assert worker.poll() is None
+
+
+def test_zygote_worker_finished():
+    process = subprocess.Popen(["true"])
+    process.wait()
+
+    worker = ZygoteWorker(process.pid)
+    assert worker.poll() == 0
+    assert worker.wait() == 0
@@ -0,0 +1,148 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from dhalsim.python2.barrier import BarrierServer, BarrierClient, BarrierError
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join("barrier.sock"))
+
+
+@pytest.fixture
+def server(path):
+    server = BarrierServer(path, ["PLC1", "PLC2", "scada"])
+    yield server
+    server.close()
+
+
+def run_node(client, iterations, steps):
+    for _ in range(iterations):
+        steps.append((client.name, client.wait()))
+        client.done()
+
+
+def start_nodes(path, names, iterations, steps):
+    threads = []
+    for name in names:
+        thread = threading.Thread(target=run_node,
+                                  args=(BarrierClient(path, name), iterations, steps))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def test_wait_without_release_returns_at_once(server):
+    start = time.time()
+    server.wait(timeout=5)
+    assert time.time() - start < 1
+
+
+def test_round_trip(server, path):
+    steps = []
+    threads = start_nodes(path, ["PLC1", "PLC2", "scada"], 3, steps)
+
+    for master_time in range(3):
+        assert server.release(["PLC1", "PLC2", "scada"], master_time) == 3
+        assert server.wait(timeout=5) is not None
+
+    for thread in threads:
+        thread.join(5)
+    assert sorted(steps) == sorted((name, master_time) for name in ["PLC1", "PLC2", "scada"]
+                                   for master_time in range(3))
+    assert server.stats()['releases'] == 3
+    assert server.stats()['released'] == 9
+    assert sum(server.stats()['last'].values()) == 3
+
+
+def test_only_due_nodes_are_released(server, path):
+    steps = []
+    start_nodes(path, ["PLC1", "PLC2", "scada"], 1, steps)
+
+    server.release(["PLC1", "scada"], 4)
+    assert server.wait(timeout=5) is not None
+    time.sleep(0.1)
+
+    assert sorted(steps) == [("PLC1", 4), ("scada", 4)]
+
+
+def test_wait_blocks_until_the_last_node_is_done(server, path):
+    steps = []
+    start_nodes(path, ["PLC1"], 1, steps)
+    slow = BarrierClient(path, "PLC2")
+    slow.connect()
+    server.release(["PLC1", "PLC2"], 1)
+
+    assert server.wait(timeout=0.5) is None
+    assert steps == [("PLC1", 1)]
+    assert server.waiting == {"PLC2"}
+
+    assert slow.wait() == 1
+    slow.done()
+    assert server.wait(timeout=5) is not None
+    assert server.stats()['last'] == {"PLC1": 0, "PLC2": 1, "scada": 0}
+
+
+def test_node_that_leaves_is_not_waited_for(server, path):
+    client = BarrierClient(path, "PLC1")
+    client.connect()
+    server.release(["PLC1"], 1)
+    client.close()
+
+    server.wait(timeout=5)
+    assert not server.waiting
+    assert server.stats()['left'] == ["PLC1"]
+    assert server.release(["PLC1"], 2) == 0
+
+
+def test_unknown_node_is_refused(server, path):
+    client = BarrierClient(path, "PLC9")
+    client.connect()
+    server.release(["PLC1"], 1)
+    server.wait(timeout=0.2)
+
+    assert "PLC9" not in server.joined
+    with pytest.raises(BarrierError):
+        client.wait()
+
+
+def test_client_waits_for_the_server(path):
+    steps = []
+    threads = start_nodes(path, ["PLC1"], 1, steps)
+    time.sleep(0.2)
+
+    server = BarrierServer(path, ["PLC1"])
+    try:
+        server.release(["PLC1"], 0)
+        assert server.wait(timeout=5) is not None
+    finally:
+        server.close()
+    threads[0].join(5)
+    assert steps == [("PLC1", 0)]
+
+
+def test_closed_barrier_raises(path):
+    server = BarrierServer(path, ["PLC1"])
+    client = BarrierClient(path, "PLC1")
+    client.connect()
+    server.release(["PLC1"], 0)
+    server.wait(timeout=0.2)
+    assert client.wait() == 0
+    server.close()
+
+    with pytest.raises(BarrierError):
+        # The first send may still be buffered
+        for _ in range(10):
+            client.done()
+            time.sleep(0.01)
+    with pytest.raises(BarrierError):
+        client.wait()
@@ -0,0 +1,121 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+from dhalsim.python2.cache_refresh import CacheRefresher, TargetStats
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def groups():
+    groups = OrderedDict()
+    groups["192.168.1.2"] = ["T2", "V2"]
+    groups["192.168.1.3"] = ["T3"]
+    return groups
+
+
+def test_target_stats():
+    stats = TargetStats()
+    assert stats.mean_latency is None
+
+    stats.record(0.2, False)
+    stats.record(0.4, True)
+
+    assert stats.as_dict() == {'requests': 2, 'failures': 1, 'timeouts': 0,
+                               'mean_latency': pytest.approx(0.3), 'max_latency': 0.4,
+                               'last_latency': 0.4}
+
+
+def test_one_request_per_target(groups):
+    calls = []
+
+    def fetch(tags, ip):
+        calls.append((tuple(tags), ip))
+        return [ip[-1] + tag for tag in tags]
+
+    refresher = CacheRefresher(groups, fetch, 4, 1.0)
+    received, errors = refresher.refresh()
+
+    assert sorted(calls) == [(("T2", "V2"), "192.168.1.2"), (("T3",), "192.168.1.3")]
+    assert received == {"T2": "2T2", "V2": "2V2", "T3": "3T3"}
+    assert errors == {}
+    assert refresher.stats_summary()["192.168.1.3"]["requests"] == 1
+
+
+def test_failed_target(groups):
+    def fetch(tags, ip):
+        if ip == "192.168.1.2":
+            raise IOError("unreachable")
+        return [1.0]
+
+    refresher = CacheRefresher(groups, fetch, 2, 1.0)
+    received, errors = refresher.refresh()
+
+    assert received == {"T3": 1.0}
+    assert isinstance(errors["192.168.1.2"], IOError)
+    assert refresher.stats_summary()["192.168.1.2"]["failures"] == 1
+
+
+def test_slow_target_does_not_block_others(groups):
+    release = threading.Event()
+    calls = []
+
+    def fetch(tags, ip):
+        calls.append(ip)
+        if ip == "192.168.1.2":
+            release.wait(5)
+        return [0.5] * len(tags)
+
+    refresher = CacheRefresher(groups, fetch, 2, 0.2)
+    received, errors = refresher.refresh()
+
+    assert received == {"T3": 0.5}
+    assert "192.168.1.2" in errors
+    assert refresher.stats_summary()["192.168.1.2"]["timeouts"] == 1
+
+    # the pending request is not sent again while it is still in flight
+    refresher.refresh()
+    assert calls.count("192.168.1.2") == 1
+    release.set()
+
+
+def test_late_answer_is_used_by_next_refresh(groups):
+    release = threading.Event()
+
+    def fetch(tags, ip):
+        if ip == "192.168.1.2":
+            release.wait(5)
+        return [0.5] * len(tags)
+
+    refresher = CacheRefresher(groups, fetch, 2, 0.1)
+    received, errors = refresher.refresh()
+    assert "T2" not in received
+    assert "192.168.1.2" in errors
+
+    release.set()
+    time.sleep(0.1)
+    received, errors = refresher.refresh()
+
+    assert received == {"T2": 0.5, "V2": 0.5, "T3": 0.5}
+    assert errors == {}
+
+
+def test_timeout_counts_from_the_request(groups):
+    def fetch(tags, ip):
+        time.sleep(0.15)
+        return [0.5] * len(tags)
+
+    # With one worker the second target waits for the first, so it answers after 0.3 seconds,
+    # but within its own timeout
+    refresher = CacheRefresher(groups, fetch, 1, 0.25)
+    received, errors = refresher.refresh()
+
+    assert received == {"T2": 0.5, "V2": 0.5, "T3": 0.5}
+    assert errors == {}
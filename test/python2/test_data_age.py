@@ -0,0 +1,58 @@
+import json
+import sys
+
+import pytest
+
+from dhalsim.python2.data_age import DataAge
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def data_age():
+    return DataAge({'T0': 'PLC1', 'T1': 'PLC1', 'T2': 'PLC2'})
+
+
+def test_age_in_seconds_and_iterations(data_age):
+    data_age.iteration = 10
+    data_age.receive(['T0', 'T2'], now=100.0)
+    data_age.iteration = 13
+
+    assert data_age.age('T0', now=100.5) == (0.5, 3)
+    assert data_age.age('T1') == (None, None)
+
+
+def test_use_records_per_tag_and_per_plc(data_age):
+    data_age.iteration = 1
+    data_age.receive(['T0', 'T1'], now=100.0)
+    data_age.iteration = 2
+    data_age.use('T0', now=100.015)
+    data_age.use('T1', now=130.0)
+    data_age.use('T2', now=130.0)
+    data_age.use('P_RAW1', now=130.0)
+
+    result = data_age.as_dict()
+    tag = result['tags']['T0']
+    assert tag['plc'] == 'PLC1'
+    assert tag['seconds']['count'] == 1
+    assert tag['seconds']['buckets']['<=0.02'] == 1
+    assert tag['iterations']['buckets']['<=1'] == 1
+
+    plc = result['plcs']['PLC1']
+    assert plc['seconds']['count'] == 2
+    assert plc['seconds']['buckets']['<=60.0'] == 1
+    assert result['plcs']['PLC2']['never_received'] == 1
+
+
+def test_write(data_age, tmpdir):
+    data_age.receive(['T2'])
+    data_age.use('T2')
+    path = tmpdir.join("data_age_PLC3.json")
+
+    data_age.write(path)
+
+    with path.open() as metrics:
+        assert json.load(metrics)['tags']['T2']['seconds']['count'] == 1
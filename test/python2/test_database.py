@@ -0,0 +1,84 @@
+import sqlite3
+import sys
+import threading
+
+import pytest
+from mock import call
+
+from dhalsim.python2 import database
+from dhalsim.python2.database import Contention, connect, enable_wal, set_busy_timeout, \
+    shared_connection, temp_parent
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def db_path(tmpdir):
+    return str(tmpdir.join("dhalsim.sqlite"))
+
+
+def test_enable_wal(db_path):
+    enable_wal(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_connect_pragmas(db_path):
+    conn = connect(db_path)
+
+    # NORMAL
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == database.BUSY_TIMEOUT * 1000
+
+
+def test_shared_connection_per_process(db_path, tmpdir, mocker):
+    conn = shared_connection(db_path)
+    assert shared_connection(db_path) is conn
+    assert shared_connection(str(tmpdir.join("other.sqlite"))) is not conn
+
+    mocker.patch("os.getpid", return_value=-1)
+    assert shared_connection(db_path) is not conn
+
+
+def test_set_busy_timeout(db_path):
+    set_busy_timeout(db_path, database.WRITER_BUSY_TIMEOUT)
+
+    conn = shared_connection(db_path)
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == \
+        database.WRITER_BUSY_TIMEOUT * 1000
+
+
+def test_shared_connection_per_thread(db_path):
+    conn = shared_connection(db_path)
+    other = []
+    thread = threading.Thread(target=lambda: other.append(shared_connection(db_path)))
+    thread.start()
+    thread.join()
+
+    assert other[0] is not conn
+
+
+def test_backoff_grows_until_cap(mocker):
+    uniform = mocker.patch("random.uniform", return_value=0.25)
+    contention = Contention()
+
+    assert [contention.backoff(attempt) for attempt in (0, 1, 2, 10)] == [0.25] * 4
+    uniform.assert_has_calls([call(0, database.BACKOFF_BASE),
+                              call(0, database.BACKOFF_BASE * 2),
+                              call(0, database.BACKOFF_BASE * 4),
+                              call(0, database.BACKOFF_CAP)])
+    contention.failed()
+    assert contention.as_dict() == {'retries': 4, 'failures': 1, 'waited': 1.0}
+
+
+def test_temp_parent(mocker):
+    mocker.patch("os.path.isdir", return_value=True)
+    access = mocker.patch("os.access", return_value=True)
+    assert temp_parent() == "/dev/shm"
+
+    access.return_value = False
+    assert temp_parent() is None
@@ -0,0 +1,115 @@
+import struct
+import sys
+
+import pytest
+from mock import MagicMock
+
+from dhalsim.python2.enip_client import EnipClient, EnipError, LatencyHistogram, \
+    multiple_service_request, pack_requests, parse_address, parse_multiple_reply, \
+    parse_read_reply, read_tag_request, symbolic_path, tag_name, CIP_REAL, READ_TAG, \
+    MULTIPLE_SERVICE_PACKET
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+def read_reply(value):
+    return struct.pack('<BBBBHf', READ_TAG | 0x80, 0, 0, 0, CIP_REAL, value)
+
+
+def multiple_reply(replies):
+    offsets = []
+    offset = 2 + 2 * len(replies)
+    for reply in replies:
+        offsets.append(offset)
+        offset += len(reply)
+    return struct.pack('<BBBBH', MULTIPLE_SERVICE_PACKET | 0x80, 0, 0, 0, len(replies)) + \
+        struct.pack('<%dH' % len(offsets), *offsets) + b''.join(replies)
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("192.168.1.1", ("192.168.1.1", 44818)),
+    ("127.0.0.1:44900", ("127.0.0.1", 44900)),
+])
+def test_parse_address(address, expected):
+    assert parse_address(address) == expected
+
+
+def test_tag_name():
+    assert tag_name("T0") == "T0:1"
+    assert tag_name(("T0", 1)) == "T0:1"
+
+
+def test_symbolic_path_padding():
+    assert symbolic_path("T0:1") == b'\x91\x04T0:1'
+    assert symbolic_path("T0:") == b'\x91\x03T0:\x00'
+
+
+def test_read_tag_request():
+    assert read_tag_request("T0:1") == b'\x4c\x03\x91\x04T0:1\x01\x00'
+
+
+def test_multiple_service_round_trip():
+    requests = [read_tag_request("T0:1"), read_tag_request("P_RAW1:1")]
+    request = multiple_service_request(requests)
+    # service, path size, path to the message router, count and offsets
+    assert request[:6] == b'\x0a\x02\x20\x02\x24\x01'
+    assert struct.unpack('<HHH', request[6:12]) == (2, 6, 6 + len(requests[0]))
+
+    replies = parse_multiple_reply(multiple_reply([read_reply(0.5), read_reply(1.0)]))
+    assert [parse_read_reply(reply) for reply in replies] == [0.5, 1.0]
+
+
+def test_error_status():
+    with pytest.raises(EnipError):
+        parse_read_reply(struct.pack('<BBBB', READ_TAG | 0x80, 0, 0x05, 0))
+
+
+def test_pack_requests():
+    requests = [read_tag_request("TANK_{0:03d}:1".format(i)) for i in range(50)]
+    groups = pack_requests(requests)
+
+    assert len(groups) > 1
+    assert sum(len(group) for group in groups) == 50
+    assert all(sum(len(request) + 2 for request in group) <= 400 for group in groups)
+
+
+def test_read_tags_pipelines_groups():
+    client = EnipClient()
+    session = MagicMock()
+    client.sessions["192.168.1.2"] = session
+
+    tags = [("TANK_{0:03d}".format(i), 1) for i in range(50)]
+    groups = pack_requests([read_tag_request(tag_name(tag)) for tag in tags])
+    session.transact.return_value = [
+        multiple_reply([read_reply(float(i)) for i in range(len(group))]) for group in groups]
+
+    values = client.read_tags("192.168.1.2", tags)
+
+    assert session.transact.call_count == 1
+    assert len(session.transact.call_args[0][0]) == len(groups)
+    assert len(values) == 50
+
+
+def test_set_timeout_per_server():
+    client = EnipClient(1.0)
+    client.set_timeout("192.168.1.2", 0.2)
+
+    assert client.session("192.168.1.2").timeout == 0.2
+    assert client.session("192.168.1.3").timeout == 1.0
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    histogram.record(0.0005)
+    histogram.record(0.015)
+    histogram.record(10)
+
+    stats = histogram.as_dict()
+    assert stats['count'] == 3
+    assert stats['max'] == 10
+    assert stats['buckets']['<=0.001'] == 1
+    assert stats['buckets']['<=0.02'] == 1
+    assert stats['buckets']['>5.0'] == 1
@@ -0,0 +1,83 @@
+import struct
+import sys
+
+import pytest
+
+from dhalsim.python2.enip_client import EnipClient, EnipError, read_tag_request, \
+    write_tag_request, multiple_service_request, unconnected_send, parse_read_reply, \
+    parse_multiple_reply, parse_reply, WRITE_TAG
+from dhalsim.python2.enip_server import EnipServer, TagTable, handle_cip
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def table():
+    return TagTable([("T0", 1), ("P_RAW1", 1)], [0.5, 1])
+
+
+@pytest.fixture
+def server(table):
+    server = EnipServer("127.0.0.1:0", table)
+    server.start()
+    yield server
+    server.stop()
+
+
+def address(server):
+    return "127.0.0.1:{port}".format(port=server.server_address[1])
+
+
+def test_tag_table(table):
+    assert table.snapshot() == {"T0:1": 0.5, "P_RAW1:1": 1.0}
+
+    table.update([("T0", 1)], [0.75])
+    assert table.get("T0:1") == 0.75
+
+    with pytest.raises(KeyError):
+        table.set("T2:1", 1)
+
+
+def test_read_tag(table):
+    assert parse_read_reply(handle_cip(table, read_tag_request("T0:1"))) == 0.5
+    assert parse_read_reply(handle_cip(table, unconnected_send(read_tag_request("T0:1")))) == 0.5
+
+
+def test_unknown_tag(table):
+    reply = handle_cip(table, read_tag_request("T2:1"))
+    assert struct.unpack('<B', reply[2:3])[0] == 0x05
+
+
+def test_write_tag(table):
+    parse_reply(handle_cip(table, write_tag_request("P_RAW1:1", 0)), WRITE_TAG)
+    assert table.get("P_RAW1:1") == 0.0
+
+
+def test_multiple_service_packet(table):
+    request = multiple_service_request([read_tag_request("T0:1"), read_tag_request("P_RAW1:1")])
+    replies = parse_multiple_reply(handle_cip(table, request))
+    assert [parse_read_reply(reply) for reply in replies] == [0.5, 1.0]
+
+
+def test_multiple_service_packet_error(table):
+    request = multiple_service_request([read_tag_request("T0:1"), read_tag_request("T2:1")])
+    with pytest.raises(EnipError):
+        parse_multiple_reply(handle_cip(table, request))
+
+
+def test_client_round_trip(server, table):
+    client = EnipClient()
+    assert client.read_tags(address(server), [("T0", 1), ("P_RAW1", 1)]) == [0.5, 1.0]
+
+    table.update([("T0", 1)], [0.25])
+    assert client.read_tag(address(server), ("T0", 1)) == 0.25
+
+    client.write_tags(address(server), [("P_RAW1", 1)], [0])
+    assert table.get("P_RAW1:1") == 0.0
+
+    # every request used the same session
+    assert client.stats()[address(server)]['connects'] == 1
+    client.close()
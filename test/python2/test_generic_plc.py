@@ -1,5 +1,6 @@
 import sys
 from decimal import Decimal
+from threading import Lock as RealLock
 
 import pytest
 import pytest_mock
@@ -18,6 +19,8 @@ def magic_mock_network():
     mock.get.return_value = u'42'
     mock.set.return_value = u'42'
     mock.receive.return_value = u'0.15'
+    mock.tag_io.get.return_value = u'42'
+    mock.tag_io.set.return_value = True
     # database
     mock.get_sync.return_value = 0
     mock.set_sync.return_value = None
@@ -76,6 +79,8 @@ def yaml_file(tmpdir):
 
 
 def patch_methods(magic_mock_init, magic_mock_preloop, magic_mock_network, mocker):
+    # The cache update thread would keep running after the test
+    mocker.patch('thread.start_new_thread')
     # Init mocker patches
     mocker.patch(
         'dhalsim.python2.generic_plc.GenericPLC.initialize_db',
@@ -111,6 +116,10 @@ def patch_methods(magic_mock_init, magic_mock_preloop, magic_mock_network, mocke
         'dhalsim.python2.generic_plc.GenericPLC.receive',
         magic_mock_network.receive
     )
+    mocker.patch(
+        'dhalsim.python2.generic_plc.TagIO',
+        return_value=magic_mock_network.tag_io
+    )
     mocker.patch(
         'dhalsim.python2.generic_plc.GenericPLC.get_sync',
         magic_mock_network.get_sync
@@ -163,7 +172,7 @@ def test_generic_plc1_init(generic_plc1, magic_mock_init, yaml_file):
     expected_calls = [call.initialize_db(),
                       call.do_super_construction(
                           {'server': {'tags': (('T0', 1, 'REAL'), ('T2', 1, 'REAL'), ('P_RAW1', 1, 'REAL')),
-                                      'address': '192.168.1.1'}, 'name': 'enip', 'mode': 1},
+                                      'address': '192.168.1.1'}, 'name': 'enip', 'mode': 0},
                           {'path': '/home/test/dhalsim.sqlite', 'name': 'plant'})]
     assert magic_mock_init.mock_calls == expected_calls
 
@@ -192,7 +201,7 @@ def test_generic_plc2_init(generic_plc2, magic_mock_init, yaml_file):
     # Assert proper function calls
     expected_calls = [call.initialize_db(),
                       call.do_super_construction({'server': {'tags': (('T2', 1, 'REAL'), ('V_ER2i', 1, 'REAL')),
-                                                             'address': '192.168.1.2'}, 'name': 'enip', 'mode': 1},
+                                                             'address': '192.168.1.2'}, 'name': 'enip', 'mode': 0},
                                                  {'path': '/home/test/dhalsim.sqlite', 'name': 'plant'})]
     assert magic_mock_init.mock_calls == expected_calls
 
@@ -228,20 +237,37 @@ def test_generic_plc2_preloop(generic_plc2, magic_mock_preloop, magic_mock_netwo
 
 
 def test_generic_plc1_mainloop(generic_plc1, magic_mock_network):
+    # threading.Lock is mocked for the pre loop
+    generic_plc1.data_age.lock = RealLock()
     generic_plc1.main_loop(test_break=True)
     # Verify network function calls (applying control rule)
+    # T2 is answered from the cache, the clock is read for the age of the cached value
     expected_network_calls = [call.get_sync(),
-                              call.receive(('T2', 1), '192.168.1.2'),
-                              call.set(('P_RAW1', 1), 1),
+                              call.tag_io.refresh(),
+                              call.tag_io.master_time(),
+                              call.tag_io.set('P_RAW1', 1),
                               call.set_sync(1)]
     assert magic_mock_network.mock_calls == expected_network_calls
 
 
+def test_closed_barrier_shuts_plc_down(generic_plc1, magic_mock_network, mocker):
+    # The error class of the module the PLC imported the barrier as
+    from dhalsim.python2 import generic_plc
+    magic_mock_network.get_sync.side_effect = generic_plc.BarrierError("Connection closed")
+    sigint_handler = mocker.patch.object(GenericPLC, 'sigint_handler')
+
+    generic_plc1.main_loop(test_break=True)
+
+    assert sigint_handler.call_count == 1
+    assert magic_mock_network.set_sync.call_count == 0
+
+
 def test_generic_plc2_mainloop(generic_plc2, magic_mock_network):
     generic_plc2.main_loop(test_break=True)
     # Verify network function calls (applying control rule)
     expected_network_calls = [call.get_sync(),
-                              call.get(('T2', 1)),
-                              call.set(('V_ER2i', 1), 0),
+                              call.tag_io.refresh(),
+                              call.tag_io.get('T2'),
+                              call.tag_io.set('V_ER2i', 0),
                               call.set_sync(1)]
     assert magic_mock_network.mock_calls == expected_network_calls
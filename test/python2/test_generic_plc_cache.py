@@ -1,4 +1,5 @@
 import sys
+from decimal import Decimal
 from pathlib import Path
 
 import pytest
@@ -15,6 +16,7 @@ def magic_mock_network():
     mock.get.return_value = u'42'
     mock.set.return_value = u'42'
     mock.receive.return_value = u'0.15'
+    mock.tag_io.set.return_value = True
     # database
     mock.get_sync.return_value = 0
     mock.set_sync.return_value = None
@@ -69,6 +71,8 @@ def yaml_file(tmpdir):
 
 
 def patch_methods(magic_mock_init, magic_mock_network, mocker):
+    # The cache update thread would keep running after the test
+    mocker.patch('thread.start_new_thread')
     # Init mocker patches
     mocker.patch(
         'dhalsim.python2.generic_plc.GenericPLC.initialize_db',
@@ -91,6 +95,10 @@ def patch_methods(magic_mock_init, magic_mock_network, mocker):
         'dhalsim.python2.generic_plc.GenericPLC.receive',
         magic_mock_network.receive
     )
+    mocker.patch(
+        'dhalsim.python2.generic_plc.TagIO',
+        return_value=magic_mock_network.tag_io
+    )
     mocker.patch(
         'dhalsim.python2.generic_plc.GenericPLC.get_sync',
         magic_mock_network.get_sync
@@ -115,9 +123,34 @@ def test_python_version():
 def test_generic_plc1_cache(generic_plc1, magic_mock_network):
     generic_plc1.main_loop(test_break=True)
     # Verify network function calls (applying control rule)
+    # T2 is answered from the cache, and only the last of the conflicting controls is written
     expected_network_calls = [call.get_sync(),
-                              call.receive(('T2', 1), '192.168.1.2'),  # Only called once
-                              call.set(('P_RAW1', 1), 1),
-                              call.set(('P_RAW1', 1), 0),
+                              call.tag_io.refresh(),
+                              call.tag_io.master_time(),
+                              call.tag_io.set('P_RAW1', 0),
                               call.set_sync(1)]
     assert magic_mock_network.mock_calls == expected_network_calls
+
+
+@pytest.fixture
+def subscriptions(mocker, generic_plc1):
+    subscriptions = mocker.MagicMock()
+    subscriptions.__contains__.return_value = True
+    generic_plc1.subscriptions = subscriptions
+    return subscriptions
+
+
+def test_subscribed_tag_without_update_is_read_from_owner(generic_plc1, magic_mock_network,
+                                                          subscriptions):
+    subscriptions.get.side_effect = KeyError('T2')
+
+    assert generic_plc1.get_tag('T2') == Decimal('0.15')
+    magic_mock_network.receive.assert_called_once_with(('T2', 1), '192.168.1.2')
+    assert generic_plc1.cache['T2'] == Decimal('0.15')
+
+
+def test_subscribed_tag_uses_pushed_value(generic_plc1, magic_mock_network, subscriptions):
+    subscriptions.get.return_value = 0.3
+
+    assert generic_plc1.get_tag('T2') == Decimal(0.3)
+    magic_mock_network.receive.assert_not_called()
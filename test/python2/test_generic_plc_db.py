@@ -10,7 +10,7 @@ def patched_plc(mocker):
     sleeper = mocker.patch("time.sleep", return_value=None)
     mocker.patch.object(GenericPLC, "__init__", return_value=None)
     mocker.patch.object(GenericPLC, "DB_TRIES", 3)
-    mocker.patch.object(GenericPLC, "DB_SLEEP_TIME", 1.5)
+    mocker.patch("random.uniform", return_value=1.5)
     cur_mock = mocker.Mock()
     conn_mock = mocker.Mock()
     logger_mock = mocker.Mock()
@@ -19,6 +19,9 @@ def patched_plc(mocker):
     plc.cur = cur_mock
     plc.conn = conn_mock
     plc.logger = logger_mock
+    plc.barrier = None
+    plc.shared_state = None
+    plc.sync_trace = None
     plc.intermediate_plc = {
         'name': 'patched_plc'
     }
@@ -260,3 +263,15 @@ def test_set_attack_flag_fail_all(patched_plc):
 
     sleeper.assert_has_calls([call(1.5),call(1.5),call(1.5)])
     assert sleeper.call_count == 3
+
+
+def test_sync_is_traced(patched_plc, mocker):
+    plc, cur_mock, conn_mock, logger_mock, sleeper = patched_plc
+    plc.sync_trace = mocker.Mock(pending=False)
+
+    cur_mock.fetchone.return_value = [0]
+    assert not plc.get_sync()
+    plc.sync_trace.released.assert_called_once_with()
+
+    plc.set_sync(1)
+    plc.sync_trace.done.assert_called_once_with()
@@ -10,6 +10,7 @@ from mock import MagicMock, call
 from pathlib import Path
 
 from dhalsim.python2.generic_scada import GenericScada
+from dhalsim.python2.timeseries import TimeSeriesStore
 
 
 @pytest.fixture
@@ -91,6 +92,10 @@ def yaml_scada_file(tmpdir):
 
 def patch_methods(magic_mock_scada_init, magic_mock_scada_preloop, magic_mock_scada_clock, magic_mock_scada_network,
                   mocker):
+    # The poller threads would keep running after the test, the tests poll themselves
+    mocker.patch('dhalsim.python2.scada_poller.PlcPoller.start')
+    # The historian would write to the output path
+    mocker.patch('dhalsim.python2.historian.Historian.start')
     # Init mocker patches
     mocker.patch(
         'dhalsim.python2.generic_scada.GenericScada.initialize_db',
@@ -154,10 +159,12 @@ def test_generic_scada_init(generic_scada, magic_mock_scada_init, yaml_scada_fil
     assert generic_scada.plc_data == OrderedDict([('192.168.1.1', [('T0', 1), ('P_RAW1', 1)]),
                                                   ('192.168.1.2', [('T2', 1), ('V_ER2i', 1)])])
     # Assert scada initial cache
-    assert generic_scada.cache == {'192.168.1.1': [0, 0],
-                                   '192.168.1.2': [0, 0]}
-    # Assert plc saved values generation
-    assert generic_scada.saved_values == [['iteration', 'timestamp', 'T0', 'P_RAW1', 'T2', 'V_ER2i']]
+    assert list(generic_scada.pollers) == ['192.168.1.1', '192.168.1.2']
+    assert [poller.latest() for poller in generic_scada.pollers.values()] == [([0, 0], None),
+                                                                               ([0, 0], None)]
+    # Assert historian header generation
+    assert generic_scada.historian.header == ['iteration', 'timestamp', 'T0', 'P_RAW1', 'T2', 'V_ER2i']
+    assert len(generic_scada.historian.tail) == 0
     # Assert proper function calls
     expected_calls = [call.initialize_db(), call.touch(exist_ok=True),
                       call.do_super_construction({'server': {
@@ -175,11 +182,17 @@ def test_generic_scada_preloop(generic_scada, magic_mock_scada_preloop):
     assert magic_mock_scada_preloop.mock_calls == expected_calls
 
 
+def poll_plcs(generic_scada):
+    for poller in generic_scada.pollers.values():
+        poller.poll()
+
+
 def test_generic_scada_mainloop(generic_scada, magic_mock_scada_network, magic_mock_scada_clock, yaml_scada_file):
+    poll_plcs(generic_scada)
     generic_scada.main_loop(test_break=True)
-    # Assert saved_values has been properly modified
-    assert generic_scada.saved_values == [['iteration', 'timestamp', 'T0', 'P_RAW1', 'T2', 'V_ER2i'],
-                                          [2, generic_scada.saved_values[1][1], '0.350420', '0', '0.420420', '1']]
+    # Assert the row has been recorded
+    rows = list(generic_scada.historian.tail)
+    assert rows == [[2, rows[0][1], '0.420420', '1', '0.350420', '0']]
     # Assert proper function calls
     expected_network_calls = sorted([call.get_sync(),
                                      call.receive_multiple([('T0', 1), ('P_RAW1', 1)], '192.168.1.1'),
@@ -190,13 +203,73 @@ def test_generic_scada_mainloop(generic_scada, magic_mock_scada_network, magic_m
     assert magic_mock_scada_clock.mock_calls == expected_clock_calls
 
 
+def test_closed_barrier_shuts_scada_down(generic_scada, magic_mock_scada_network, mocker):
+    from dhalsim.python2 import generic_scada as generic_scada_module
+    magic_mock_scada_network.get_sync.side_effect = \
+        generic_scada_module.BarrierError("Connection closed")
+    sigint_handler = mocker.patch.object(GenericScada, 'sigint_handler')
+
+    generic_scada.main_loop(test_break=True)
+
+    assert sigint_handler.call_count == 1
+    assert magic_mock_scada_network.set_sync.call_count == 0
+
+
 def test_generic_scada_cache(generic_scada, magic_mock_scada_network, magic_mock_scada_clock, yaml_scada_file):
-    generic_scada.main_loop(test_break=True)  # Both values are fine
-    generic_scada.main_loop(test_break=True)  # Both values throw exceptions
-    generic_scada.main_loop(test_break=True)  # Only First call throws exception
-
-    # Assert saved_values has been properly modified (expect it to re-use old values)
-    assert generic_scada.saved_values == [['iteration', 'timestamp', 'T0', 'P_RAW1', 'T2', 'V_ER2i'],
-                                          [2, generic_scada.saved_values[1][1], '0.350420', '0', '0.420420', '1'],
-                                          [2, generic_scada.saved_values[2][1], '0.350420', '0', '0.420420', '1'],
-                                          [2, generic_scada.saved_values[3][1], '0.350420', '0', '100', '100']]
+    for _ in range(3):
+        # Both values are fine, then both throw exceptions, then only the second one does
+        poll_plcs(generic_scada)
+        generic_scada.main_loop(test_break=True)
+
+    # Assert the rows have been recorded (expect it to re-use old values)
+    rows = list(generic_scada.historian.tail)
+    assert rows == [[2, rows[0][1], '0.420420', '1', '0.350420', '0'],
+                    [2, rows[1][1], '0.420420', '1', '0.350420', '0'],
+                    [2, rows[2][1], '100', '100', '0.350420', '0']]
+    assert generic_scada.pollers['192.168.1.2'].consecutive_failures == 2
+
+
+def test_generic_scada_polling_settings(generic_scada):
+    generic_scada.intermediate_yaml['scada_polling'] = {'interval': 0.5, 'timeout': 0.3,
+                                                        'backoff': 2.0, 'max_backoff': 10.0}
+    plc = {'name': 'PLC1', 'scada_polling': {'interval': 5.0}}
+
+    assert generic_scada.polling_settings(plc) == {'interval': 5.0, 'timeout': 0.3,
+                                                   'backoff': 2.0, 'max_backoff': 10.0}
+    assert generic_scada.polling_settings({'name': 'PLC2'})['interval'] == 0.5
+
+
+def test_generic_scada_observer(generic_scada, magic_mock_scada_network, magic_mock_scada_clock):
+    generic_scada.observer = True
+    magic_mock_scada_clock.get_master_clock.side_effect = [0, 0, 1, 1, 4]
+    poll_plcs(generic_scada)
+
+    generic_scada.main_loop(test_break=True)  # Records the first iteration
+    generic_scada.main_loop(test_break=True)  # Waits until the clock moves
+    generic_scada.main_loop(test_break=True)  # Skips iterations 2 and 3
+
+    rows = list(generic_scada.historian.tail)
+    assert [row[0] for row in rows] == [0, 1, 4]
+    assert generic_scada.missed_iterations == 2
+    assert generic_scada.plcs_ready
+    # The observer does not take part in the sync
+    magic_mock_scada_network.get_sync.assert_not_called()
+    magic_mock_scada_network.set_sync.assert_not_called()
+
+
+def test_generic_scada_timeseries(generic_scada, magic_mock_scada_clock):
+    generic_scada.timeseries = TimeSeriesStore(generic_scada.historian.header[2:])
+    poll_plcs(generic_scada)
+
+    generic_scada.main_loop(test_break=True)
+
+    assert generic_scada.timeseries.query({'query': 'points', 'tag': 'T2'}) == [[2, 0.35042]]
+
+
+def test_generic_scada_data_age(generic_scada, magic_mock_scada_clock):
+    poll_plcs(generic_scada)
+    generic_scada.main_loop(test_break=True)
+
+    result = generic_scada.data_age.as_dict()
+    assert result['tags']['T2']['plc'] == 'PLC2'
+    assert result['plcs']['PLC1']['seconds']['count'] == 2
@@ -10,7 +10,7 @@ def patched_scada(mocker):
     sleeper = mocker.patch("time.sleep", return_value=None)
     mocker.patch.object(GenericScada, "__init__", return_value=None)
     mocker.patch.object(GenericScada, "DB_TRIES", 3)
-    mocker.patch.object(GenericScada, "DB_SLEEP_TIME", 1.5)
+    mocker.patch("random.uniform", return_value=1.5)
     cur_mock = mocker.Mock()
     conn_mock = mocker.Mock()
     logger_mock = mocker.Mock()
@@ -19,6 +19,9 @@ def patched_scada(mocker):
     scada.cur = cur_mock
     scada.conn = conn_mock
     scada.logger = logger_mock
+    scada.barrier = None
+    scada.shared_state = None
+    scada.sync_trace = None
 
     return scada, cur_mock, conn_mock, logger_mock, sleeper
 
@@ -0,0 +1,85 @@
+import csv
+import gzip
+import sys
+import time
+
+import pytest
+from pathlib import Path
+
+from dhalsim.python2.historian import Historian
+
+HEADER = ['iteration', 'timestamp', 'T0']
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+def read_csv(path, opener=open):
+    with opener(str(path), 'rb') as file:
+        return list(csv.reader(file))
+
+
+@pytest.fixture
+def output(tmpdir):
+    return Path(str(tmpdir)) / "scada_values.csv"
+
+
+def test_rows_are_appended(output):
+    historian = Historian(output, HEADER, flush_interval=0.01)
+    historian.start()
+    for iteration in range(3):
+        historian.record([iteration, "now", 0.5])
+    historian.close()
+
+    assert read_csv(output) == [HEADER, ['0', 'now', '0.5'], ['1', 'now', '0.5'],
+                                ['2', 'now', '0.5']]
+    assert historian.stats()['rows_written'] == 3
+
+
+def test_tail_is_bounded(output):
+    historian = Historian(output, HEADER, tail=2)
+    for iteration in range(5):
+        historian.record([iteration, "now", 0.5])
+
+    assert [row[0] for row in historian.tail] == [3, 4]
+
+
+def test_flush_writes_rows_to_the_file(output):
+    historian = Historian(output, HEADER, flush_interval=60)
+    historian.start()
+    historian.record([0, "now", 0.5])
+    historian.flush()
+
+    deadline = time.time() + 2
+    while (not output.exists() or len(read_csv(output)) < 2) and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert read_csv(output) == [HEADER, ['0', 'now', '0.5']]
+    historian.close()
+
+
+@pytest.mark.parametrize("compress, opener", [(False, open), (True, gzip.open)])
+def test_rotation_on_size(output, compress, opener):
+    historian = Historian(output, HEADER, max_bytes=40, compress=compress)
+    historian.start()
+    for iteration in range(6):
+        historian.record([iteration, "now", 0.5])
+    historian.close()
+
+    rotated = [historian.rotated_path(number) for number in range(1, historian.rotations + 1)]
+    # Every file holds the header and two rows
+    assert historian.rotations == 3
+    assert all(path.exists() for path in rotated)
+    assert rotated[0].name == ("scada_values.1.csv.gz" if compress else "scada_values.1.csv")
+
+    rows = []
+    for path in rotated:
+        content = read_csv(path, opener)
+        assert content[0] == HEADER
+        rows.extend(content[1:])
+    content = read_csv(output)
+    assert content[0] == HEADER
+    rows.extend(content[1:])
+    assert [row[0] for row in rows] == [str(iteration) for iteration in range(6)]
@@ -0,0 +1,107 @@
+import sqlite3
+import sys
+import threading
+
+from mock import MagicMock
+
+from dhalsim.python2.database import enable_wal
+from dhalsim.python2.generic_plc import GenericPLC
+from dhalsim.python2.plc_host import HostedPLC, PlcHost, assign_local_addresses, shard_indexes
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+def test_assign_local_addresses():
+    data = {'plcs': [{'name': 'PLC1'}, {'name': 'PLC2'}]}
+    assign_local_addresses(data, 44900)
+
+    assert data['plcs'][0]['local_ip'] == "127.0.0.1:44900"
+    assert data['plcs'][1]['public_ip'] == "127.0.0.1:44901"
+    assert data['scada']['local_ip'] == "127.0.0.1"
+
+
+def test_shard_indexes():
+    shards = [shard_indexes(500, shard, 3) for shard in range(3)]
+
+    assert sorted(sum(shards, [])) == list(range(500))
+    assert shards[1][:3] == [1, 4, 7]
+
+
+def test_shard_indexes_more_shards_than_plcs():
+    assert shard_indexes(2, 3, 4) == []
+
+
+def test_hosted_plc_registers_without_signals(mocker):
+    mocker.patch.object(GenericPLC, "__init__", return_value=None)
+    start_serving = mocker.patch.object(GenericPLC, "start_serving")
+    signal_mock = mocker.patch("dhalsim.python2.basePLC.signal.signal")
+    host = MagicMock()
+
+    plc = HostedPLC(host, None, 0, {})
+    plc.startup()
+
+    host.register.assert_called_once_with(plc)
+    start_serving.assert_called_once_with()
+    signal_mock.assert_not_called()
+
+
+def test_terminate_shuts_down_all_plcs(mocker):
+    mocker.patch.object(PlcHost, "__init__", return_value=None)
+    host = PlcHost(None)
+    host.logger = MagicMock()
+    host.plcs = []
+    host.plcs_lock = MagicMock()
+
+    failing, working = MagicMock(), MagicMock()
+    failing.shutdown.side_effect = OSError("closed")
+    host.register(failing)
+    host.register(working)
+
+    host.terminate()
+
+    working.shutdown.assert_called_once_with()
+    assert host.logger.error.call_count == 1
+
+
+def test_hosted_plcs_commit_concurrently(mocker, tmpdir):
+    db_path = str(tmpdir.join("dhalsim.sqlite"))
+    names = ["PLC{i}".format(i=i) for i in range(16)]
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE sync (name TEXT NOT NULL, flag INT NOT NULL, PRIMARY KEY (name));")
+    conn.executemany("INSERT INTO sync VALUES (?, 0);", [(name,) for name in names])
+    conn.commit()
+    conn.close()
+    enable_wal(db_path)
+
+    mocker.patch.object(GenericPLC, "__init__", return_value=None)
+    errors = []
+
+    def run(name):
+        plc = HostedPLC(MagicMock(), None, 0, {})
+        plc.intermediate_yaml = {'db_path': db_path}
+        plc.intermediate_plc = {'name': name}
+        plc.barrier = None
+        plc.sync_trace = None
+        plc.logger = MagicMock()
+        # Every PLC of a host runs in its own thread, and commits its own updates
+        try:
+            plc.initialize_db()
+            for _ in range(50):
+                plc.set_sync(0)
+                plc.set_sync(1)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT count(*) FROM sync WHERE flag = 1").fetchone()[0] == len(names)
+    conn.close()
@@ -0,0 +1,50 @@
+import sys
+
+import pytest
+
+from dhalsim.python2.publishing import DeadbandPublisher
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def publisher():
+    return DeadbandPublisher(["T0", "T2"], ["P_RAW1"], deadband=0.1,
+                             tag_deadbands={"T2": 0.5}, heartbeat=10)
+
+
+def test_first_publication_sends_everything(publisher):
+    assert publisher.heartbeat_due(0)
+    assert publisher.select([1.0, 2.0, 1.0], 0) == ([0, 1, 2], [1.0, 2.0, 1.0])
+
+
+def test_deadband(publisher):
+    publisher.select([1.0, 2.0, 1.0], 0)
+
+    assert publisher.select([1.05, 2.4, 1.0], 1) == ([], [])
+    assert publisher.select([1.2, 2.4, 1.0], 2) == ([0], [1.2])
+    # the deadband is relative to the last published value, not the last read value
+    assert publisher.select([1.25, 2.6, 0.0], 3) == ([1, 2], [2.6, 0.0])
+
+    assert publisher.stats() == {'publications': 3, 'tags_published': 6, 'tags_suppressed': 6}
+
+
+def test_heartbeat(publisher):
+    publisher.select([1.0, 2.0, 1.0], 0)
+    publisher.select([1.2, 2.0, 1.0], 5)
+
+    assert not publisher.heartbeat_due(9)
+    assert publisher.heartbeat_due(10)
+    assert publisher.select([1.2, 2.0, 1.0], 10) == ([1, 2], [2.0, 1.0])
+
+
+def test_noise_only_on_sensors():
+    publisher = DeadbandPublisher(["T0"], ["P_RAW1"], noise_scale=0.5)
+    indexes, values = publisher.select([1.0, 1.0], 0)
+
+    assert indexes == [0, 1]
+    assert values[0] != 1.0
+    assert values[1] == 1.0
@@ -0,0 +1,133 @@
+import sys
+from decimal import Decimal
+
+import pytest
+from mock import MagicMock, call
+
+from dhalsim.python2.entities.attack import TimeAttack, TriggerBelowAttack
+from dhalsim.python2.entities.control import AboveControl, BelowControl, TimeControl
+from dhalsim.python2.rule_table import RuleTable
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def plc():
+    mock = MagicMock()
+    mock.intermediate_plc = {"name": "PLC1"}
+    mock.get_master_clock.return_value = 10
+    mock.get_tag.side_effect = lambda tag: {"T0": Decimal("0.1"), "T2": Decimal("0.5")}[tag]
+    return mock
+
+
+@pytest.fixture
+def controls():
+    return [BelowControl("P_RAW1", "OPEN", "T0", 0.2),
+            AboveControl("P_RAW1", "CLOSED", "T2", 0.4),
+            AboveControl("V_ER2i", "CLOSED", "T0", 0.3),
+            TimeControl("V_ER2i", "OPEN", 10)]
+
+
+def test_grouping(controls):
+    attacks = [TriggerBelowAttack("attack", "P_RAW2", "closed", "T0", 0.2),
+               TimeAttack("time_attack", "P_RAW1", "open", 20, 40)]
+    table = RuleTable(controls, attacks)
+
+    assert table.dependants == ["T0", "T2"]
+    assert table.dependant_rules["T0"] == [0, 2, 4]
+    assert table.schedule == {10: [3]}
+    assert table.time_windows == [5]
+    assert table.uses_clock
+
+
+def test_no_clock_without_time_rules(plc):
+    table = RuleTable([BelowControl("P_RAW1", "OPEN", "T0", 0.2)], [])
+    table.scan(plc)
+
+    plc.get_master_clock.assert_not_called()
+    assert plc.get_tag.mock_calls == [call("T0")]
+
+
+def test_snapshot_read_once(plc):
+    table = RuleTable([BelowControl("P_RAW1", "OPEN", "T0", 0.2),
+                       BelowControl("P_RAW2", "OPEN", "T0", 0.2),
+                       TimeControl("P_RAW1", "CLOSED", 5),
+                       TimeControl("P_RAW2", "CLOSED", 6)], [])
+    table.scan(plc)
+
+    assert plc.get_master_clock.call_count == 1
+    assert plc.get_tag.mock_calls == [call("T0")]
+
+
+def test_last_rule_wins(plc, controls):
+    table = RuleTable(controls, [])
+    table.scan(plc)
+
+    assert plc.set_tag.mock_calls == [call("P_RAW1", "CLOSED"), call("V_ER2i", "OPEN")]
+
+
+def test_attack_overrides_control(plc, controls):
+    table = RuleTable(controls, [TimeAttack("attack", "V_ER2i", "closed", 5, 15)])
+    table.scan(plc)
+
+    assert plc.set_tag.mock_calls == [call("P_RAW1", "CLOSED"), call("V_ER2i", "closed")]
+    assert plc.set_attack_flag.mock_calls == [call(True, "attack")]
+
+
+def test_only_changes_written(plc, controls):
+    table = RuleTable(controls, [TimeAttack("attack", "V_ER2i", "closed", 5, 15)])
+    table.scan(plc)
+    plc.reset_mock()
+
+    table.scan(plc)
+    assert plc.set_tag.mock_calls == []
+    assert plc.set_attack_flag.mock_calls == []
+
+    plc.get_master_clock.return_value = 16
+    table.scan(plc)
+    assert plc.set_tag.mock_calls == []
+    assert plc.set_attack_flag.mock_calls == [call(False, "attack")]
+
+    # the control opens V_ER2i at 10, but the attack keeps it closed as it already is
+    plc.get_master_clock.return_value = 10
+    table.scan(plc)
+    assert plc.set_tag.mock_calls == []
+    assert plc.set_attack_flag.mock_calls == [call(False, "attack"), call(True, "attack")]
+
+
+def test_action_case_is_ignored(plc):
+    table = RuleTable([BelowControl("P_RAW1", "OPEN", "T0", 0.2)],
+                      [TriggerBelowAttack("attack", "P_RAW1", "open", "T0", 0.2)])
+    table.scan(plc)
+
+    assert plc.set_tag.mock_calls == [call("P_RAW1", "open")]
+    plc.reset_mock()
+
+    table.scan(plc)
+    assert plc.set_tag.mock_calls == []
+
+
+def test_slow_scan_fires_missed_time_controls():
+    table = RuleTable([TimeControl("P_RAW1", "OPEN", 2),
+                       TimeControl("P_RAW1", "CLOSED", 4),
+                       TimeControl("V_ER2i", "OPEN", 3),
+                       TimeControl("P_RAW2", "OPEN", 6)], [])
+
+    # The previous scan was at 0, this one at 5
+    fired = table.evaluate(5, {}, since=0)
+    assert fired == [False, True, True, False]
+
+
+def test_scan_remembers_last_time(plc):
+    table = RuleTable([TimeControl("P_RAW1", "OPEN", 7)], [])
+
+    plc.get_master_clock.return_value = 5
+    table.scan(plc)
+    plc.get_master_clock.return_value = 10
+    table.scan(plc)
+
+    assert table.last_time == 10
+    assert plc.set_tag.mock_calls == [call("P_RAW1", "OPEN")]
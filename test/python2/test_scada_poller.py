@@ -0,0 +1,85 @@
+import sys
+import threading
+import time
+
+import pytest
+from mock import MagicMock
+
+from dhalsim.python2.scada_poller import PlcPoller
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def poller():
+    fetch = MagicMock()
+    return PlcPoller("192.168.1.1", [('T0', 1), ('P_RAW1', 1)], fetch, 1.0, 2.0, 5.0)
+
+
+def test_poll_stores_values_with_time(poller):
+    poller.fetch.return_value = ['0.5', '1']
+
+    before = time.time()
+    assert poller.poll() == 1.0
+
+    values, received = poller.latest()
+    assert values == ['0.5', '1']
+    assert received >= before
+    poller.fetch.assert_called_once_with([('T0', 1), ('P_RAW1', 1)], "192.168.1.1")
+
+
+def test_failures_keep_values_and_back_off(poller):
+    poller.fetch.side_effect = [['0.5', '1'], Exception("timed out"), Exception("timed out"),
+                                Exception("timed out"), Exception("timed out")]
+    poller.poll()
+    received = poller.latest()[1]
+
+    assert [poller.poll() for _ in range(4)] == [2.0, 4.0, 5.0, 5.0]
+    assert poller.latest() == (['0.5', '1'], received)
+    assert poller.stats()['failures'] == 4
+
+
+def test_answer_resets_backoff(poller):
+    poller.fetch.side_effect = [Exception("timed out"), ['0.5', '1']]
+
+    assert poller.poll() == 2.0
+    assert poller.poll() == 1.0
+    assert poller.consecutive_failures == 0
+
+
+def test_first_failure_and_recovery_are_logged(poller):
+    poller.logger = MagicMock()
+    poller.fetch.side_effect = [Exception("timed out"), Exception("timed out"), ['0.5', '1']]
+
+    poller.poll()
+    poller.poll()
+    assert poller.logger.error.call_count == 1
+    assert "timed out" in poller.logger.error.call_args[0][0]
+
+    poller.poll()
+    assert poller.logger.info.call_count == 1
+    assert "after 2 failed polls" in poller.logger.info.call_args[0][0]
+
+
+def test_dead_plc_does_not_delay_other_plc():
+    blocked = threading.Event()
+
+    def dead(tags, ip):
+        blocked.wait(2)
+        raise Exception("timed out")
+
+    alive = MagicMock(return_value=['1'])
+    pollers = [PlcPoller("192.168.1.1", [('T0', 1)], dead, 0.01, 2.0, 1.0),
+               PlcPoller("192.168.1.2", [('T2', 1)], alive, 0.01, 2.0, 1.0)]
+    for poller in pollers:
+        poller.start()
+    time.sleep(0.2)
+    for poller in pollers:
+        poller.stop()
+    blocked.set()
+
+    assert pollers[0].latest() == ([0], None)
+    assert alive.call_count > 5
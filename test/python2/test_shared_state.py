@@ -0,0 +1,115 @@
+import struct
+import sys
+import threading
+
+import pytest
+
+from dhalsim.python2 import shared_state
+from dhalsim.python2.shared_state import SharedState, SharedStateError, plant_tags, \
+    format_value, open_plant_state
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def data(tmpdir):
+    return {'actuators': [{'name': 'P_RAW1', 'initial_state': 'open'},
+                          {'name': 'V_PUB', 'initial_state': 'closed'}],
+            'plcs': [{'name': 'PLC1', 'sensors': ['T0'], 'actuators': ['P_RAW1']},
+                     {'name': 'PLC2', 'sensors': ['T2', 'T0'], 'actuators': ['V_PUB']}],
+            'plant_state': 'shared_memory',
+            'plant_state_path': str(tmpdir.join("plant_state"))}
+
+
+@pytest.fixture
+def state(data):
+    SharedState.create(data['plant_state_path'], plant_tags(data), {'P_RAW1': '1'})
+    return open_plant_state(data)
+
+
+def test_plant_tags_in_table_order(data):
+    assert plant_tags(data) == ['P_RAW1', 'V_PUB', 'T0', 'T2']
+
+
+def test_open_plant_state_off_with_sqlite(data):
+    data['plant_state'] = 'sqlite'
+    assert open_plant_state(data) is None
+
+
+def test_initial_values(state):
+    assert state.get('P_RAW1') == "1"
+    assert state.get('V_PUB') == "0"
+    assert state.get('T0') == "0"
+    assert state.master_time() == 0
+
+
+def test_set_and_get(state, data):
+    assert state.set('T0', "0.53")
+    assert state.set('P_RAW1', 0)
+    state.set(shared_state.MASTER_TIME, 12)
+
+    other = open_plant_state(data)
+    assert other.get('T0') == "0.53"
+    assert int(other.get('P_RAW1')) == 0
+    assert other.master_time() == 12
+    assert state.stats() == {'reads': 0, 'writes': 3, 'retries': 0}
+
+
+def test_unknown_tag(state):
+    assert not state.set('J280', 3.0)
+    with pytest.raises(KeyError):
+        state.get('J280')
+
+
+def test_file_of_other_plant(data, state):
+    with pytest.raises(SharedStateError):
+        SharedState(data['plant_state_path'], ['T0'])
+
+
+def test_read_retries_while_written(state, mocker):
+    mocker.patch.object(shared_state, "MAX_RETRIES", 5)
+    offset = state.slots['T0']
+    struct.pack_into("<Q", state.map, offset, 3)
+
+    with pytest.raises(SharedStateError):
+        state.read('T0')
+    assert state.retries == 5
+
+    struct.pack_into("<Q", state.map, offset, 4)
+    assert state.read('T0') == 0.0
+
+
+def test_reads_during_writes_are_whole(state, data):
+    reader = open_plant_state(data)
+    stop = threading.Event()
+
+    def write():
+        value = 0
+        while not stop.is_set():
+            value += 1
+            state.set('T2', value)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        last = 0.0
+        for _ in range(2000):
+            value = reader.read('T2')
+            assert value.is_integer() and value >= last
+            last = value
+    finally:
+        stop.set()
+        writer.join()
+
+
+@pytest.mark.parametrize("value, expected", [
+    (1.0, "1"),
+    (0.0, "0"),
+    (0.53, "0.53"),
+    (-2.25, "-2.25"),
+])
+def test_format_value(value, expected):
+    assert format_value(value) == expected
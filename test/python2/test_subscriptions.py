@@ -0,0 +1,85 @@
+import sys
+import time
+
+import pytest
+
+from dhalsim.python2.data_age import DataAge
+from dhalsim.python2.subscriptions import TagSubscriptions
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def local_address(subscriptions):
+    return "127.0.0.1:{port}".format(port=subscriptions.socket.getsockname()[1])
+
+
+@pytest.fixture
+def owner():
+    subscriptions = TagSubscriptions("127.0.0.1:0", {}, deadband=0.1, heartbeat=5.0)
+    yield subscriptions
+    subscriptions.stop()
+
+
+def test_select_deadband_and_heartbeat(owner):
+    subscription = {'tags': {"T0", "T2"}, 'sent': {}}
+
+    assert sorted(owner.select(subscription, {"T0": 1.0, "T2": 2.0}, 100.0)) == \
+        [("T0", 1.0), ("T2", 2.0)]
+    assert owner.select(subscription, {"T0": 1.05, "T2": 2.5}, 101.0) == [("T2", 2.5)]
+    assert sorted(owner.select(subscription, {"T0": 1.05, "T2": 2.5}, 106.0)) == \
+        [("T0", 1.05), ("T2", 2.5)]
+    assert owner.tags_suppressed == 1
+
+
+def test_push_round_trip(owner):
+    owner.start()
+    subscriber = TagSubscriptions("127.0.0.1:0", {local_address(owner): ["T0"]})
+    subscriber.start()
+    try:
+        assert "T0" in subscriber
+        with pytest.raises(KeyError):
+            subscriber.get("T0")
+
+        assert wait_for(lambda: owner.subscribers)
+        owner.publish({"T0": 1.5, "T2": 3.0})
+
+        assert wait_for(lambda: "T0" in subscriber.values)
+        assert subscriber.get("T0") == 1.5
+        assert "T2" not in subscriber.values
+
+        age = subscriber.stats()['ages']["T0"]
+        assert age['updates'] == 1
+        assert age['reads'] == 1
+        assert age['last_age'] >= 0
+    finally:
+        subscriber.stop()
+
+
+def test_expired_subscription_is_dropped(owner):
+    owner.handle({'type': 'subscribe', 'tags': ["T0"]}, ("127.0.0.1", 9), 100.0)
+    owner.publish({"T0": 1.0}, now=100.0 + owner.LEASE + 1)
+
+    assert owner.subscribers == {}
+
+
+def test_updates_are_told_to_data_age(owner):
+    data_age = DataAge({"T0": "PLC2"})
+    subscriber = TagSubscriptions("127.0.0.1:0", {local_address(owner): ["T0"]},
+                                  data_age=data_age)
+
+    subscriber.handle({'type': 'update', 'scanned': 100.0, 'values': {"T0": 1.5, "T9": 2.0}},
+                      ("127.0.0.1", 1), 100.25)
+    subscriber.stop()
+
+    assert data_age.age("T0", now=100.5)[0] == 0.25
+    assert "T9" not in data_age.received
@@ -0,0 +1,118 @@
+import sys
+
+import pytest
+
+from dhalsim.python2.sync_trace import SyncTrace, Histogram, read_trace, read_traces, report, \
+    format_report, percentile, open_sync_trace, PHYSICAL_PROCESS, RECORD
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def directory(tmpdir):
+    return tmpdir.join("sync_trace")
+
+
+def write_trace(directory, name, records):
+    trace = SyncTrace(str(directory.join(name + ".trace")))
+    trace.buffer += b"".join(RECORD.pack(*record) for record in records)
+    trace.close()
+
+
+def test_open_sync_trace(tmpdir):
+    assert open_sync_trace({'output_path': str(tmpdir)}, "PLC1") is None
+
+    trace = open_sync_trace({'output_path': str(tmpdir), 'sync_trace': True}, "PLC1")
+    trace.close()
+    assert trace.path == str(tmpdir.join("sync_trace", "PLC1.trace"))
+
+
+def test_records_are_written_in_batches(directory, mocker):
+    mocker.patch("time.time", side_effect=[1.0, 1.5, 2.0, 2.25])
+    trace = SyncTrace(str(directory.join("PLC1.trace")), flush_records=2)
+
+    trace.done()
+    trace.released(7)
+    assert trace.pending
+    trace.done()
+    assert not trace.pending
+    assert read_trace(trace.path) == []
+
+    trace.released()
+    trace.done()
+    assert read_trace(trace.path) == [(7, 1.0, 1.5), (-1, 2.0, 2.25)]
+    trace.close()
+
+
+def test_cut_off_record_is_left_out(directory):
+    write_trace(directory, "PLC1", [(1, 1.0, 1.5)])
+    with open(str(directory.join("PLC1.trace")), 'ab') as trace_file:
+        trace_file.write(b"\x00" * 5)
+
+    assert read_trace(str(directory.join("PLC1.trace"))) == [(1, 1.0, 1.5)]
+
+
+@pytest.mark.parametrize("percent, expected", [(50, 5), (90, 9), (99, 10), (100, 10), (0, 1)])
+def test_percentile(percent, expected):
+    assert percentile(list(range(1, 11)), percent) == expected
+
+
+def test_histogram():
+    histogram = Histogram()
+    assert histogram.summary() == {'count': 0, 'mean': None, 'p50': None, 'p90': None,
+                                   'p99': None, 'max': None}
+
+    for duration in [0.001] * 9 + [0.03]:
+        histogram.record(duration)
+    summary = histogram.summary()
+
+    assert summary['count'] == 10
+    assert summary['mean'] == pytest.approx(3.9)
+    # 1 ms falls in the bucket up to 1.28 ms
+    assert summary['p50'] == pytest.approx(1.28)
+    assert summary['p99'] == pytest.approx(30)
+    assert summary['max'] == pytest.approx(30)
+
+
+def test_histogram_beyond_last_bucket():
+    histogram = Histogram()
+    histogram.record(60)
+
+    assert histogram.percentile(50) == pytest.approx(60000)
+
+
+def test_report(directory):
+    write_trace(directory, PHYSICAL_PROCESS, [(0, 10.0, 10.5), (1, 11.0, 11.2), (2, 12.0, 12.3)])
+    write_trace(directory, "PLC1", [(-1, 10.1, 10.5), (-1, 11.05, 11.1), (-1, 12.0, 12.3)])
+    write_trace(directory, "scada", [(-1, 10.0, 10.2), (-1, 11.0, 11.2), (-1, 12.1, 12.2)])
+
+    result = report(read_traces(str(directory)))
+
+    assert result['iterations']['count'] == 3
+    assert result['iterations']['max'] == pytest.approx(500)
+    assert result['nodes']['PLC1']['wake']['max'] == pytest.approx(100)
+    assert result['nodes']['PLC1']['work']['p50'] == pytest.approx(300)
+    assert result['nodes']['scada']['lag']['max'] == pytest.approx(200)
+    assert [straggler['name'] for straggler in result['stragglers']] == ["PLC1", "scada"]
+    assert result['stragglers'][0]['last'] == 2
+    assert result['stragglers'][0]['margin'] == pytest.approx(400)
+    assert result['stragglers'][1]['last'] == 1
+
+    text = format_report(result)
+    assert "PLC1 wake" in text
+    assert "straggler" in text
+
+
+def test_report_without_physical_process(directory):
+    write_trace(directory, "PLC1", [(-1, 10.0, 10.5)])
+
+    result = report(read_traces(str(directory)))
+
+    assert result['iterations']['count'] == 0
+    assert result['nodes']['PLC1']['work']['count'] == 1
+    assert result['nodes']['PLC1']['wake']['mean'] is None
+    assert result['stragglers'] == [{'name': "PLC1", 'last': 0, 'margin': 0.0}]
+    format_report(result)
@@ -0,0 +1,64 @@
+import sys
+
+import pytest
+
+from dhalsim.python2.tag_index import TagIndex, TagOwner
+
+
+@pytest.fixture
+def plcs():
+    return [{"name": "PLC1",
+             "local_ip": "10.0.1.1",
+             "public_ip": "192.168.1.1",
+             "sensors": ["T0", "T1"],
+             "actuators": ["P_RAW1"]},
+            {"name": "PLC2",
+             "local_ip": "10.0.2.1",
+             "public_ip": "192.168.1.2",
+             "sensors": ["T2", "T1"],
+             "actuators": ["V_ER2i", ""]},
+            {"name": "PLC3",
+             "local_ip": "10.0.3.1",
+             "public_ip": "192.168.1.3"}]
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+def test_remote_owner(plcs):
+    index = TagIndex(plcs, "PLC1")
+
+    assert index.owner("T2") == TagOwner("PLC2", "192.168.1.2", False)
+    assert not index.is_local("T2")
+
+
+def test_local_owner(plcs):
+    index = TagIndex(plcs, "PLC2")
+
+    assert index.owner("V_ER2i") == TagOwner("PLC2", "10.0.2.1", True)
+    assert index.is_local("V_ER2i")
+
+
+def test_local_plc_claims_shared_tags(plcs):
+    assert TagIndex(plcs, "PLC2").owner("T1").plc_name == "PLC2"
+    assert TagIndex(plcs, "PLC3").owner("T1").plc_name == "PLC1"
+
+
+def test_unknown_tag(plcs):
+    index = TagIndex(plcs, "PLC1")
+
+    assert index.owner("T9") is None
+    assert not index.is_local("T9")
+    assert "T9" not in index
+    assert "" not in index
+
+
+def test_group_by_owner(plcs):
+    index = TagIndex(plcs, "PLC3")
+
+    groups = index.group_by_owner(["T2", "T0", "V_ER2i", "T9", "P_RAW1"])
+
+    assert list(groups.items()) == [("192.168.1.2", ["T2", "V_ER2i"]),
+                                    ("192.168.1.1", ["T0", "P_RAW1"])]
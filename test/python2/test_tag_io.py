@@ -0,0 +1,121 @@
+import sqlite3
+import sys
+
+import pytest
+
+from dhalsim.python2.shared_state import SharedState, MASTER_TIME
+from dhalsim.python2.database import CONTENTION
+from dhalsim.python2.tag_io import TagIO, DatabaseError
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.fixture
+def db_path(tmpdir):
+    path = str(tmpdir.join("dhalsim.sqlite"))
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE plant (name TEXT NOT NULL, pid INTEGER NOT NULL, value TEXT,"
+                 " PRIMARY KEY (name, pid));")
+    conn.executemany("INSERT INTO plant VALUES (?, 1, ?);",
+                     [("T0", "0.5"), ("P_RAW1", "1"), ("T2", "0.3")])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def read_value(db_path, tag):
+    conn = sqlite3.connect(db_path)
+    value = conn.execute("SELECT value FROM plant WHERE name IS ?", (tag,)).fetchone()[0]
+    conn.close()
+    return value
+
+
+def test_refresh_reads_own_tags(db_path):
+    tag_io = TagIO(db_path, ["T0", "P_RAW1", ""])
+
+    assert tag_io.refresh() == {"T0": "0.5", "P_RAW1": "1"}
+    assert tag_io.get("T0") == "0.5"
+    assert tag_io.get("P_RAW1") == "1"
+    with pytest.raises(KeyError):
+        tag_io.get("T2")
+    # Two tags with one query
+    assert tag_io.stats() == {'queries': 1, 'reads_saved': 1, 'writes': 0, 'writes_saved': 0}
+
+
+def test_snapshot_until_refresh(db_path):
+    tag_io = TagIO(db_path, ["T0", "P_RAW1"])
+    tag_io.refresh()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE plant SET value = '0.7' WHERE name IS 'T0'")
+    conn.commit()
+    conn.close()
+
+    assert tag_io.get("T0") == "0.5"
+    tag_io.refresh()
+    assert tag_io.get("T0") == "0.7"
+
+
+def test_write_on_change(db_path):
+    tag_io = TagIO(db_path, ["T0", "P_RAW1"])
+    tag_io.refresh()
+
+    assert not tag_io.set("P_RAW1", 1)
+    assert tag_io.set("P_RAW1", 0)
+    assert read_value(db_path, "P_RAW1") == "0"
+    assert not tag_io.set("P_RAW1", 0)
+
+    assert tag_io.stats()['writes'] == 1
+    assert tag_io.stats()['writes_saved'] == 2
+
+
+def test_same_value():
+    assert TagIO.same_value("1", 1)
+    assert TagIO.same_value("1.0", 1)
+    assert not TagIO.same_value("0", 1)
+    assert TagIO.same_value("abc", "abc")
+
+
+def test_shared_state(db_path, tmpdir):
+    path = str(tmpdir.join("plant_state"))
+    SharedState.create(path, ["T0", "P_RAW1", "T2"], {"T0": "0.5", "P_RAW1": "1"})
+    state = SharedState(path, ["T0", "P_RAW1", "T2"])
+    tag_io = TagIO(db_path, ["T0", "P_RAW1"], shared_state=state)
+
+    assert tag_io.refresh() == {"T0": "0.5", "P_RAW1": "1"}
+    assert tag_io.set("P_RAW1", 0)
+    assert state.get("P_RAW1") == "0"
+    assert read_value(db_path, "P_RAW1") == "1"
+
+    state.set(MASTER_TIME, 7)
+    assert tag_io.master_time() == 7
+    assert tag_io.stats()['queries'] == 1
+
+
+def test_locked_database_is_retried(db_path, mocker):
+    sleeper = mocker.patch("time.sleep")
+    tag_io = TagIO(db_path, ["T0"], db_tries=3)
+    tag_io.conn = mocker.Mock()
+    tag_io.conn.execute.side_effect = sqlite3.OperationalError("database is locked")
+    failures = CONTENTION.failures
+
+    with pytest.raises(DatabaseError):
+        tag_io.refresh()
+
+    assert sleeper.call_count == 3
+    assert CONTENTION.failures == failures + 1
+
+
+def test_locked_commit_is_retried(db_path, mocker):
+    sleeper = mocker.patch("time.sleep")
+    tag_io = TagIO(db_path, ["P_RAW1"], db_tries=3)
+    tag_io.conn = mocker.Mock()
+    tag_io.conn.commit.side_effect = [sqlite3.OperationalError("database is locked"), None]
+
+    assert tag_io.set("P_RAW1", 0)
+
+    assert tag_io.conn.commit.call_count == 2
+    assert sleeper.call_count == 1
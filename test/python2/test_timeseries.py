@@ -0,0 +1,110 @@
+import random
+import sys
+
+import pytest
+
+from dhalsim.python2.timeseries import BLOCK_SIZE, QueryError, QueryServer, TimeSeriesStore, \
+    decode_block, encode_block, query
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+@pytest.mark.parametrize("times, values", [
+    ([0], [0.5]),
+    (list(range(BLOCK_SIZE)), [1.0] * BLOCK_SIZE),
+    (list(range(BLOCK_SIZE)), [0.5 + 0.001 * i for i in range(BLOCK_SIZE)]),
+    ([0, 1, 3, 4, 100, 5000, 10 ** 7, 10 ** 7 + 1], [0.0, -1.5, 1e300, 1e-300, float('inf'),
+                                                      0.0, 42.0, -0.0]),
+])
+def test_block_round_trip(times, values):
+    data = encode_block(times, values)
+    assert decode_block(data, len(times)) == list(zip(times, values))
+
+
+def test_block_compression():
+    times = list(range(BLOCK_SIZE))
+    assert len(encode_block(times, [1.0] * BLOCK_SIZE)) < 100
+    assert len(encode_block(times, [0.5 + 0.001 * i for i in range(BLOCK_SIZE)])) < \
+        BLOCK_SIZE * 16 / 2
+
+
+@pytest.fixture
+def store():
+    random.seed(0)
+    store = TimeSeriesStore(['T0', 'P_RAW1'])
+    for iteration in range(1000):
+        store.append(iteration, [repr(random.uniform(0, 5)), '1'])
+    return store
+
+
+def brute_aggregate(points):
+    values = [value for _, value in points]
+    return len(values), sum(values) / len(values), min(values), max(values)
+
+
+@pytest.mark.parametrize("start, end", [(None, None), (0, 256), (100, 700), (512, 768),
+                                        (990, None), (None, 3)])
+def test_aggregate_matches_points(store, start, end):
+    points = store.series['T0'].points(start, end)
+    result = store.query({'query': 'aggregate', 'tag': 'T0', 'start': start, 'end': end})
+
+    count, mean, minimum, maximum = brute_aggregate(points)
+    assert result['count'] == count
+    assert result['mean'] == pytest.approx(mean)
+    assert (result['min'], result['max']) == (minimum, maximum)
+    assert result['first'] == list(points[0])
+    assert result['rate'] == pytest.approx(
+        (points[-1][1] - points[0][1]) / (points[-1][0] - points[0][0]))
+
+
+def test_downsample(store):
+    result = store.query({'query': 'downsample', 'tag': 'P_RAW1', 'bucket': 300, 'start': 100})
+
+    assert [row['start'] for row in result] == [0, 300, 600, 900]
+    assert [row['count'] for row in result] == [200, 300, 300, 100]
+    assert all(row['mean'] == 1.0 and row['rate'] == 0.0 for row in result)
+
+
+def test_memory_is_bounded():
+    store = TimeSeriesStore(['T0'], max_points=BLOCK_SIZE * 2)
+    for iteration in range(BLOCK_SIZE * 10):
+        store.append(iteration, [iteration * 0.1])
+
+    stats = store.stats()['T0']
+    assert stats['points'] == BLOCK_SIZE * 2
+    assert stats['dropped'] == BLOCK_SIZE * 8
+    assert store.series['T0'].points()[0][0] == BLOCK_SIZE * 8
+
+
+def test_values_that_are_not_numbers_are_skipped():
+    store = TimeSeriesStore(['T0', 'T1'])
+    store.append(0, ['0.5', 'invalid'])
+
+    assert store.query({'query': 'points', 'tag': 'T0'}) == [[0, 0.5]]
+    assert store.query({'query': 'points', 'tag': 'T1'}) == []
+
+
+@pytest.mark.parametrize("request_", [
+    {'query': 'unknown'},
+    {'query': 'aggregate', 'tag': 'T5'},
+    {'query': 'downsample', 'tag': 'T0', 'bucket': 0},
+])
+def test_invalid_query(store, request_):
+    with pytest.raises(QueryError):
+        store.query(request_)
+
+
+def test_query_server(store, tmpdir):
+    path = str(tmpdir.join("scada_timeseries.sock"))
+    server = QueryServer(store, path)
+    server.start()
+    try:
+        assert query(path, {'query': 'tags'}) == ['T0', 'P_RAW1']
+        assert query(path, {'query': 'aggregate', 'tag': 'P_RAW1'})['count'] == 1000
+        with pytest.raises(QueryError):
+            query(path, {'query': 'aggregate', 'tag': 'T5'})
+    finally:
+        server.stop()
@@ -0,0 +1,61 @@
+import sys
+
+from mock import MagicMock
+
+from dhalsim.python2.zygote import FirstSyncReport, Zygote
+
+
+def test_python_version():
+    assert sys.version_info.major is 2
+    assert sys.version_info.minor is 7
+
+
+class SyncedNode(object):
+    def __init__(self, flags):
+        self.flags = flags
+        self.logger = MagicMock()
+        self.intermediate_plc = {'name': 'PLC1'}
+
+    def get_sync(self):
+        return self.flags.pop(0)
+
+
+class ReportedNode(FirstSyncReport, SyncedNode):
+    pass
+
+
+def test_first_sync_reported_once(tmpdir):
+    report = tmpdir.join("time_to_first_sync.csv")
+    node = ReportedNode(str(report), 100.0, [True, False, True, False])
+
+    assert [node.get_sync() for _ in range(4)] == [True, False, True, False]
+
+    lines = report.read().splitlines()
+    assert len(lines) == 1
+    node_name, launched, first_sync, seconds = lines[0].split(",")
+    assert node_name == "PLC1"
+    assert float(launched) == 100.0
+    assert float(seconds) == float(first_sync) - 100.0
+
+
+def test_spawn_answers_pid_in_parent(mocker):
+    mocker.patch.object(Zygote, "__init__", return_value=None)
+    mocker.patch("dhalsim.python2.zygote.os.fork", return_value=4242)
+    run_node = mocker.patch.object(Zygote, "run_node")
+
+    zygote = Zygote(None)
+
+    assert zygote.spawn('plc', 0, 1, 100.0) == 4242
+    run_node.assert_not_called()
+
+
+def test_spawn_exits_child(mocker):
+    mocker.patch.object(Zygote, "__init__", return_value=None)
+    mocker.patch("dhalsim.python2.zygote.os.fork", return_value=0)
+    exit_mock = mocker.patch("dhalsim.python2.zygote.os._exit")
+    run_node = mocker.patch.object(Zygote, "run_node", side_effect=SystemExit(0))
+
+    Zygote(None).spawn('plc', 3, 1234, 100.0)
+
+    run_node.assert_called_once_with('plc', 3, 1234, 100.0)
+    exit_mock.assert_called_once_with(0)